@@ -1,30 +1,25 @@
 import os
-import base64
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncContextManager
 from datetime import datetime, timezone
 import httpx
 import random
 from dotenv import load_dotenv
-from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
+from apis.token_metrics import PaidAPIClient
+from apis.supabase_client import get_supabase_client
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
-API_BASE = "https://api.tokenmetrics.com"
-
-def load_account_from_b64(b64: str) -> Account:
-    raw = base64.b64decode(b64)
-    priv32 = raw[:32]  # first 32 bytes
-    return Account.from_key(priv32)
+# Token IDs per /v2/ai-reports request and how many of those requests may run at once
+BATCH_IDS_PER_REQUEST = 10
+BATCH_CONCURRENCY = 10
 
 def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[str, Any]]:
     """
@@ -44,13 +39,9 @@ def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[st
     # else take first
     return norm[0] if norm else None
 
-class AIReportAPI:
-    def __init__(self):
-        self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
-        if not self.key_b64:
-            raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
-        self.account = load_account_from_b64(self.key_b64)
-        self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
+class AIReportAPI(PaidAPIClient):
+    def __init__(self, client: Optional[x402HttpxClient] = None, limiter: Optional[AsyncContextManager] = None):
+        super().__init__(client, limiter)
         
         # Initialize Supabase client
         self.supabase_url = os.environ.get('SUPABASE_URL')
@@ -60,64 +51,63 @@ class AIReportAPI:
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Missing Supabase credentials")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = get_supabase_client(self.supabase_url, self.supabase_key)
         self.max_retries = 3
         self.base_delay = 1.0  # Base delay in seconds
     
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API"""
         try:
-            async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-                # Preflight to get payment requirements
-                try:
-                    pre = await client.get(
-                        endpoint,
-                        headers={
-                            "x-coinbase-402": "true",
-                            "accept": "application/json",
-                            **(headers or {})
-                        },
-                    )
-                    
-                    if pre.status_code == 200:
-                        return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    
-                    # Expect 402 with accepts
-                    body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    accepts = body.get("accepts", [])
-                    if not accepts:
-                        error_msg = f"No 'accepts' found in 402 challenge: {body}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    chosen = pick_payment_token_from_accepts(accepts)
-                    if not chosen:
-                        error_msg = f"Could not pick token from accepts: {accepts}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    # Real call with payment
-                    payment_headers = {
+            # Preflight to get payment requirements
+            try:
+                pre = await self._get(
+                    endpoint,
+                    headers={
                         "x-coinbase-402": "true",
                         "accept": "application/json",
                         **(headers or {})
-                    }
-                    
-                    alias = (chosen.get("extra", {}) or {}).get("name")
-                    if alias:
-                        payment_headers["x-payment-token"] = alias.lower()
-                    else:
-                        if chosen.get("asset"):
-                            payment_headers["x-payment-token"] = str(chosen["asset"])
-
-                    r = await client.get(endpoint, headers=payment_headers)
-                    return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+                    },
+                )
+                
+                if pre.status_code == 200:
+                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                
+                # Expect 402 with accepts
+                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                accepts = body.get("accepts", [])
+                if not accepts:
+                    error_msg = f"No 'accepts' found in 402 challenge: {body}"
+                    print(f"❌ API Error: {error_msg}")
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
 
-                except Exception as e:
-                    error_msg = f"Request failed: {str(e)}"
+                chosen = pick_payment_token_from_accepts(accepts)
+                if not chosen:
+                    error_msg = f"Could not pick token from accepts: {accepts}"
                     print(f"❌ API Error: {error_msg}")
-                    return {"error": error_msg, "exception": str(e)}
-                    
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
+
+                # Real call with payment
+                payment_headers = {
+                    "x-coinbase-402": "true",
+                    "accept": "application/json",
+                    **(headers or {})
+                }
+                
+                alias = (chosen.get("extra", {}) or {}).get("name")
+                if alias:
+                    payment_headers["x-payment-token"] = alias.lower()
+                else:
+                    if chosen.get("asset"):
+                        payment_headers["x-payment-token"] = str(chosen["asset"])
+
+                r = await self._get(endpoint, headers=payment_headers)
+                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+
+            except Exception as e:
+                error_msg = f"Request failed: {str(e)}"
+                print(f"❌ API Error: {error_msg}")
+                return {"error": error_msg, "exception": str(e)}
+                
         except Exception as e:
             error_msg = f"Client initialization failed: {str(e)}"
             print(f"❌ API Error: {error_msg}")
@@ -488,6 +478,46 @@ class AIReportAPI:
             print(f"❌ Error in get_and_store_ai_report_multiple_by_ids for token IDs {token_ids}: {e}")
             return False
 
+    async def batch_get_ai_reports(self, token_ids: List[int]) -> bool:
+        """
+        Fetch AI reports for many token IDs concurrently and store them with one bulk upsert
+        
+        Args:
+            token_ids: List of token IDs (e.g., [3375, 3306, 3315])
+        """
+        try:
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+            
+            async def fetch_chunk(chunk: List[int]) -> Optional[List[Dict]]:
+                async with semaphore:
+                    return await self.get_ai_report_multiple_by_ids(chunk)
+            
+            chunks = [token_ids[i:i + BATCH_IDS_PER_REQUEST] for i in range(0, len(token_ids), BATCH_IDS_PER_REQUEST)]
+            results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+            
+            ai_report_data = []
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, Exception):
+                    print(f"❌ Error fetching AI reports for token IDs {chunk}: {result}")
+                elif result:
+                    ai_report_data.extend(result)
+            
+            if not ai_report_data:
+                print(f"❌ No AI report data received for token IDs {token_ids}")
+                return False
+            
+            # One upsert for every chunk's records
+            success = self.store_ai_report(ai_report_data)
+            if success:
+                print(f"✅ Successfully fetched and stored AI reports for {len(token_ids)} token IDs")
+            else:
+                print(f"❌ Failed to store AI reports for token IDs {token_ids}")
+            return success
+                
+        except Exception as e:
+            print(f"❌ Error in batch_get_ai_reports for token IDs {token_ids}: {e}")
+            return False
+
 async def main():
     """Test function for AI Report API"""
     try:
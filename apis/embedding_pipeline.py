@@ -5,32 +5,66 @@ This module handles creating and storing embeddings for social posts and AI repo
 created TODAY using OpenAI's text-embedding-3-large model (3072 dimensions).
 """
 
-import os
 import asyncio
+import logging
+import os
 import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone, date
 from dotenv import load_dotenv
 import urllib.parse
+import numpy as np
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+from apis.supabase_client import get_supabase_client
 
 try:
     from openai import OpenAI
 except ImportError:
-    print("OpenAI client not found. Installing...")
-    os.system("pip install openai")
-    from openai import OpenAI
+    raise ImportError("OpenAI client not found. Install it with: pip install openai") from None
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Unique key of an embeddings row: one embedding per source post or AI report (see database_schema.sql)
+EMBEDDINGS_CONFLICT_COLUMNS = 'content_type,content_id'
+
+# Texts sent per embeddings request, and the rough character cap per text (~4 chars per token)
+EMBEDDING_BATCH_SIZE = 64
+MAX_EMBEDDING_CHARS = 8000 * 4
+
+def quantize_embedding(vector: List[float]) -> np.ndarray:
+    """Quantize an embedding to int8 with a per-vector scale (cosine ignores the scale)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    peak = np.abs(vector).max() if vector.size else 0.0
+    if peak == 0:
+        return np.zeros(vector.shape, dtype=np.int8)
+    return np.clip(np.rint(vector / peak * 127), -127, 127).astype(np.int8)
+
+def quantize_embeddings(matrix: np.ndarray) -> np.ndarray:
+    """Quantize every row of an (n, d) embedding matrix to int8, each with its own scale"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    peaks = np.abs(matrix).max(axis=1, keepdims=True)
+    scales = np.divide(127.0, peaks, out=np.zeros_like(peaks), where=peaks > 0)
+    return np.clip(np.rint(matrix * scales), -127, 127).astype(np.int8)
+
+def encode_bytea(data: bytes) -> str:
+    """Encode raw bytes as a Postgres bytea hex literal for PostgREST"""
+    return '\\x' + data.hex()
+
+def decode_bytea(value: Any) -> bytes:
+    """Decode a bytea value returned by PostgREST ('\\x...' hex string)"""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('\\x') else value)
+    return bytes(value)
+
 class EmbeddingPipeline:
-    def __init__(self):
+    def __init__(self, supabase: Optional[Client] = None):
         # Initialize OpenAI client with new syntax
         self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         if not os.getenv('OPENAI_API_KEY'):
@@ -44,7 +78,8 @@ class EmbeddingPipeline:
         if not self.supabase_url or not self.supabase_key or not self.user_id:
             raise ValueError("Missing Supabase credentials")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        # Reuse the caller's client (and its open connections) when one is passed in
+        self.supabase: Client = supabase or get_supabase_client(self.supabase_url, self.supabase_key)
         
         # Embedding model configuration
         self.model = "text-embedding-3-small"
@@ -52,6 +87,8 @@ class EmbeddingPipeline:
         
         # Fix: Use UTC date for consistent comparison
         self.today_utc = datetime.now(timezone.utc).date()
+        self.today_iso = self.today_utc.isoformat()
+        self.today_start = f"{self.today_iso}T00:00:00Z"
         print(f"📅 Processing embeddings for data created on: {self.today_utc} (UTC)")
     
     async def create_embedding(self, text: str) -> Optional[List[float]]:
@@ -142,8 +179,32 @@ class EmbeddingPipeline:
         
         return " | ".join(text_parts)
     
-    async def process_todays_social_posts_embeddings(self, token_name: str) -> bool:
-        """Process embeddings for social posts created TODAY for a specific token"""
+    async def create_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Create embeddings for many texts with one API call per EMBEDDING_BATCH_SIZE texts"""
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        
+        # Empty texts get no embedding; the rest are truncated like in create_embedding
+        pending = [(i, text[:MAX_EMBEDDING_CHARS]) for i, text in enumerate(texts) if text and text.strip()]
+        
+        for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+            batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+            try:
+                response = self.openai_client.embeddings.create(
+                    input=[text for _, text in batch],
+                    model=self.model,
+                    dimensions=self.dimensions
+                )
+                for (i, _), item in zip(batch, response.data):
+                    embeddings[i] = item.embedding
+                print(f"✅ Created {len(batch)} embeddings with {self.dimensions} dimensions")
+            except Exception as e:
+                print(f"❌ Error creating embeddings for {len(batch)} texts: {e}")
+        
+        return embeddings
+    
+    async def process_todays_social_posts_embeddings(self, token_name: str, since: Optional[str] = None,
+                                                     until: Optional[str] = None) -> bool:
+        """Process embeddings for social posts created TODAY for a specific token, ingested after since and up to until"""
         try:
             # 🆕 FIX: URL decode the token name if it's encoded
             decoded_token_name = urllib.parse.unquote(token_name)
@@ -153,56 +214,36 @@ class EmbeddingPipeline:
             
             print(f" Processing TODAY'S social post embeddings for {token_name}...")
             
-            # Fetch social posts created today from Supabase
-            response = self.supabase.table('posts').select('*').eq('token_name', token_name).execute()
+            # Fetch only today's posts that are newer than the token's watermark, so each post is embedded once
+            query = self.supabase.table('posts').select('*').eq('token_name', token_name).gte('ingested_at', self.today_start)
+            if since:
+                query = query.gt('ingested_at', since)
+            if until:
+                query = query.lte('ingested_at', until)
+            response = query.execute()
             
-            if not response.data:
-                print(f"ℹ️ No social posts found for {token_name}")
+            todays_posts = response.data or []
+            if not todays_posts:
+                print(f"ℹ️ No new social posts created today (UTC) for {token_name}")
+                print(f"  Today's date (UTC): {self.today_utc}")
                 return True
             
-            print(f"🔍 Found {len(response.data)} total posts for {token_name}")
+            print(f"📅 Found {len(todays_posts)} new social posts created today (UTC)")
             
-            # Debug: Show all post dates
-            print(f"📅 Debug - All post dates for {token_name}:")
-            for post in response.data[:5]:  # Show first 5 posts
+            # Debug: Show the new post dates
+            print(f"📅 Debug - New post dates for {token_name}:")
+            for post in todays_posts[:5]:  # Show first 5 posts
                 print(f"  Post {post['id']}: ingested_at={post.get('ingested_at')}")
             
-            # Filter posts created today (using UTC comparison)
-            todays_posts = []
-            for post in response.data:
-                if post.get('ingested_at'):
-                    try:
-                        # Parse the ingested_at timestamp (it's already in UTC from Supabase)
-                        created_date = datetime.fromisoformat(post['ingested_at'].replace('Z', '+00:00')).date()
-                        
-                        # Debug: Show the date comparison
-                        print(f"  Post {post['id']}: ingested_at={post['ingested_at']}, parsed_date={created_date}, today_utc={self.today_utc}")
-                        
-                        if created_date == self.today_utc:
-                            todays_posts.append(post)
-                            print(f"✅ Post {post['id']} is from today!")
-                    except (ValueError, TypeError) as e:
-                        print(f"⚠️ Date parsing error for post {post['id']}: {e}")
-                        continue
-            
-            if not todays_posts:
-                print(f"ℹ️ No social posts created today (UTC) for {token_name}")
-                print(f"  Today's date (UTC): {self.today_utc}")
-                print(f"  Tip: Check if your data was created in a different timezone or date")
-                return True
-            
-            print(f"📅 Found {len(todays_posts)} social posts created today (UTC)")
+            # Embed all of today's posts in batched API calls and quantize them together
+            content_texts = [self.prepare_social_post_text(post) for post in todays_posts]
+            embeddings = await self.create_embeddings(content_texts)
+            embedded = [i for i, embedding in enumerate(embeddings) if embedding]
+            quantized = quantize_embeddings(np.array([embeddings[i] for i in embedded], dtype=np.float32)) if embedded else []
             
-            success_count = 0
-            for post in todays_posts:
-                # Prepare text content
-                content_text = self.prepare_social_post_text(post)
-                
-                # Create embedding
-                embedding = await self.create_embedding(content_text)
-                if not embedding:
-                    print(f"❌ Failed to create embedding for post {post['id']}")
-                    continue
+            rows = []
+            for i, embedding_i8 in zip(embedded, quantized):
+                post = todays_posts[i]
                 
                 # Prepare metadata
                 metadata = {
@@ -217,22 +258,32 @@ class EmbeddingPipeline:
                 }
                 
                 # Store embedding in Supabase with DECODED token name
-                embedding_data = {
+                rows.append({
                     'user_id': self.user_id,
                     'content_type': 'social_post',
+                    'content_id': str(post['id']),
                     'token_name': token_name,  # 🆕 Now using decoded name
-                    'content_text': content_text,
-                    'embedding_vector': embedding,
+                    'content_text': content_texts[i],
+                    'embedding_vector': embeddings[i],
+                    'embedding_i8': encode_bytea(embedding_i8.tobytes()),
                     'metadata': metadata
-                }
-                
-                result = self.supabase.table('embeddings').insert(embedding_data).execute()
-                
-                if result.data:
-                    success_count += 1
-                    print(f"✅ Stored embedding for post {post['id']}")
-                else:
-                    print(f"❌ Failed to store embedding for post {post['id']}")
+                })
+            
+            for i, embedding in enumerate(embeddings):
+                if not embedding:
+                    print(f"❌ Failed to create embedding for post {todays_posts[i]['id']}")
+            
+            success_count = 0
+            if rows:
+                # Upsert on the source row, so a retry after a partial failure replaces rather than duplicates
+                result = self.supabase.table('embeddings').upsert(rows, on_conflict=EMBEDDINGS_CONFLICT_COLUMNS).execute()
+                success_count = len(result.data or [])
+                print(f"✅ Stored {success_count} social post embeddings")
+            
+            # Any missing embedding fails the token so its watermark stays put and the rows are retried next run
+            if success_count < len(todays_posts):
+                print(f"⚠️ Only processed {success_count}/{len(todays_posts)} social post embeddings for {token_name}")
+                return False
             
             print(f"✅ Successfully processed {success_count}/{len(todays_posts)} social post embeddings for {token_name}")
             return True
@@ -241,8 +292,9 @@ class EmbeddingPipeline:
             print(f"❌ Error processing social post embeddings for {token_name}: {e}")
             return False
     
-    async def process_todays_ai_reports_embeddings(self, token_name: str) -> bool:
-        """Process embeddings for AI reports created TODAY for a specific token"""
+    async def process_todays_ai_reports_embeddings(self, token_name: str, since: Optional[str] = None,
+                                                   until: Optional[str] = None) -> bool:
+        """Process embeddings for AI reports created TODAY for a specific token, created after since and up to until"""
         try:
             # 🆕 FIX: URL decode the token name if it's encoded
             decoded_token_name = urllib.parse.unquote(token_name)
@@ -252,50 +304,30 @@ class EmbeddingPipeline:
             
             print(f" Processing TODAY'S AI report embeddings for {token_name}...")
             
-            # Fetch AI reports created today from Supabase
-            response = self.supabase.table('ai_reports').select('*').eq('token_name', token_name).execute()
-            
-            if not response.data:
-                print(f"ℹ️ No AI reports found for {token_name}")
-                return True
-            
-            print(f"🔍 Found {len(response.data)} total AI reports for {token_name}")
-            
-            # Filter reports created today (using UTC comparison)
-            todays_reports = []
-            for report in response.data:
-                if report.get('created_at'):
-                    try:
-                        # Parse the created_at timestamp (it's already in UTC from Supabase)
-                        created_date = datetime.fromisoformat(report['created_at'].replace('Z', '+00:00')).date()
-                        
-                        # Debug: Show the date comparison
-                        print(f" Report {report['id']}: created_at={report['created_at']}, parsed_date={created_date}, today_utc={self.today_utc}")
-                        
-                        if created_date == self.today_utc:
-                            todays_reports.append(report)
-                            print(f"✅ Report {report['id']} is from today!")
-                    except (ValueError, TypeError) as e:
-                        print(f"⚠️ Date parsing error for report {report['id']}: {e}")
-                        continue
+            # Fetch only today's reports that are newer than the token's watermark, so each report is embedded once
+            query = self.supabase.table('ai_reports').select('*').eq('token_name', token_name).gte('created_at', self.today_start)
+            if since:
+                query = query.gt('created_at', since)
+            if until:
+                query = query.lte('created_at', until)
+            response = query.execute()
             
+            todays_reports = response.data or []
             if not todays_reports:
-                print(f"ℹ️ No AI reports created today (UTC) for {token_name}")
-                print(f" Tip: Check if your data was created in a different timezone or date")
+                print(f"ℹ️ No new AI reports created today (UTC) for {token_name}")
                 return True
             
-            print(f"📅 Found {len(todays_reports)} AI reports created today (UTC)")
+            print(f"📅 Found {len(todays_reports)} new AI reports created today (UTC)")
             
-            success_count = 0
-            for report in todays_reports:
-                # Prepare text content
-                content_text = self.prepare_ai_report_text(report)
-                
-                # Create embedding
-                embedding = await self.create_embedding(content_text)
-                if not embedding:
-                    print(f"❌ Failed to create embedding for AI report {report['id']}")
-                    continue
+            # Embed all of today's reports in batched API calls and quantize them together
+            content_texts = [self.prepare_ai_report_text(report) for report in todays_reports]
+            embeddings = await self.create_embeddings(content_texts)
+            embedded = [i for i, embedding in enumerate(embeddings) if embedding]
+            quantized = quantize_embeddings(np.array([embeddings[i] for i in embedded], dtype=np.float32)) if embedded else []
+            
+            rows = []
+            for i, embedding_i8 in zip(embedded, quantized):
+                report = todays_reports[i]
                 
                 # Prepare metadata
                 metadata = {
@@ -309,24 +341,32 @@ class EmbeddingPipeline:
                     'created_date': report.get('created_at')
                 }
                 
-                # 🆕 FIXED: Store embedding without content_id field
-                embedding_data = {
+                rows.append({
                     'user_id': self.user_id,
                     'content_type': 'ai_report',
+                    'content_id': str(report['id']),
                     'token_name': token_name,
-                    'content_text': content_text,
-                    'embedding_vector': embedding,
+                    'content_text': content_texts[i],
+                    'embedding_vector': embeddings[i],
+                    'embedding_i8': encode_bytea(embedding_i8.tobytes()),
                     'metadata': metadata
-                    # ✅ No content_id field needed
-                }
-                
-                result = self.supabase.table('embeddings').insert(embedding_data).execute()
-                
-                if result.data:
-                    success_count += 1
-                    print(f"✅ Stored embedding for AI report {report['id']}")
-                else:
-                    print(f"❌ Failed to store embedding for AI report {report['id']}")
+                })
+            
+            for i, embedding in enumerate(embeddings):
+                if not embedding:
+                    print(f"❌ Failed to create embedding for AI report {todays_reports[i]['id']}")
+            
+            success_count = 0
+            if rows:
+                # Upsert on the source row, so a retry after a partial failure replaces rather than duplicates
+                result = self.supabase.table('embeddings').upsert(rows, on_conflict=EMBEDDINGS_CONFLICT_COLUMNS).execute()
+                success_count = len(result.data or [])
+                print(f"✅ Stored {success_count} AI report embeddings")
+            
+            # Any missing embedding fails the token so its watermark stays put and the rows are retried next run
+            if success_count < len(todays_reports):
+                print(f"⚠️ Only processed {success_count}/{len(todays_reports)} AI report embeddings for {token_name}")
+                return False
             
             print(f"✅ Successfully processed {success_count}/{len(todays_reports)} AI report embeddings for {token_name}")
             return True
@@ -335,16 +375,17 @@ class EmbeddingPipeline:
             print(f"❌ Error processing AI report embeddings for {token_name}: {e}")
             return False
     
-    async def process_token_embeddings(self, token_name: str) -> bool:
-        """Process embeddings for both social posts and AI reports created TODAY for a token"""
+    async def process_token_embeddings(self, token_name: str, since: Optional[str] = None,
+                                       until: Optional[str] = None) -> bool:
+        """Process embeddings for both social posts and AI reports created TODAY for a token, newer than since"""
         try:
             print(f"\n{'='*50}")
             print(f"Processing TODAY'S Embeddings for: {token_name}")
             print(f"{'='*50}")
             
             # Process social posts and AI reports in parallel
-            social_task = self.process_todays_social_posts_embeddings(token_name)
-            ai_report_task = self.process_todays_ai_reports_embeddings(token_name)
+            social_task = self.process_todays_social_posts_embeddings(token_name, since, until)
+            ai_report_task = self.process_todays_ai_reports_embeddings(token_name, since, until)
             
             social_success, ai_report_success = await asyncio.gather(
                 social_task, ai_report_task, return_exceptions=True
@@ -372,6 +413,57 @@ class EmbeddingPipeline:
             print(f"❌ Error processing embeddings for {token_name}: {e}")
             return False
     
+    def _decode_token_name_rows(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """URL-decode the token_name of each RPC row and return the sorted unique names"""
+        token_names = set()
+        for row in rows:
+            raw_token_name = row.get('token_name')
+            if not raw_token_name:
+                continue
+            # 🆕 FIX: URL decode token names from database
+            decoded_token_name = urllib.parse.unquote(raw_token_name) if '%' in raw_token_name else raw_token_name
+            if decoded_token_name != raw_token_name:
+                print(f"🔄 Decoded token name: {raw_token_name} → {decoded_token_name}")
+            token_names.add(decoded_token_name)
+        
+        return sorted(token_names)
+    
+    def get_embedding_token_names(self) -> List[str]:
+        """Get the distinct (URL-decoded) token names found in posts and ai_reports"""
+        # The database deduplicates across both tables (see embedding_token_names in database_schema.sql),
+        # so only the unique names cross the wire and get decoded
+        response = self.supabase.rpc('embedding_token_names').execute()
+        return self._decode_token_name_rows(response.data or [])
+    
+    def get_tokens_with_new_data(self) -> List[str]:
+        """Get the (URL-decoded) token names with posts or AI reports newer than their embedding watermark"""
+        # Tokens that were never embedded count as new (see embedding_tokens_with_new_data in database_schema.sql)
+        response = self.supabase.rpc('embedding_tokens_with_new_data').execute()
+        return self._decode_token_name_rows(response.data or [])
+    
+    def get_embedding_watermarks(self, token_names: List[str]) -> Dict[str, str]:
+        """Get each token's last_embedded_at (tokens that were never embedded are missing)"""
+        if not token_names:
+            return {}
+        try:
+            response = self.supabase.table('embedding_watermarks').select('token_name,last_embedded_at').in_('token_name', token_names).execute()
+            return {row['token_name']: row['last_embedded_at'] for row in response.data or []}
+        except Exception as e:
+            print(f"⚠️ Failed to load embedding watermarks, embedding all of today's data: {e}")
+            return {}
+    
+    def update_embedding_watermarks(self, token_names: List[str], embedded_at: str) -> bool:
+        """Record that the given tokens' posts and AI reports were embedded up to embedded_at"""
+        if not token_names:
+            return True
+        try:
+            rows = [{'token_name': token_name, 'last_embedded_at': embedded_at} for token_name in token_names]
+            self.supabase.table('embedding_watermarks').upsert(rows, on_conflict='token_name').execute()
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to update embedding watermarks: {e}")
+            return False
+    
     async def run_embedding_pipeline(self, token_names: List[str]) -> bool:
         """Run the complete embedding pipeline for multiple tokens (TODAY'S data only)"""
         try:
@@ -381,12 +473,23 @@ class EmbeddingPipeline:
             print(f"🌍 Using UTC date: {self.today_utc}")
             print(f"{'='*50}")
             
+            # Each token only embeds rows newer than its watermark and up to this run's start; rows
+            # ingested while the run is in progress are newer than the new watermark and get picked up next run
+            started_at = datetime.now(timezone.utc).isoformat()
+            watermarks = self.get_embedding_watermarks(token_names)
+            
             # Process all tokens
             results = []
             for token_name in token_names:
-                result = await self.process_token_embeddings(token_name)
+                result = await self.process_token_embeddings(token_name, watermarks.get(token_name), started_at)
                 results.append(result)
             
+            # Advance the watermark only for tokens whose embeddings all succeeded
+            self.update_embedding_watermarks(
+                [token_name for token_name, result in zip(token_names, results) if result is True],
+                started_at
+            )
+            
             # Summary
             successful = sum(results)
             total = len(results)
@@ -405,9 +508,7 @@ class EmbeddingPipeline:
             return successful == total
             
         except Exception as e:
-            print(f"❌ Embedding pipeline failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Embedding pipeline failed: %s", e)
             return False
 
 async def main():
@@ -418,9 +519,7 @@ async def main():
         token_names = ['BTC', 'ETH', 'ADA']
         await pipeline.run_embedding_pipeline(token_names)
     except Exception as e:
-        print(f"❌ Failed to start embedding pipeline: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to start embedding pipeline: %s", e)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,30 +1,28 @@
+import logging
 import os
-import base64
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncContextManager
 from datetime import datetime, timezone
 import httpx
 
 from dotenv import load_dotenv
-from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
+from apis.token_metrics import PaidAPIClient
+from apis.supabase_client import get_supabase_client
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
-API_BASE = "https://api.tokenmetrics.com"
+logger = logging.getLogger(__name__)
 
-def load_account_from_b64(b64: str) -> Account:
-    raw = base64.b64decode(b64)
-    priv32 = raw[:32]  # first 32 bytes
-    return Account.from_key(priv32)
+# Token IDs per /v2/fundamental-grade request and how many of those requests may run at once
+BATCH_IDS_PER_REQUEST = 10
+BATCH_CONCURRENCY = 10
 
 def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[str, Any]]:
     """
@@ -44,13 +42,9 @@ def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[st
     # else take first
     return norm[0] if norm else None
 
-class FundamentalGradeAPI:
-    def __init__(self):
-        self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
-        if not self.key_b64:
-            raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
-        self.account = load_account_from_b64(self.key_b64)
-        self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
+class FundamentalGradeAPI(PaidAPIClient):
+    def __init__(self, client: Optional[x402HttpxClient] = None, limiter: Optional[AsyncContextManager] = None):
+        super().__init__(client, limiter)
         
         # Initialize Supabase client
         self.supabase_url = os.environ.get('SUPABASE_URL')
@@ -59,59 +53,58 @@ class FundamentalGradeAPI:
         
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Missing Supabase credentials")
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = get_supabase_client(self.supabase_url, self.supabase_key)
     
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API"""
         try:
-            async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-                # Preflight to get payment requirements
-                try:
-                    pre = await client.get(
-                        endpoint,
-                        headers={
-                            "x-coinbase-402": "true",
-                            "accept": "application/json",
-                            **(headers or {})
-                        },
-                    )
-                    
-                    if pre.status_code == 200:
-                        return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    
-                    # Expect 402 with accepts
-                    body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    accepts = body.get("accepts", [])
-                    if not accepts:
-                        error_msg = f"No 'accepts' found in 402 challenge: {body}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    chosen = pick_payment_token_from_accepts(accepts)
-                    if not chosen:
-                        error_msg = f"Could not pick token from accepts: {accepts}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    # Real call with payment
-                    payment_headers = {
+            # Preflight to get payment requirements
+            try:
+                pre = await self._get(
+                    endpoint,
+                    headers={
                         "x-coinbase-402": "true",
                         "accept": "application/json",
                         **(headers or {})
-                    }
-                    
-                    alias = (chosen.get("extra", {}) or {}).get("name")
-                    if alias:
-                        payment_headers["x-payment-token"] = alias.lower()
-                    
-                    r = await client.get(endpoint, headers=payment_headers)
-                    return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+                    },
+                )
+                
+                if pre.status_code == 200:
+                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                
+                # Expect 402 with accepts
+                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                accepts = body.get("accepts", [])
+                if not accepts:
+                    error_msg = f"No 'accepts' found in 402 challenge: {body}"
+                    print(f"❌ API Error: {error_msg}")
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
 
-                except Exception as e:
-                    error_msg = f"Request failed: {str(e)}"
+                chosen = pick_payment_token_from_accepts(accepts)
+                if not chosen:
+                    error_msg = f"Could not pick token from accepts: {accepts}"
                     print(f"❌ API Error: {error_msg}")
-                    return {"error": error_msg, "exception": str(e)}
-                    
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
+
+                # Real call with payment
+                payment_headers = {
+                    "x-coinbase-402": "true",
+                    "accept": "application/json",
+                    **(headers or {})
+                }
+                
+                alias = (chosen.get("extra", {}) or {}).get("name")
+                if alias:
+                    payment_headers["x-payment-token"] = alias.lower()
+                
+                r = await self._get(endpoint, headers=payment_headers)
+                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+
+            except Exception as e:
+                error_msg = f"Request failed: {str(e)}"
+                print(f"❌ API Error: {error_msg}")
+                return {"error": error_msg, "exception": str(e)}
+                
         except Exception as e:
             error_msg = f"Client initialization failed: {str(e)}"
             print(f"❌ API Error: {error_msg}")
@@ -189,9 +182,7 @@ class FundamentalGradeAPI:
             return True
             
         except Exception as e:
-            print(f"❌ Error storing fundamental grade data: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing fundamental grade data: %s", e)
             return False
     
     def get_fundamental_grade_from_db(self, token_symbol: str) -> Optional[Dict]:
@@ -333,9 +324,7 @@ class FundamentalGradeAPI:
             return True
             
         except Exception as e:
-            print(f"❌ Error storing fundamental grade data: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing fundamental grade data: %s", e)
             return False
 
     async def fetch_and_store_fundamental_grade_multiple(self, symbols: List[str]) -> bool:
@@ -479,6 +468,41 @@ class FundamentalGradeAPI:
             print(f"❌ Error in fetch_and_store_fundamental_grade_multiple_by_ids for token IDs {token_ids}: {e}")
             return False
 
+    async def batch_get_fundamental_grades(self, token_ids: List[int]) -> bool:
+        """
+        Fetch fundamental grades for many token IDs concurrently and store them with one bulk upsert
+        
+        Args:
+            token_ids: List of token IDs (e.g., [3375, 3306, 3315])
+        """
+        try:
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+            
+            async def fetch_chunk(chunk: List[int]) -> Optional[List[Dict]]:
+                async with semaphore:
+                    return await self.get_fundamental_grade_multiple_by_ids(chunk)
+            
+            chunks = [token_ids[i:i + BATCH_IDS_PER_REQUEST] for i in range(0, len(token_ids), BATCH_IDS_PER_REQUEST)]
+            results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+            
+            fundamental_data = []
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, Exception):
+                    print(f"❌ Error fetching fundamental grades for token IDs {chunk}: {result}")
+                elif result:
+                    fundamental_data.extend(result)
+            
+            if not fundamental_data:
+                print(f"❌ No fundamental grade data received for token IDs {token_ids}")
+                return False
+            
+            # One upsert for every chunk's records
+            return self.store_fundamental_grade_multiple(fundamental_data)
+                
+        except Exception as e:
+            print(f"❌ Error in batch_get_fundamental_grades for token IDs {token_ids}: {e}")
+            return False
+
 async def main():
     """Test function for Fundamental Grade API"""
     try:
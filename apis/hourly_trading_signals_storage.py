@@ -1,26 +1,32 @@
+import logging
 import os
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+from apis.supabase_client import get_supabase_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
+# Rows per upsert request; larger batches are split to stay under PostgREST payload limits
+UPSERT_CHUNK_SIZE = 1000
+
 class HourlyTradingSignalsStorage:
     def __init__(self):
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Missing Supabase credentials")
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     def _parse_timestamp(self, timestamp_str: str) -> datetime:
         """Parse timestamp string with multiple format support"""
@@ -124,18 +130,17 @@ class HourlyTradingSignalsStorage:
             print(f"Attempting to store {len(db_data)} unique records...")
             
             # Insert data with conflict resolution (upsert)
-            result = self.supabase.table('hourly_trading_signals').upsert(
-                db_data,
-                on_conflict='token_symbol,timestamp'  # Use unique constraint
-            ).execute()
+            for start in range(0, len(db_data), UPSERT_CHUNK_SIZE):
+                self.supabase.table('hourly_trading_signals').upsert(
+                    db_data[start:start + UPSERT_CHUNK_SIZE],
+                    on_conflict='token_symbol,timestamp'  # Use unique constraint
+                ).execute()
             
             print(f"✅ Successfully stored {len(db_data)} hourly trading signals records")
             return True
             
         except Exception as e:
-            print(f"❌ Error storing hourly trading signals data: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing hourly trading signals data: %s", e)
             return False
 
     def get_hourly_trading_signals(self, token_symbol: str, limit: int = 100) -> List[Dict]:
@@ -1,26 +1,36 @@
+import logging
 import os
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+from apis.supabase_client import get_supabase_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
+# Rows per upsert request; larger batches are split to stay under PostgREST payload limits
+UPSERT_CHUNK_SIZE = 1000
+
+# Candle date fields in lookup order: hourly candles carry TIMESTAMP, daily candles carry DATE
+HOURLY_DATE_FIELDS = ('TIMESTAMP', 'DATE', 'date', 'timestamp')
+DAILY_DATE_FIELDS = ('DATE', 'TIMESTAMP', 'date', 'timestamp')
+
 class OHLCVStorage:
     def __init__(self):
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Missing Supabase credentials")
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     def _parse_date(self, date_str: str) -> datetime:
         """Parse date string with multiple format support"""
@@ -53,76 +63,80 @@ class OHLCVStorage:
             print(f"Warning: Could not parse date '{date_str}', using current time")
             return datetime.now(timezone.utc)
     
-    def store_hourly_ohlcv(self, token_symbol: str, ohlcv_data: List[Dict]) -> bool:
-        """Store hourly OHLCV data in Supabase"""
+    def _prepare_ohlcv_records(self, token_symbol: str, ohlcv_data: List[Dict], date_fields: tuple, seen_combinations: set) -> List[Dict]:
+        """Convert API candles to table records, skipping (symbol, date_time) pairs already in seen_combinations"""
+        db_data = []
+        
+        for i, candle in enumerate(ohlcv_data):
+            try:
+                # Debug: Print the first record
+                if i == 0:
+                    print(f"Sample candle data: {candle}")
+                
+                # Handle different possible field names from API
+                date_str = next((candle.get(field) for field in date_fields if candle.get(field)), None)
+                token_id = candle.get('TOKEN_ID') or candle.get('token_id')
+                token_name = candle.get('TOKEN_NAME') or candle.get('token_name')
+                token_sym = candle.get('TOKEN_SYMBOL') or candle.get('token_symbol') or token_symbol.upper()
+                
+                # Convert date string to datetime
+                date_time = self._parse_date(date_str)
+                
+                # Create unique combination key
+                combination_key = f"{token_sym}_{date_time.isoformat()}"
+                
+                # Skip if we've already seen this combination
+                if combination_key in seen_combinations:
+                    print(f"Skipping duplicate record: {combination_key}")
+                    continue
+                
+                seen_combinations.add(combination_key)
+                
+                # Handle different price field names
+                open_price = candle.get('OPEN') or candle.get('open') or candle.get('open_price')
+                high_price = candle.get('HIGH') or candle.get('high') or candle.get('high_price')
+                low_price = candle.get('LOW') or candle.get('low') or candle.get('low_price')
+                close_price = candle.get('CLOSE') or candle.get('close') or candle.get('close_price')
+                volume = candle.get('VOLUME') or candle.get('volume')
+                
+                # Prepare record
+                record = {
+                    'user_id': USER_ID,
+                    'token_id': token_id,
+                    'token_name': token_name,
+                    'token_symbol': token_sym,
+                    'date_time': date_time.isoformat(),
+                    'open_price': float(open_price) if open_price is not None else None,
+                    'high_price': float(high_price) if high_price is not None else None,
+                    'low_price': float(low_price) if low_price is not None else None,
+                    'close_price': float(close_price) if close_price is not None else None,
+                    'volume': float(volume) if volume is not None else None
+                }
+                
+                # Debug: Print the first record structure
+                if i == 0:
+                    print(f"Sample record structure: {record}")
+                
+                db_data.append(record)
+                
+            except Exception as e:
+                print(f"Error processing candle {i}: {e}")
+                print(f"Candle data: {candle}")
+                continue
+        
+        return db_data
+    
+    def _store_ohlcv(self, table: str, label: str, token_symbol: str, ohlcv_data: List[Dict], date_fields: tuple) -> bool:
+        """Store one token's OHLCV candles in the given table"""
         try:
             if not ohlcv_data:
-                print(f"No hourly OHLCV data to store for {token_symbol}")
+                print(f"No {label} OHLCV data to store for {token_symbol}")
                 return True
             
-            print(f"Processing {len(ohlcv_data)} hourly OHLCV records for {token_symbol}")
+            print(f"Processing {len(ohlcv_data)} {label} OHLCV records for {token_symbol}")
             
             # Prepare data for insertion
-            db_data = []
-            seen_combinations = set()  # Track unique combinations
-            
-            for i, candle in enumerate(ohlcv_data):
-                try:
-                    # Debug: Print the first record
-                    if i == 0:
-                        print(f"Sample candle data: {candle}")
-                    
-                    # Handle different possible field names from API
-                    # For hourly data, use TIMESTAMP field
-                    date_str = candle.get('TIMESTAMP') or candle.get('DATE') or candle.get('date') or candle.get('timestamp')
-                    token_id = candle.get('TOKEN_ID') or candle.get('token_id')
-                    token_name = candle.get('TOKEN_NAME') or candle.get('token_name')
-                    token_sym = candle.get('TOKEN_SYMBOL') or candle.get('token_symbol') or token_symbol.upper()
-                    
-                    # Convert date string to datetime
-                    date_time = self._parse_date(date_str)
-                    
-                    # Create unique combination key
-                    combination_key = f"{token_sym}_{date_time.isoformat()}"
-                    
-                    # Skip if we've already seen this combination
-                    if combination_key in seen_combinations:
-                        print(f"Skipping duplicate record: {combination_key}")
-                        continue
-                    
-                    seen_combinations.add(combination_key)
-                    
-                    # Handle different price field names
-                    open_price = candle.get('OPEN') or candle.get('open') or candle.get('open_price')
-                    high_price = candle.get('HIGH') or candle.get('high') or candle.get('high_price')
-                    low_price = candle.get('LOW') or candle.get('low') or candle.get('low_price')
-                    close_price = candle.get('CLOSE') or candle.get('close') or candle.get('close_price')
-                    volume = candle.get('VOLUME') or candle.get('volume')
-                    
-                    # Prepare record
-                    record = {
-                        'user_id': USER_ID,
-                        'token_id': token_id,
-                        'token_name': token_name,
-                        'token_symbol': token_sym,
-                        'date_time': date_time.isoformat(),
-                        'open_price': float(open_price) if open_price is not None else None,
-                        'high_price': float(high_price) if high_price is not None else None,
-                        'low_price': float(low_price) if low_price is not None else None,
-                        'close_price': float(close_price) if close_price is not None else None,
-                        'volume': float(volume) if volume is not None else None
-                    }
-                    
-                    # Debug: Print the first record structure
-                    if i == 0:
-                        print(f"Sample record structure: {record}")
-                    
-                    db_data.append(record)
-                    
-                except Exception as e:
-                    print(f"Error processing candle {i}: {e}")
-                    print(f"Candle data: {candle}")
-                    continue
+            db_data = self._prepare_ohlcv_records(token_symbol, ohlcv_data, date_fields, set())
             
             if not db_data:
                 print(f"No valid data to store for {token_symbol}")
@@ -131,111 +145,62 @@ class OHLCVStorage:
             print(f"Attempting to store {len(db_data)} unique records...")
             
             # Insert data with conflict resolution (upsert)
-            result = self.supabase.table('hourly_ohlcv').upsert(
+            result = self.supabase.table(table).upsert(
                 db_data,
                 on_conflict='token_symbol,date_time'  # Use simpler conflict key
             ).execute()
             
-            print(f"✅ Successfully stored {len(db_data)} hourly OHLCV records for {token_symbol.upper()}")
+            print(f"✅ Successfully stored {len(db_data)} {label} OHLCV records for {token_symbol.upper()}")
             return True
             
         except Exception as e:
-            print(f"❌ Error storing hourly OHLCV data for {token_symbol}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing %s OHLCV data for %s: %s", label, token_symbol, e)
             return False
     
-    def store_daily_ohlcv(self, token_symbol: str, ohlcv_data: List[Dict]) -> bool:
-        """Store daily OHLCV data in Supabase"""
+    def _store_ohlcv_bulk(self, table: str, label: str, ohlcv_by_symbol: Dict[str, List[Dict]], date_fields: tuple) -> bool:
+        """Store OHLCV candles for several tokens with a single upsert"""
         try:
-            if not ohlcv_data:
-                print(f"No daily OHLCV data to store for {token_symbol}")
-                return True
-            
-            print(f"Processing {len(ohlcv_data)} daily OHLCV records for {token_symbol}")
-            
-            # Prepare data for insertion
+            # One seen-set across all tokens: an upsert batch must not touch the same row twice
+            seen_combinations = set()
             db_data = []
-            seen_combinations = set()  # Track unique combinations
-            
-            for i, candle in enumerate(ohlcv_data):
-                try:
-                    # Debug: Print the first record
-                    if i == 0:
-                        print(f"Sample candle data: {candle}")
-                    
-                    # Handle different possible field names from API
-                    # For daily data, use DATE field
-                    date_str = candle.get('DATE') or candle.get('TIMESTAMP') or candle.get('date') or candle.get('timestamp')
-                    token_id = candle.get('TOKEN_ID') or candle.get('token_id')
-                    token_name = candle.get('TOKEN_NAME') or candle.get('token_name')
-                    token_sym = candle.get('TOKEN_SYMBOL') or candle.get('token_symbol') or token_symbol.upper()
-                    
-                    # Convert date string to datetime
-                    date_time = self._parse_date(date_str)
-                    
-                    # Create unique combination key
-                    combination_key = f"{token_sym}_{date_time.isoformat()}"
-                    
-                    # Skip if we've already seen this combination
-                    if combination_key in seen_combinations:
-                        print(f"Skipping duplicate record: {combination_key}")
-                        continue
-                    
-                    seen_combinations.add(combination_key)
-                    
-                    # Handle different price field names
-                    open_price = candle.get('OPEN') or candle.get('open') or candle.get('open_price')
-                    high_price = candle.get('HIGH') or candle.get('high') or candle.get('high_price')
-                    low_price = candle.get('LOW') or candle.get('low') or candle.get('low_price')
-                    close_price = candle.get('CLOSE') or candle.get('close') or candle.get('close_price')
-                    volume = candle.get('VOLUME') or candle.get('volume')
-                    
-                    # Prepare record
-                    record = {
-                        'user_id': USER_ID,
-                        'token_id': token_id,
-                        'token_name': token_name,
-                        'token_symbol': token_sym,
-                        'date_time': date_time.isoformat(),
-                        'open_price': float(open_price) if open_price is not None else None,
-                        'high_price': float(high_price) if high_price is not None else None,
-                        'low_price': float(low_price) if low_price is not None else None,
-                        'close_price': float(close_price) if close_price is not None else None,
-                        'volume': float(volume) if volume is not None else None
-                    }
-                    
-                    # Debug: Print the first record structure
-                    if i == 0:
-                        print(f"Sample record structure: {record}")
-                    
-                    db_data.append(record)
-                    
-                except Exception as e:
-                    print(f"Error processing candle {i}: {e}")
-                    print(f"Candle data: {candle}")
-                    continue
+            for token_symbol, ohlcv_data in ohlcv_by_symbol.items():
+                if ohlcv_data:
+                    db_data.extend(self._prepare_ohlcv_records(token_symbol, ohlcv_data, date_fields, seen_combinations))
             
             if not db_data:
-                print(f"No valid data to store for {token_symbol}")
-                return False
+                print(f"No {label} OHLCV data to store")
+                return True
             
-            print(f"Attempting to store {len(db_data)} unique records...")
+            print(f"Attempting to store {len(db_data)} unique {label} records for {len(ohlcv_by_symbol)} tokens...")
             
-            # Insert data with conflict resolution (upsert)
-            result = self.supabase.table('daily_ohlcv').upsert(
-                db_data,
-                on_conflict='token_symbol,date_time'  # Use simpler conflict key
-            ).execute()
+            for start in range(0, len(db_data), UPSERT_CHUNK_SIZE):
+                self.supabase.table(table).upsert(
+                    db_data[start:start + UPSERT_CHUNK_SIZE],
+                    on_conflict='token_symbol,date_time'
+                ).execute()
             
-            print(f"✅ Successfully stored {len(db_data)} daily OHLCV records for {token_symbol.upper()}")
+            print(f"✅ Successfully stored {len(db_data)} {label} OHLCV records")
             return True
             
         except Exception as e:
-            print(f"❌ Error storing daily OHLCV data for {token_symbol}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing %s OHLCV data in bulk: %s", label, e)
             return False
+    
+    def store_hourly_ohlcv(self, token_symbol: str, ohlcv_data: List[Dict]) -> bool:
+        """Store hourly OHLCV data in Supabase"""
+        return self._store_ohlcv('hourly_ohlcv', 'hourly', token_symbol, ohlcv_data, HOURLY_DATE_FIELDS)
+    
+    def store_daily_ohlcv(self, token_symbol: str, ohlcv_data: List[Dict]) -> bool:
+        """Store daily OHLCV data in Supabase"""
+        return self._store_ohlcv('daily_ohlcv', 'daily', token_symbol, ohlcv_data, DAILY_DATE_FIELDS)
+    
+    def store_hourly_ohlcv_bulk(self, ohlcv_by_symbol: Dict[str, List[Dict]]) -> bool:
+        """Store hourly OHLCV data for several tokens (symbol -> candles) in one request"""
+        return self._store_ohlcv_bulk('hourly_ohlcv', 'hourly', ohlcv_by_symbol, HOURLY_DATE_FIELDS)
+    
+    def store_daily_ohlcv_bulk(self, ohlcv_by_symbol: Dict[str, List[Dict]]) -> bool:
+        """Store daily OHLCV data for several tokens (symbol -> candles) in one request"""
+        return self._store_ohlcv_bulk('daily_ohlcv', 'daily', ohlcv_by_symbol, DAILY_DATE_FIELDS)
 
     def get_hourly_ohlcv(self, token_symbol: str, limit: int = 24) -> List[Dict]:
         """Retrieve hourly OHLCV data from Supabase"""
@@ -5,34 +5,27 @@ This module handles fetching resistance and support levels for tokens
 and storing them in Supabase
 """
 
+import logging
 import os
 import asyncio
-import aiohttp
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncContextManager
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 import httpx
-import base64
-from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
+from apis.token_metrics import PaidAPIClient
+from apis.supabase_client import get_supabase_client
 
 # Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
-API_BASE = "https://api.tokenmetrics.com"
-
-def load_account_from_b64(b64: str) -> Account:
-    raw = base64.b64decode(b64)
-    priv32 = raw[:32]  # first 32 bytes
-    return Account.from_key(priv32)
+logger = logging.getLogger(__name__)
 
 def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[str, Any]]:
     """
@@ -52,14 +45,10 @@ def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[st
     # else take first
     return norm[0] if norm else None
 
-class ResistanceSupportAPI:
-    def __init__(self):
+class ResistanceSupportAPI(PaidAPIClient):
+    def __init__(self, client: Optional[x402HttpxClient] = None, limiter: Optional[AsyncContextManager] = None):
         # Use X402 payment system like other APIs
-        self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
-        if not self.key_b64:
-            raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
-        self.account = load_account_from_b64(self.key_b64)
-        self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
+        super().__init__(client, limiter)
         
         # Initialize Supabase client
         self.supabase_url = os.getenv('SUPABASE_URL')
@@ -68,66 +57,65 @@ class ResistanceSupportAPI:
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Missing Supabase credentials: SUPABASE_URL, SUPABASE_KEY")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = get_supabase_client(self.supabase_url, self.supabase_key)
         
         print("✅ ResistanceSupportAPI initialized successfully")
     
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API using X402 payment system"""
         try:
-            async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-                # Preflight to get payment requirements
-                try:
-                    pre = await client.get(
-                        endpoint,
-                        headers={
-                            "x-coinbase-402": "true",
-                            "accept": "application/json",
-                            **(headers or {})
-                        },
-                    )
-                    
-                    if pre.status_code == 200:
-                        return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    
-                    # Expect 402 with accepts
-                    body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                    accepts = body.get("accepts", [])
-                    if not accepts:
-                        error_msg = f"No 'accepts' found in 402 challenge: {body}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    chosen = pick_payment_token_from_accepts(accepts)
-                    if not chosen:
-                        error_msg = f"Could not pick token from accepts: {accepts}"
-                        print(f"❌ API Error: {error_msg}")
-                        return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
-
-                    # Real call with payment
-                    payment_headers = {
+            # Preflight to get payment requirements
+            try:
+                pre = await self._get(
+                    endpoint,
+                    headers={
                         "x-coinbase-402": "true",
                         "accept": "application/json",
                         **(headers or {})
-                    }
-                    
-                    alias = (chosen.get("extra", {}) or {}).get("name")
-                    if alias:
-                        payment_headers["x-payment-token"] = alias.lower()
-                    else:
-                        if chosen.get("asset"):
-                            payment_headers["x-payment-token"] = str(chosen["asset"])
+                    },
+                )
+                
+                if pre.status_code == 200:
+                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                
+                # Expect 402 with accepts
+                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+                accepts = body.get("accepts", [])
+                if not accepts:
+                    error_msg = f"No 'accepts' found in 402 challenge: {body}"
+                    print(f"❌ API Error: {error_msg}")
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
 
-                    r = await client.get(endpoint, headers=payment_headers)
-                    return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+                chosen = pick_payment_token_from_accepts(accepts)
+                if not chosen:
+                    error_msg = f"Could not pick token from accepts: {accepts}"
+                    print(f"❌ API Error: {error_msg}")
+                    return {"error": error_msg, "status_code": pre.status_code, "response_body": body}
 
-                except httpx.TimeoutException as e:
-                    print(f"Request timed out for {endpoint}: {e}")
-                    return None
-                except Exception as e:
-                    print(f"Request failed for {endpoint}: {e}")
-                    return None
-                    
+                # Real call with payment
+                payment_headers = {
+                    "x-coinbase-402": "true",
+                    "accept": "application/json",
+                    **(headers or {})
+                }
+                
+                alias = (chosen.get("extra", {}) or {}).get("name")
+                if alias:
+                    payment_headers["x-payment-token"] = alias.lower()
+                else:
+                    if chosen.get("asset"):
+                        payment_headers["x-payment-token"] = str(chosen["asset"])
+
+                r = await self._get(endpoint, headers=payment_headers)
+                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+
+            except httpx.TimeoutException as e:
+                print(f"Request timed out for {endpoint}: {e}")
+                return None
+            except Exception as e:
+                print(f"Request failed for {endpoint}: {e}")
+                return None
+                
         except Exception as e:
             print(f"Error in _make_paid_request: {e}")
             return None
@@ -286,9 +274,7 @@ class ResistanceSupportAPI:
                 return False
                 
         except Exception as e:
-            print(f"❌ Error storing resistance support data for {token_symbol}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing resistance support data for %s: %s", token_symbol, e)
             return False
     
     async def get_stored_resistance_support_data(self, token_symbol: str) -> Optional[Dict[str, Any]]:
@@ -515,9 +501,7 @@ async def main():
             print(f"   Token ID {token_id}: {data.get('TOKEN_NAME')} - {len(data.get('HISTORICAL_RESISTANCE_SUPPORT_LEVELS', []))} levels")
         
     except Exception as e:
-        print(f"❌ Test failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Test failed: %s", e)
 
 if __name__ == "__main__":
     asyncio.run(main())
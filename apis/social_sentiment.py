@@ -1,18 +1,19 @@
-import requests
 import os
 import sys
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import json
 import urllib.parse  # Add this import for URL decoding
+from typing import Optional
+import httpx
 
 # Add Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+from apis.supabase_client import get_supabase_client
 
 load_dotenv()
 
@@ -27,8 +28,8 @@ def get_today_timestamp():
     today = datetime.now(timezone.utc)
     return int(today.timestamp())
 
-async def fetch_social_sentiment(token, start_date=None, end_date=None):
-    """Fetch social sentiment data for a given token"""
+async def fetch_social_sentiment(token, start_date=None, end_date=None, client: Optional[httpx.AsyncClient] = None):
+    """Fetch social sentiment data for a given token, reusing `client`'s connection pool when given"""
     
     # Use today's date if not provided
     if start_date is None:
@@ -46,13 +47,15 @@ async def fetch_social_sentiment(token, start_date=None, end_date=None):
     print(f"Using API key: {'Set' if LUNAR_CRUSH_API else 'Not set'}")
     
     try:
-        import httpx
-        async with httpx.AsyncClient() as client:
+        if client is None:
+            async with httpx.AsyncClient() as own_client:
+                response = await own_client.get(url, headers=headers)
+        else:
             response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            print(f"Received {len(data.get('data', []))} posts from API")
-            return data
+        response.raise_for_status()
+        data = response.json()
+        print(f"Received {len(data.get('data', []))} posts from API")
+        return data
     except Exception as e:
         print(f"Error fetching data: {e}")
         return None
@@ -116,8 +119,15 @@ def filter_posts(posts_data):
     
     return filtered_posts
 
+# Rows per insert request when storing posts in bulk
+POSTS_INSERT_CHUNK_SIZE = 10_000
+
 def store_in_supabase(posts, token_symbol=None):
     """Store filtered posts in Supabase with duplicate handling"""
+    return store_in_supabase_bulk(posts)
+
+def store_in_supabase_bulk(posts, chunk_size=POSTS_INSERT_CHUNK_SIZE):
+    """Store filtered posts (from any number of tokens) in Supabase, in chunks of `chunk_size` rows"""
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("Supabase credentials not found in environment variables")
         return False
@@ -127,35 +137,22 @@ def store_in_supabase(posts, token_symbol=None):
         return False
     
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
         
         if not posts:
             print("No posts to store")
             return False
         
-        # Check for existing posts to avoid duplicates
-        existing_links = set()
-        for post in posts:
-            post_link = post.get('post_link', '')
-            if post_link:
-                # Check if this post already exists
-                result = supabase.table('posts').select('post_link').eq('post_link', post_link).execute()
-                if result.data:
-                    existing_links.add(post_link)
-        
-        # Filter out posts that already exist
-        new_posts = [post for post in posts if post.get('post_link', '') not in existing_links]
-        
-        if not new_posts:
-            print(f"All {len(posts)} posts already exist in database")
-            return True
-        
-        if existing_links:
-            print(f"Skipping {len(existing_links)} existing posts, inserting {len(new_posts)} new posts")
+        # Posts already stored (same post_link, see posts_post_link_unique) are skipped by the
+        # database itself, so no per-post existence check is needed
+        for start in range(0, len(posts), chunk_size):
+            supabase.table('posts').upsert(
+                posts[start:start + chunk_size],
+                on_conflict='post_link',
+                ignore_duplicates=True
+            ).execute()
         
-        # Insert only new posts
-        result = supabase.table('posts').insert(new_posts).execute()
-        print(f"Successfully stored {len(new_posts)} new posts in Supabase")
+        print(f"Successfully stored {len(posts)} posts in Supabase (existing posts skipped)")
         return True
             
     except Exception as e:
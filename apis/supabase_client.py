@@ -0,0 +1,27 @@
+from functools import lru_cache
+
+try:
+    from supabase import create_client, Client
+except ImportError:
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+try:
+    # Newer supabase-py releases expect the sync-specific options class for create_client
+    from supabase.lib.client_options import SyncClientOptions as ClientOptions
+except ImportError:
+    try:
+        from supabase.lib.client_options import ClientOptions
+    except ImportError:
+        ClientOptions = None
+
+# Seconds before a Supabase (PostgREST) request times out
+SUPABASE_TIMEOUT = 20
+
+@lru_cache(maxsize=None)
+def get_supabase_client(url: str, key: str) -> Client:
+    """Create the Supabase client once per (url, key) and reuse it across the pipelines, storage classes and retrievers"""
+    # PostgREST keeps one keep-alive httpx pool per client, so every caller sharing this
+    # client reuses its open connections instead of paying a TLS handshake per request
+    if ClientOptions is None:
+        return create_client(url, key)
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
@@ -1,22 +1,20 @@
 import os
-import base64
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncContextManager
 from datetime import datetime, timezone
 import httpx
 import urllib.parse  # Add this import at the top
 
 from dotenv import load_dotenv
-from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
+from apis.token_metrics import PaidAPIClient
+from apis.supabase_client import get_supabase_client
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
@@ -26,10 +24,8 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
-def load_account_from_b64(b64: str) -> Account:
-    raw = base64.b64decode(b64)
-    priv32 = raw[:32]  # first 32 bytes
-    return Account.from_key(priv32)
+# How many per-name /v2/tokens lookups may run at once
+TOKEN_NAME_LOOKUP_CONCURRENCY = 3
 
 def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[str, Any]]:
     """
@@ -49,70 +45,65 @@ def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[st
     # else take first
     return norm[0] if norm else None
 
-class TokenDataAPI:
-    def __init__(self):
-        self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
-        if not self.key_b64:
-            raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
-        self.account = load_account_from_b64(self.key_b64)
-        self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
+class TokenDataAPI(PaidAPIClient):
+    def __init__(self, client: Optional[x402HttpxClient] = None, limiter: Optional[AsyncContextManager] = None):
+        super().__init__(client, limiter)
         
         # Initialize Supabase client
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Missing Supabase credentials")
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
         self.user_id = USER_ID
     
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API"""
-        async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-            # Preflight to get payment requirements
-            try:
-                pre = await client.get(
-                    endpoint,
-                    headers={
-                        "x-coinbase-402": "true",
-                        "accept": "application/json",
-                        **(headers or {})
-                    },
-                )
-                
-                if pre.status_code == 200:
-                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                
-                # Expect 402 with accepts
-                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                accepts = body.get("accepts", [])
-                if not accepts:
-                    raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
-
-                chosen = pick_payment_token_from_accepts(accepts)
-                if not chosen:
-                    raise RuntimeError(f"Could not pick token from accepts: {accepts}")
-
-                # Real call with payment
-                payment_headers = {
+        # Preflight to get payment requirements
+        try:
+            pre = await self._get(
+                endpoint,
+                headers={
                     "x-coinbase-402": "true",
                     "accept": "application/json",
                     **(headers or {})
-                }
-                
-                alias = (chosen.get("extra", {}) or {}).get("name")
-                if alias:
-                    payment_headers["x-payment-token"] = alias.lower()
-                else:
-                    if chosen.get("asset"):
-                        payment_headers["x-payment-token"] = str(chosen["asset"])
+                },
+            )
+            
+            if pre.status_code == 200:
+                return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            
+            # Expect 402 with accepts
+            body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            accepts = body.get("accepts", [])
+            if not accepts:
+                raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
+
+            chosen = pick_payment_token_from_accepts(accepts)
+            if not chosen:
+                raise RuntimeError(f"Could not pick token from accepts: {accepts}")
+
+            # Real call with payment
+            payment_headers = {
+                "x-coinbase-402": "true",
+                "accept": "application/json",
+                **(headers or {})
+            }
+            
+            alias = (chosen.get("extra", {}) or {}).get("name")
+            if alias:
+                payment_headers["x-payment-token"] = alias.lower()
+            else:
+                if chosen.get("asset"):
+                    payment_headers["x-payment-token"] = str(chosen["asset"])
 
-                r = await client.get(endpoint, headers=payment_headers)
-                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+            r = await self._get(endpoint, headers=payment_headers)
+            return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
 
-            except httpx.TimeoutException as e:
-                print(f"Request timed out for {endpoint}: {e}")
-                return None
-            except Exception as e:
-                print(f"Request failed for {endpoint}: {e}")
-                return None
+        except httpx.TimeoutException as e:
+            print(f"Request timed out for {endpoint}: {e}")
+            return None
+        except Exception as e:
+            print(f"Request failed for {endpoint}: {e}")
+            return None
     
     async def get_token_data_by_ids(self, token_ids: List[int]) -> Optional[List[Dict]]:
         """
@@ -141,7 +132,7 @@ class TokenDataAPI:
     
     async def get_token_data_by_names(self, token_names: List[str]) -> Optional[List[Dict]]:
         """
-        Get token data for specific token names - one API call per token
+        Get token data for specific token names - one API call per token, run concurrently
         
         Args:
             token_names: List of token names to fetch data for
@@ -150,43 +141,47 @@ class TokenDataAPI:
             print("No token names provided")
             return None
         
-        all_token_data = []
-        seen_tokens = set()  # Track tokens we've already processed
-        
+        # Skip duplicate token names up front so each name is requested once
+        unique_names = []
         for token_name in token_names:
-            try:
-                # Skip if we've already processed this token name
-                if token_name in seen_tokens:
-                    print(f"⚠️ Skipping duplicate token name: {token_name}")
-                    continue
-                
-                seen_tokens.add(token_name)
-                
+            if token_name in unique_names:
+                print(f"⚠️ Skipping duplicate token name: {token_name}")
+                continue
+            unique_names.append(token_name)
+        
+        # The lookups are independent, so run them concurrently; the semaphore (and the shared
+        # limiter, when set) paces them instead of a fixed delay between calls
+        semaphore = asyncio.Semaphore(TOKEN_NAME_LOOKUP_CONCURRENCY)
+        
+        async def fetch_token_name(token_name: str) -> Optional[Dict]:
+            async with semaphore:
                 # 🆕 FIX: Use token names directly without URL encoding
                 # The TokenMetrics API can handle spaces in token names
                 endpoint = f"/v2/tokens?token_name={token_name}"
                 print(f"Fetching token data for: {token_name}")
                 print(f"Full endpoint: {API_BASE}{endpoint}")
-                
-                result = await self._make_paid_request(endpoint)
-                
-                if result and result.get('success') and 'data' in result and result['data']:
-                    print(f"✅ Successfully fetched token data for {token_name}")
-                    # Filter out any duplicate records from the API response
-                    for record in result['data']:
-                        token_symbol = record.get('TOKEN_SYMBOL', '').upper()
-                        if token_symbol and f"{token_symbol}_{record.get('TOKEN_ID')}" not in seen_tokens:
-                            all_token_data.append(record)
-                            seen_tokens.add(f"{token_symbol}_{record.get('TOKEN_ID')}")
-                else:
-                    print(f"❌ Failed to fetch token data for {token_name}. Response: {result}")
-                
-                # Add small delay between API calls to avoid rate limiting
-                await asyncio.sleep(0.5)
-                
-            except Exception as e:
-                print(f"❌ Error fetching data for {token_name}: {e}")
+                return await self._make_paid_request(endpoint)
+        
+        results = await asyncio.gather(*(fetch_token_name(name) for name in unique_names), return_exceptions=True)
+        
+        all_token_data = []
+        seen_tokens = set()  # Track tokens we've already processed
+        
+        for token_name, result in zip(unique_names, results):
+            if isinstance(result, Exception):
+                print(f"❌ Error fetching data for {token_name}: {result}")
                 continue
+            
+            if result and result.get('success') and 'data' in result and result['data']:
+                print(f"✅ Successfully fetched token data for {token_name}")
+                # Filter out any duplicate records from the API response
+                for record in result['data']:
+                    token_symbol = record.get('TOKEN_SYMBOL', '').upper()
+                    if token_symbol and f"{token_symbol}_{record.get('TOKEN_ID')}" not in seen_tokens:
+                        all_token_data.append(record)
+                        seen_tokens.add(f"{token_symbol}_{record.get('TOKEN_ID')}")
+            else:
+                print(f"❌ Failed to fetch token data for {token_name}. Response: {result}")
         
         if all_token_data:
             print(f"✅ Successfully fetched token data for {len(all_token_data)} total records")
@@ -198,12 +193,10 @@ class TokenDataAPI:
     def check_existing_tokens(self, token_symbols: List[str]) -> set:
         """Check which tokens already exist in the database"""
         try:
-            existing_tokens = set()
-            for symbol in token_symbols:
-                result = self.supabase.table('tokens').select('token_symbol').eq('token_symbol', symbol).eq('user_id', self.user_id).execute()
-                if result.data:
-                    existing_tokens.add(symbol)
-            return existing_tokens
+            if not token_symbols:
+                return set()
+            result = self.supabase.table('tokens').select('token_symbol').in_('token_symbol', token_symbols).eq('user_id', self.user_id).execute()
+            return {row['token_symbol'] for row in result.data or []}
         except Exception as e:
             print(f"Error checking existing tokens: {e}")
             return set()
@@ -280,30 +273,11 @@ class TokenDataAPI:
             
             print(f"Inserting {len(db_data)} unique token records...")
             
-            # Store in database
-            for record in db_data:
-                try:
-                    # Check if token already exists
-                    existing = self.supabase.table('tokens').select('id, created_at').eq('user_id', record['user_id']).eq('token_symbol', record['token_symbol']).execute()
-                    
-                    if existing.data:
-                        # Update existing record
-                        update_result = self.supabase.table('tokens').update(record).eq('id', existing.data[0]['id']).execute()
-                        if update_result.data:
-                            print(f"✅ Updated token: {record['token_symbol']}")
-                        else:
-                            print(f"❌ Failed to update token: {record['token_symbol']}")
-                    else:
-                        # Insert new record
-                        insert_result = self.supabase.table('tokens').insert(record).execute()
-                        if insert_result.data:
-                            print(f"✅ Inserted new token: {record['token_symbol']}")
-                        else:
-                            print(f"❌ Failed to insert token: {record['token_symbol']}")
-                            
-                except Exception as e:
-                    print(f"❌ Error storing token {record.get('token_symbol', 'unknown')}: {e}")
-                    continue
+            # Store in database with one upsert on the tokens table's UNIQUE(token_symbol, token_id)
+            self.supabase.table('tokens').upsert(
+                db_data,
+                on_conflict='token_symbol,token_id'
+            ).execute()
             
             print(f"✅ Successfully processed {len(db_data)} token records")
             return True
@@ -2,18 +2,49 @@ import os
 import base64
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, List, AsyncContextManager, Tuple
 from datetime import datetime, timezone, date
+from functools import lru_cache
 import httpx
 
 from dotenv import load_dotenv
 from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
 
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Optional persistent cache for Token Metrics responses, shared across runs
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 API_BASE = "https://api.tokenmetrics.com"
 
+# On-disk response cache (set CRYPTOAGENT_API_CACHE=0 to disable). Responses are cached per
+# time bucket of the endpoint's TTL, so hourly data is refetched each hour and grades each day
+RESPONSE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'cryptoagent', 'token_metrics')
+DEFAULT_RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE_TTLS = {
+    '/v2/fundamental-grade': 24 * 3600,
+    '/v2/ai-reports': 24 * 3600,
+}
+# How long to keep an endpoint's ETag/Last-Modified validators (and body) for conditional GETs
+# once its time bucket has expired; a 304 answer then reuses the stored body
+RESPONSE_VALIDATOR_TTL = 7 * 24 * 3600
+
 def load_account_from_b64(b64: str) -> Account:
     raw = base64.b64decode(b64)
     priv32 = raw[:32]  # first 32 bytes
@@ -37,68 +68,203 @@ def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[st
     # else take first
     return norm[0] if norm else None
 
+def create_paid_client(**kwargs) -> x402HttpxClient:
+    """Create a paid Token Metrics client from X402_PRIVATE_KEY_B64, to be shared across the API helpers"""
+    key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
+    if not key_b64:
+        raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
+    kwargs.setdefault("timeout", httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0))
+    # HTTP/2 multiplexes concurrent requests over one connection when h2 is installed
+    kwargs.setdefault("http2", HTTP2_AVAILABLE)
+    return x402HttpxClient(account=load_account_from_b64(key_b64), base_url=API_BASE, **kwargs)
+
+# Responses worth retrying (rate limited or transient server errors) and the backoff for them
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_REQUEST_ATTEMPTS = 4
+BACKOFF_BASE_DELAY = 1.0
+BACKOFF_MAX_DELAY = 30.0
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait via Retry-After (delta-seconds or HTTP date), if any"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> Optional["diskcache.Cache"]:
+    """Open the on-disk response cache once, or None when diskcache is missing or caching is disabled"""
+    if diskcache is None or os.getenv('CRYPTOAGENT_API_CACHE') == '0':
+        return None
+    return diskcache.Cache(RESPONSE_CACHE_DIR)
+
+def response_cache_key(endpoint: str) -> Tuple[str, int]:
+    """Cache key for an endpoint (path and query) in its current time bucket, and that bucket's TTL"""
+    ttl = RESPONSE_CACHE_TTLS.get(endpoint.split('?', 1)[0], DEFAULT_RESPONSE_CACHE_TTL)
+    return f"{endpoint}|{int(time.time() // ttl)}", ttl
+
+def conditional_headers(validators: Optional[Tuple[Optional[str], Optional[str], bytes]]) -> Dict[str, str]:
+    """If-None-Match/If-Modified-Since headers built from a stored (etag, last_modified, body) entry"""
+    headers = {}
+    if validators is not None:
+        etag, last_modified, _ = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
+
+def is_cacheable_body(content: bytes) -> bool:
+    """Whether a 200 body is a real result: Token Metrics reports failures inside a 200 as {"success": false}"""
+    try:
+        body = json.loads(content.decode("utf-8", errors="ignore") or "{}")
+    except ValueError:
+        return False
+    return isinstance(body, dict) and bool(body.get("success")) and bool(body.get("data"))
+
+async def get_with_backoff(client: httpx.AsyncClient, endpoint: str,
+                           limiter: Optional[AsyncContextManager] = None, **kwargs) -> httpx.Response:
+    """GET through the client, waiting on the rate limiter when one is set and backing off only on 429/5xx"""
+    cache = get_response_cache()
+    validators = None
+    if cache is not None:
+        cache_key, ttl = response_cache_key(endpoint)
+        content = cache.get(cache_key)
+        if content is not None:
+            return httpx.Response(200, content=content)
+        
+        # Bucket expired: revalidate the last body we saw instead of downloading it again
+        validators_key = f"{endpoint}|validators"
+        validators = cache.get(validators_key)
+        revalidate = conditional_headers(validators)
+        if revalidate:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **revalidate}
+    
+    for attempt in range(MAX_REQUEST_ATTEMPTS):
+        if limiter is None:
+            response = await client.get(endpoint, **kwargs)
+        else:
+            async with limiter:
+                response = await client.get(endpoint, **kwargs)
+        
+        if response.status_code == 304 and validators is not None:
+            # Not modified: serve the stored body and start a new bucket with it
+            content = validators[2]
+            cache.set(cache_key, content, expire=ttl)
+            return httpx.Response(200, content=content)
+        
+        if response.status_code == 200 and cache is not None:
+            # Paid responses are cached too, so reruns within the bucket cost nothing; failures
+            # and empty results reported inside a 200 are not, so the next run retries them
+            content = await response.aread()
+            if not is_cacheable_body(content):
+                return response
+            cache.set(cache_key, content, expire=ttl)
+            etag = response.headers.get("etag")
+            last_modified = response.headers.get("last-modified")
+            if etag or last_modified:
+                cache.set(validators_key, (etag, last_modified, content), expire=RESPONSE_VALIDATOR_TTL)
+        
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_REQUEST_ATTEMPTS - 1:
+            return response
+        
+        delay = retry_after_seconds(response)
+        if delay is None:
+            delay = BACKOFF_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+        delay = min(delay, BACKOFF_MAX_DELAY)
+        logger.warning("⚠️ %s returned %s, retrying in %.1f seconds... (attempt %d/%d)", endpoint, response.status_code, delay, attempt + 1, MAX_REQUEST_ATTEMPTS)
+        await asyncio.sleep(delay)
+
 def get_today_date() -> str:
     """Get today's date in YYYY-MM-DD format"""
     return date.today().strftime('%Y-%m-%d')
 
-class TokenMetricsAPI:
-    def __init__(self):
+class PaidAPIClient:
+    """Base for the Token Metrics API helpers: one paid client (injected or created lazily) and an optional rate limiter"""
+    def __init__(self, client: Optional[x402HttpxClient] = None, limiter: Optional[AsyncContextManager] = None):
         self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
         if not self.key_b64:
             raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
         self.account = load_account_from_b64(self.key_b64)
         self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
+        # Shared paid client (may be injected by the caller); created lazily otherwise
+        self.client = client
+        # Optional shared rate limiter (e.g. aiolimiter.AsyncLimiter) entered around every request
+        self.limiter = limiter
+    
+    def _get_client(self) -> x402HttpxClient:
+        """Return the long-lived paid client, creating one on first use so connections are reused"""
+        if self.client is None:
+            self.client = x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts)
+        return self.client
+    
+    async def _get(self, endpoint: str, **kwargs) -> httpx.Response:
+        """GET through the paid client, waiting on the rate limiter and retrying 429/5xx with backoff"""
+        return await get_with_backoff(self._get_client(), endpoint, self.limiter, **kwargs)
     
+    async def aclose(self):
+        """Close the paid client"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class TokenMetricsAPI(PaidAPIClient):
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API"""
-        async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-            # Preflight to get payment requirements
-            try:
-                pre = await client.get(
-                    endpoint,
-                    headers={
-                        "x-coinbase-402": "true",
-                        "accept": "application/json",
-                        **(headers or {})
-                    },
-                )
-                
-                if pre.status_code == 200:
-                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                
-                # Expect 402 with accepts
-                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                accepts = body.get("accepts", [])
-                if not accepts:
-                    raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
-
-                chosen = pick_payment_token_from_accepts(accepts)
-                if not chosen:
-                    raise RuntimeError(f"Could not pick token from accepts: {accepts}")
-
-                # Real call with payment
-                payment_headers = {
+        # Preflight to get payment requirements
+        try:
+            pre = await self._get(
+                endpoint,
+                headers={
                     "x-coinbase-402": "true",
                     "accept": "application/json",
                     **(headers or {})
-                }
-                
-                alias = (chosen.get("extra", {}) or {}).get("name")
-                if alias:
-                    payment_headers["x-payment-token"] = alias.lower()
-                else:
-                    if chosen.get("asset"):
-                        payment_headers["x-payment-token"] = str(chosen["asset"])
+                },
+            )
+            
+            if pre.status_code == 200:
+                return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            
+            # Expect 402 with accepts
+            body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            accepts = body.get("accepts", [])
+            if not accepts:
+                raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
+
+            chosen = pick_payment_token_from_accepts(accepts)
+            if not chosen:
+                raise RuntimeError(f"Could not pick token from accepts: {accepts}")
+
+            # Real call with payment
+            payment_headers = {
+                "x-coinbase-402": "true",
+                "accept": "application/json",
+                **(headers or {})
+            }
+            
+            alias = (chosen.get("extra", {}) or {}).get("name")
+            if alias:
+                payment_headers["x-payment-token"] = alias.lower()
+            else:
+                if chosen.get("asset"):
+                    payment_headers["x-payment-token"] = str(chosen["asset"])
 
-                r = await client.get(endpoint, headers=payment_headers)
-                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+            r = await self._get(endpoint, headers=payment_headers)
+            return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
 
-            except httpx.TimeoutException as e:
-                print(f"Request timed out for {endpoint}: {e}")
-                return None
-            except Exception as e:
-                print(f"Request failed for {endpoint}: {e}")
-                return None
+        except httpx.TimeoutException as e:
+            print(f"Request timed out for {endpoint}: {e}")
+            return None
+        except Exception as e:
+            print(f"Request failed for {endpoint}: {e}")
+            return None
     
     async def get_tokens(self, limit: int = 3, page: int = 1, category: str = None, exchange: str = None) -> Optional[List[Dict]]:
         """
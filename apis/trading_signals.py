@@ -1,24 +1,16 @@
 import os
-import base64
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncContextManager
 from datetime import datetime, timezone, date
 import httpx
 
 from dotenv import load_dotenv
-from eth_account import Account
 from x402.clients.httpx import x402HttpxClient
+from apis.token_metrics import PaidAPIClient
 
 load_dotenv()
 
-API_BASE = "https://api.tokenmetrics.com"
-
-def load_account_from_b64(b64: str) -> Account:
-    raw = base64.b64decode(b64)
-    priv32 = raw[:32]  # first 32 bytes
-    return Account.from_key(priv32)
-
 def pick_payment_token_from_accepts(accepts: list[str|dict]) -> Optional[Dict[str, Any]]:
     """
     Normalize and pick the first accept entry. Prefer USDC if present, else take TMAI.
@@ -42,64 +34,56 @@ def get_today_date() -> str:
     # Use UTC timezone to ensure we get the correct current date
     return datetime.now(timezone.utc).strftime('%Y-%m-%d')
 
-class TradingSignalsAPI:
-    def __init__(self):
-        self.key_b64 = os.environ.get("X402_PRIVATE_KEY_B64")
-        if not self.key_b64:
-            raise RuntimeError("Missing X402_PRIVATE_KEY_B64 in env.")
-        self.account = load_account_from_b64(self.key_b64)
-        self.timeouts = httpx.Timeout(connect=20.0, read=120.0, write=20.0, pool=20.0)
-    
+class TradingSignalsAPI(PaidAPIClient):
     async def _make_paid_request(self, endpoint: str, headers: Dict[str, str] = None) -> Optional[Dict]:
         """Make a paid request to Token Metrics API"""
-        async with x402HttpxClient(account=self.account, base_url=API_BASE, timeout=self.timeouts) as client:
-            # Preflight to get payment requirements
-            try:
-                pre = await client.get(
-                    endpoint,
-                    headers={
-                        "x-coinbase-402": "true",
-                        "accept": "application/json",
-                        **(headers or {})
-                    },
-                )
-                
-                if pre.status_code == 200:
-                    return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                
-                # Expect 402 with accepts
-                body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
-                accepts = body.get("accepts", [])
-                if not accepts:
-                    raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
-
-                chosen = pick_payment_token_from_accepts(accepts)
-                if not chosen:
-                    raise RuntimeError(f"Could not pick token from accepts: {accepts}")
-
-                # Real call with payment
-                payment_headers = {
+        # Preflight to get payment requirements
+        try:
+            pre = await self._get(
+                endpoint,
+                headers={
                     "x-coinbase-402": "true",
                     "accept": "application/json",
                     **(headers or {})
-                }
-                
-                alias = (chosen.get("extra", {}) or {}).get("name")
-                if alias:
-                    payment_headers["x-payment-token"] = alias.lower()
-                else:
-                    if chosen.get("asset"):
-                        payment_headers["x-payment-token"] = str(chosen["asset"])
+                },
+            )
+            
+            if pre.status_code == 200:
+                return json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            
+            # Expect 402 with accepts
+            body = json.loads((await pre.aread()).decode("utf-8", errors="ignore") or "{}")
+            accepts = body.get("accepts", [])
+            if not accepts:
+                raise RuntimeError(f"No 'accepts' found in 402 challenge: {body}")
+
+            chosen = pick_payment_token_from_accepts(accepts)
+            if not chosen:
+                raise RuntimeError(f"Could not pick token from accepts: {accepts}")
+
+            # Real call with payment
+            payment_headers = {
+                "x-coinbase-402": "true",
+                "accept": "application/json",
+                **(headers or {})
+            }
+            
+            alias = (chosen.get("extra", {}) or {}).get("name")
+            if alias:
+                payment_headers["x-payment-token"] = alias.lower()
+            else:
+                if chosen.get("asset"):
+                    payment_headers["x-payment-token"] = str(chosen["asset"])
 
-                r = await client.get(endpoint, headers=payment_headers)
-                return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
+            r = await self._get(endpoint, headers=payment_headers)
+            return json.loads((await r.aread()).decode("utf-8", errors="ignore") or "{}")
 
-            except httpx.TimeoutException as e:
-                print(f"Request timed out for {endpoint}: {e}")
-                return None
-            except Exception as e:
-                print(f"Request failed for {endpoint}: {e}")
-                return None
+        except httpx.TimeoutException as e:
+            print(f"Request timed out for {endpoint}: {e}")
+            return None
+        except Exception as e:
+            print(f"Request failed for {endpoint}: {e}")
+            return None
     
     async def get_trading_signals(self, token_symbols: str, start_date: str = None) -> Optional[List[Dict]]:
         """
@@ -1,26 +1,32 @@
+import logging
 import os
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
+
+from apis.supabase_client import get_supabase_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
+# Rows per upsert request; larger batches are split to stay under PostgREST payload limits
+UPSERT_CHUNK_SIZE = 1000
+
 class TradingSignalsStorage:
     def __init__(self):
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Missing Supabase credentials")
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     def _parse_date(self, date_str: str) -> datetime:
         """Parse date string with multiple format support"""
@@ -134,18 +140,17 @@ class TradingSignalsStorage:
             print(f"Attempting to store {len(db_data)} unique records...")
             
             # Insert data with conflict resolution (upsert)
-            result = self.supabase.table('trading_signals').upsert(
-                db_data,
-                on_conflict='token_symbol,date_time'  # Use simpler conflict key
-            ).execute()
+            for start in range(0, len(db_data), UPSERT_CHUNK_SIZE):
+                self.supabase.table('trading_signals').upsert(
+                    db_data[start:start + UPSERT_CHUNK_SIZE],
+                    on_conflict='token_symbol,date_time'  # Use simpler conflict key
+                ).execute()
             
             print(f"✅ Successfully stored {len(db_data)} trading signals records")
             return True
             
         except Exception as e:
-            print(f"❌ Error storing trading signals data: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing trading signals data: %s", e)
             return False
 
     def get_trading_signals(self, token_symbol: str, limit: int = 30) -> List[Dict]:
@@ -123,14 +123,58 @@ CREATE TABLE IF NOT EXISTS embeddings (
 -- Change the embeddings table to allow both integer and UUID content_ids
 ALTER TABLE embeddings ALTER COLUMN content_id TYPE TEXT;
 
+-- int8-quantized copy of embedding_vector (1 byte per dimension) for compact similarity scoring
+ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS embedding_i8 BYTEA;
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_embeddings_content_type ON embeddings(content_type);
 CREATE INDEX IF NOT EXISTS idx_embeddings_content_id ON embeddings(content_id);
 CREATE INDEX IF NOT EXISTS idx_embeddings_token_symbol ON embeddings(token_symbol);
+CREATE INDEX IF NOT EXISTS idx_embeddings_token_name ON embeddings(token_name);
 CREATE INDEX IF NOT EXISTS idx_embeddings_created_at ON embeddings(created_at);
 
 -- Use IVFFlat index with smaller dimensions
 CREATE INDEX IF NOT EXISTS idx_embeddings_vector ON embeddings USING ivfflat (embedding_vector vector_cosine_ops) WITH (lists = 100);
+
+-- Token with the most embeddings (used by the retriever's fallback token selection)
+CREATE OR REPLACE FUNCTION top_token_by_volume()
+RETURNS TABLE (token_name VARCHAR, embedding_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT e.token_name, COUNT(*) AS embedding_count
+    FROM embeddings e
+    WHERE e.token_name IS NOT NULL
+    GROUP BY e.token_name
+    ORDER BY embedding_count DESC
+    LIMIT 1;
+$$;
+
+-- Distinct token names across posts and ai_reports (used to pick tokens for the embedding pipeline)
+CREATE OR REPLACE FUNCTION embedding_token_names()
+RETURNS TABLE (token_name VARCHAR)
+LANGUAGE sql STABLE AS $$
+    SELECT p.token_name::VARCHAR FROM posts p WHERE p.token_name IS NOT NULL
+    UNION
+    SELECT r.token_name FROM ai_reports r WHERE r.token_name IS NOT NULL;
+$$;
+
+-- Last time each token's posts and AI reports were embedded (lets the embedding pipeline skip unchanged tokens)
+CREATE TABLE IF NOT EXISTS embedding_watermarks (
+    token_name VARCHAR(100) PRIMARY KEY,
+    last_embedded_at TIMESTAMPTZ NOT NULL
+);
+
+-- Token names with posts or ai_reports newer than their embedding watermark (or never embedded)
+CREATE OR REPLACE FUNCTION embedding_tokens_with_new_data()
+RETURNS TABLE (token_name VARCHAR)
+LANGUAGE sql STABLE AS $$
+    SELECT p.token_name::VARCHAR FROM posts p
+    LEFT JOIN embedding_watermarks w ON w.token_name = p.token_name
+    WHERE p.token_name IS NOT NULL AND (w.last_embedded_at IS NULL OR p.ingested_at > w.last_embedded_at)
+    UNION
+    SELECT r.token_name FROM ai_reports r
+    LEFT JOIN embedding_watermarks w ON w.token_name = r.token_name
+    WHERE r.token_name IS NOT NULL AND (w.last_embedded_at IS NULL OR r.created_at > w.last_embedded_at);
+$$;
 -- Create index for better performance
 CREATE INDEX IF NOT EXISTS idx_hourly_ohlcv_token_symbol ON hourly_ohlcv(token_symbol);
 CREATE INDEX IF NOT EXISTS idx_hourly_ohlcv_date_time ON hourly_ohlcv(date_time);
@@ -149,6 +193,8 @@ create index if not exists posts_interactions_idx on public.posts (interactions_
 CREATE INDEX IF NOT EXISTS idx_ai_reports_token_symbol ON ai_reports(token_symbol);
 CREATE INDEX IF NOT EXISTS idx_ai_reports_token_id ON ai_reports(token_id);
 CREATE INDEX IF NOT EXISTS idx_ai_reports_created_at ON ai_reports(created_at);
+-- Lets embedding_token_names() read distinct names from the index instead of the report rows
+CREATE INDEX IF NOT EXISTS idx_ai_reports_token_name ON ai_reports(token_name);
 
 -- Create index for fundamental_grade table
 CREATE INDEX IF NOT EXISTS idx_fundamental_grade_token_symbol ON fundamental_grade(token_symbol);
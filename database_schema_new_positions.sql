@@ -22,6 +22,44 @@ CREATE INDEX IF NOT EXISTS idx_new_positions_status ON new_positions(status);
 CREATE INDEX IF NOT EXISTS idx_new_positions_created_at ON new_positions(created_at);
 CREATE INDEX IF NOT EXISTS idx_new_positions_symbol_status ON new_positions(symbol, status);
 
+-- Day a recommendation was made; with symbol and entry price it identifies a position, so
+-- storing the same recommendations again skips them instead of inserting duplicates
+ALTER TABLE new_positions ADD COLUMN IF NOT EXISTS created_date DATE NOT NULL DEFAULT (now() AT TIME ZONE 'utc')::date;
+
+-- Backfill existing rows with the UTC day they were created (adding the column stamps them all with today)
+UPDATE new_positions
+SET created_date = (created_at AT TIME ZONE 'utc')::date
+WHERE created_at IS NOT NULL AND created_date <> (created_at AT TIME ZONE 'utc')::date;
+
+-- Remove duplicates already stored before the unique index existed, but only exact copies
+-- (every column except id and timestamps equal), keeping the earliest; no information is lost
+DELETE FROM new_positions a
+USING new_positions b
+WHERE a.symbol = b.symbol
+  AND a.entry_price = b.entry_price
+  AND a.created_date = b.created_date
+  AND a.id > b.id
+  AND (to_jsonb(a) - 'id' - 'created_at' - 'updated_at') = (to_jsonb(b) - 'id' - 'created_at' - 'updated_at');
+
+-- Duplicates that differ (e.g. one closed and one active) are left for manual review: the
+-- unique index is only created once none remain, and they are listed otherwise
+DO $$
+DECLARE
+    duplicate_keys INTEGER;
+BEGIN
+    SELECT count(*) INTO duplicate_keys FROM (
+        SELECT 1 FROM new_positions
+        GROUP BY symbol, entry_price, created_date
+        HAVING count(*) > 1
+    ) duplicates;
+
+    IF duplicate_keys = 0 THEN
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_new_positions_symbol_entry_date ON new_positions(symbol, entry_price, created_date);
+    ELSE
+        RAISE WARNING 'new_positions has % (symbol, entry_price, created_date) keys with differing duplicate rows; review them with: SELECT * FROM new_positions WHERE (symbol, entry_price, created_date) IN (SELECT symbol, entry_price, created_date FROM new_positions GROUP BY 1, 2, 3 HAVING count(*) > 1) ORDER BY symbol, created_date, id; then re-run this file to create idx_new_positions_symbol_entry_date', duplicate_keys;
+    END IF;
+END $$;
+
 -- Create GIN index for text search on rationale
 CREATE INDEX IF NOT EXISTS idx_new_positions_rationale ON new_positions USING GIN (to_tsvector('english', rationale));
 
@@ -36,6 +74,7 @@ COMMENT ON COLUMN new_positions.target_2 IS 'Second profit target price';
 COMMENT ON COLUMN new_positions.rationale IS 'Detailed rationale for the trading recommendation';
 COMMENT ON COLUMN new_positions.status IS 'Position status: active, closed, or cancelled';
 COMMENT ON COLUMN new_positions.created_at IS 'Timestamp when this recommendation was created';
+COMMENT ON COLUMN new_positions.created_date IS 'UTC date when this recommendation was created';
 COMMENT ON COLUMN new_positions.updated_at IS 'Timestamp when this record was last updated';
 
 -- Create trigger to automatically update updated_at column
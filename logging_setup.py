@@ -0,0 +1,39 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Listener shared by every entry point (scripts, Streamlit runner); created on first use
+_log_listener: Optional[QueueListener] = None
+
+class CurrentStdoutHandler(logging.StreamHandler):
+    """Write to whatever sys.stdout is at emit time, so redirect_stdout (the Streamlit log panel) captures records"""
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def configure_logging() -> QueueListener:
+    """Route log records through a queue so formatting and stdout writes happen on a listener thread; safe to call repeatedly"""
+    global _log_listener
+    if _log_listener is None:
+        log_queue = queue.SimpleQueue()
+        stream_handler = CurrentStdoutHandler()
+        stream_handler.setFormatter(logging.Formatter('%(message)s'))
+        _log_listener = QueueListener(log_queue, stream_handler)
+
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(QueueHandler(log_queue))
+        _log_listener.start()
+    return _log_listener
+
+def flush_logging():
+    """Write out every queued log record now (stopping the listener drains the queue), then keep listening"""
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener.start()
@@ -19,11 +19,12 @@ sys.path.append(os.path.dirname(__file__))
 
 # Import our API modules
 from apis.token_data import TokenDataAPI
+from apis.supabase_client import get_supabase_client
 from config import Config
 
 # Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
     print("Supabase client not found. Please install it with: pip install supabase")
     sys.exit(1)
@@ -46,7 +47,7 @@ class PortfolioManager:
             Config.validate()
             
             # Initialize Supabase client
-            self.supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+            self.supabase: Client = get_supabase_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
             
             # Initialize Token Metrics API
             self.token_api = TokenDataAPI()
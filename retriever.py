@@ -6,32 +6,357 @@ then fetches comprehensive token data from all tables for the latest date.
 """
 
 import asyncio
+import dataclasses
+import hashlib
+import io
+import json
+import logging
+import math
 import os
+import random
+import re
+import sys
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone, date, timedelta
 from dotenv import load_dotenv
 import urllib.parse  # Add this import at the top
+from collections import OrderedDict, defaultdict
+from functools import wraps
+import numpy as np
+import httpx
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 except ImportError:
-    print("OpenAI client not found. Installing...")
-    os.system("pip install openai")
-    from openai import OpenAI
+    raise ImportError("OpenAI client not found. Install it with: pip install openai") from None
+
+# Optional SIMD int8 cosine kernel; without it int8 rows are dequantized for NumPy scoring
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Optional FAISS inner-product index for top-k search over today's float embeddings
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Optional JIT for the scalar cosine similarity path
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+# Optional Aho-Corasick automaton for the keyword fallback search
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional persistent cache for query embeddings
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# Optional faster JSON parsing and serialization (LLM output, raw JSON report)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional HTTP/2 support for the shared httpx client
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from apis.embedding_pipeline import quantize_embedding, decode_bytea
+from apis.supabase_client import get_supabase_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+if njit is not None:
+    @njit('f4(f4[::1], f4[::1])', fastmath=True, cache=True)
+    def _cosine_similarity(a, b):
+        dot = 0.0
+        norm_a = 0.0
+        norm_b = 0.0
+        for i in range(a.shape[0]):
+            x = a[i]
+            y = b[i]
+            dot += x * y
+            norm_a += x * x
+            norm_b += y * y
+        if norm_a == 0.0 or norm_b == 0.0:
+            return 0.0
+        return dot / (math.sqrt(norm_a) * math.sqrt(norm_b))
+
+    @njit('f4[:, :](i1[:, :], i1[:, :])', parallel=True, fastmath=True, cache=True)
+    def _int8_cosine_similarity_matrix(queries, matrix):
+        """Cosine similarity of int8 queries against int8 rows, shape [queries, rows]"""
+        query_norms = np.empty(queries.shape[0], dtype=np.float32)
+        for i in range(queries.shape[0]):
+            norm = 0
+            for k in range(queries.shape[1]):
+                norm += np.int32(queries[i, k]) * np.int32(queries[i, k])
+            query_norms[i] = math.sqrt(norm)
+        
+        out = np.zeros((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for j in prange(matrix.shape[0]):
+            row_norm = 0
+            for k in range(matrix.shape[1]):
+                row_norm += np.int32(matrix[j, k]) * np.int32(matrix[j, k])
+            if row_norm == 0:
+                continue
+            for i in range(queries.shape[0]):
+                if query_norms[i] == 0.0:
+                    continue
+                dot = 0
+                for k in range(matrix.shape[1]):
+                    dot += np.int32(queries[i, k]) * np.int32(matrix[j, k])
+                out[i, j] = dot / (query_norms[i] * math.sqrt(row_norm))
+        return out
+else:
+    _int8_cosine_similarity_matrix = None
+
+    def _cosine_similarity(a, b):
+        norm_a = np.linalg.norm(a)
+        norm_b = np.linalg.norm(b)
+        if norm_a == 0 or norm_b == 0:
+            return 0.0
+        return float(np.dot(a, b) / (norm_a * norm_b))
+
+# Query embedding model and caches (in-process LRU plus optional on-disk store)
+EMBEDDING_MODEL = "text-embedding-3-small"
+ANALYSIS_MODEL = "gpt-4o-mini"
+# Output budget sized to the position schema (one position is well under 200 tokens)
+ANALYSIS_MAX_TOKENS = 300
+EMBEDDING_DIMENSIONS = 1536
+EMBEDDING_MEMO_SIZE = 512
+EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'cryptoagent', 'embeddings')
+_embedding_memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+# Keywords scored by the content-based fallback search
+FALLBACK_KEYWORDS = ('investable', 'cryptocurrency', 'fundamentals', 'sentiment', 'growth', 'potential')
+FALLBACK_KEYWORD_PATTERN = re.compile('|'.join(FALLBACK_KEYWORDS))
+
+# Investment-focused queries used to rank today's tokens
+INVESTMENT_QUERIES = [
+    "most investable cryptocurrency with strong fundamentals",
+    "cryptocurrency investment opportunity positive sentiment",
+    "best crypto to invest in with growth potential",
+    "cryptocurrency with strong community and development"
+]
+
+# Token rankings are reused for this long, so scheduler ticks do not re-run the search
+TOP_TOKENS_TTL_SECONDS = 60
+
+# Parsed LLM analyses are reused for identical prompts within this window
+LLM_CACHE_TTL_SECONDS = 300
+
+ANALYSIS_SYSTEM_PROMPT = "You are a cryptocurrency investment analyst. You must respond with ONLY valid JSON in the exact format specified. No additional text or explanations."
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Position:
+    """A validated position recommendation from the LLM"""
+    symbol: str
+    entry: float
+    size_usd: float
+    stop_loss: float
+    target_1: float
+    target_2: float
+    rationale: str
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Position':
+        """Validate one entry of new_positions; raises KeyError, TypeError or ValueError on schema drift"""
+        return cls(
+            symbol=str(data['symbol']),
+            entry=float(data['entry']),
+            size_usd=float(data['size_usd']),
+            stop_loss=float(data['stop_loss']),
+            target_1=float(data['target_1']),
+            target_2=float(data['target_2']),
+            rationale=str(data['rationale'])
+        )
+
+# Conservative position returned when the LLM fails; symbol and rationale are filled per token
+FALLBACK_POSITION_TEMPLATE = Position(
+    symbol="",
+    entry=1.00,
+    size_usd=20,
+    stop_loss=0.80,
+    target_1=1.20,
+    target_2=1.50,
+    rationale=""
+)
+
+# Static part of the single-token analysis prompt. It is kept byte-identical across calls and
+# placed before the per-token data so OpenAI's automatic prompt caching can reuse the prefix.
+ANALYSIS_PROMPT_PREFIX = """
+You are a cryptocurrency investment analyst. Based on the token data at the end of this message, generate a trading recommendation in the EXACT JSON format specified below.
+
+REQUIRED OUTPUT FORMAT (JSON only, no other text):
+{
+  "new_positions": [
+    {
+      "symbol": "[TOKEN]",
+      "entry": [current_price_or_recommended_entry],
+      "size_usd": [position_size_in_usd],
+      "stop_loss": [stop_loss_price],
+      "target_1": [first_target_price],
+      "target_2": [second_target_price],
+      "rationale": "[Detailed rationale based on the data provided, including hourly trading signals]"
+    }
+  ]
+}
+
+IMPORTANT:
+- Use ONLY the exact JSON format above
+- Use the TOKEN value from the data below as the symbol
+- Do not include any explanatory text before or after the JSON
+- Base your analysis on the available data, especially hourly trading signals
+- If insufficient data, use conservative estimates
+- The rationale should reference specific data points from the provided information
+- All prices should be realistic based on current market conditions
+- Position size should be reasonable (typically 10-50 USD for testing)
+- Consider hourly trading signals for short-term entry/exit timing
+"""
+
+class JsonObjectScanner:
+    """Track brace depth across streamed text to find where the first JSON object ends"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, text: str) -> int:
+        """Return the index just past the object's closing brace within text, or -1 if not closed yet"""
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '{':
+                self.depth += 1
+                self.started = True
+            elif not self.started:
+                continue
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+# Per-token data section appended after the static prefix
+TOKEN_DATA_TEMPLATE = """
+TOKEN: {token_name}
+
+DATA SUMMARY:
+- {social_summary}
+- {ai_summary}
+- {fundamental_summary}
+- {price_summary}
+- {hourly_signals_summary}
+
+AVAILABLE DATA:
+1. Social Posts: {social_posts} posts
+2. AI Reports: {ai_reports} reports
+3. Trading Signals: {trading_signals} signals
+4. Hourly Trading Signals: {hourly_trading_signals} signals
+5. Fundamental Grade: {fundamental_grade} records
+6. Daily OHLCV: {daily_ohlcv} records
+7. Hourly OHLCV: {hourly_ohlcv} records
+"""
+
+# Transient OpenAI errors worth retrying
+RETRYABLE_OPENAI_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+def rate_limit_reset_seconds(error: Exception) -> Optional[float]:
+    """Read the wait suggested by an OpenAI error's retry-after or x-ratelimit-reset-* headers"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    
+    # Reset headers look like "1s", "6m0s" or "20ms"
+    reset = headers.get('x-ratelimit-reset-tokens') or headers.get('x-ratelimit-reset-requests')
+    if not reset:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', reset)
+    return sum(float(value) * units[unit] for value, unit in parts) if parts else None
+
+def json_loads(text: str) -> Any:
+    """Parse JSON with orjson when available"""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def json_dumps_indented(obj: Any) -> str:
+    """Serialize to 2-space indented JSON with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(obj, indent=2, default=dataclasses.asdict)
+
+def async_ttl_cache(ttl: float):
+    """Memoize an async method's non-empty results per instance and arguments for `ttl` seconds; concurrent callers share one call"""
+    def decorator(func):
+        cache_attr = f"_{func.__name__}_ttl_cache"
+        lock_attr = f"_{func.__name__}_ttl_lock"
+        
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = self.__dict__.setdefault(cache_attr, {})
+            lock = self.__dict__.setdefault(lock_attr, asyncio.Lock())
+            key = (args, tuple(sorted(kwargs.items())))
+            async with lock:
+                cached = cache.get(key)
+                if cached and time.monotonic() < cached[0]:
+                    return cached[1]
+                result = await func(self, *args, **kwargs)
+                # Don't pin an empty result (e.g. a transient fetch failure) for the whole TTL
+                if result:
+                    cache[key] = (time.monotonic() + ttl, result)
+                return result
+        return wrapper
+    return decorator
+
 class TokenRetriever:
     def __init__(self):
+        # One pooled HTTP client for all OpenAI calls, so connections and TLS sessions are reused
+        self.http = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=30,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+        
         # Initialize OpenAI client
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=self.http)
         if not os.getenv('OPENAI_API_KEY'):
             raise ValueError("Missing OPENAI_API_KEY environment variable")
         
@@ -43,58 +368,136 @@ class TokenRetriever:
         if not self.supabase_url or not self.supabase_key or not self.user_id:
             raise ValueError("Missing Supabase credentials")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = get_supabase_client(self.supabase_url, self.supabase_key)
         
         # Get today's date for filtering
         self.today_utc = datetime.now(timezone.utc).date()
         print(f"📅 Retrieving data for: {self.today_utc} (UTC)")
+        
+        # Precomputed UTC bounds for today's queries
+        self._today_start, self._today_end = self.get_day_bounds(self.today_utc)
+        
+        # Persistent query embedding cache, shared across runs
+        self._embedding_disk_cache = diskcache.Cache(EMBEDDING_CACHE_DIR) if diskcache is not None else None
+        
+        # Keyword matcher for fallback_search, built once
+        self._kw_automaton = None
+        if ahocorasick is not None:
+            self._kw_automaton = ahocorasick.Automaton()
+            for keyword in FALLBACK_KEYWORDS:
+                self._kw_automaton.add_word(keyword, keyword)
+            self._kw_automaton.make_automaton()
+        
+        # Today's embedding rows and their normalized vector matrix, loaded once per instance
+        self._today_embeddings_cache: Optional[Tuple[List[Dict[str, Any]], np.ndarray]] = None
+        self._today_faiss_index = None
+        
+        # Retry settings for OpenAI calls
+        self.max_retries = 5
+        self.base_delay = 1.0  # Base delay in seconds
+        self.max_delay = 30.0
+        
+        # Echo the LLM result as raw JSON after the formatted report (enabled by main() with CRYPTOAGENT_VERBOSE=1)
+        self.print_raw_json = False
+        
+        # Parsed LLM analyses keyed by prompt hash: {key: (stored_at, result)}
+        self._llm_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
     
-    async def create_embedding(self, text: str) -> Optional[List[float]]:
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self.http.aclose()
+    
+    async def create_embedding(self, text: str) -> Optional[np.ndarray]:
         """Create embedding for query text"""
+        if not text or len(text.strip()) == 0:
+            return None
+        
+        embeddings = await self.create_embeddings([text])
+        return embeddings[0] if embeddings is not None else None
+
+    async def create_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Create embeddings for several query texts, calling the API only for uncached texts"""
         try:
-            if not text or len(text.strip()) == 0:
-                return None
-            
-            response = self.openai_client.embeddings.create(
-                input=text,
-                model="text-embedding-3-small",
-                dimensions=1536
-            )
+            embeddings = {text: self.get_cached_embedding(text) for text in texts}
+            missing = [text for text, embedding in embeddings.items() if embedding is None]
+            
+            if missing:
+                response = await self.openai_client.embeddings.create(
+                    input=missing,
+                    model=EMBEDDING_MODEL,
+                    dimensions=EMBEDDING_DIMENSIONS
+                )
+                
+                for text, item in zip(missing, response.data):
+                    embeddings[text] = self.cache_embedding(text, item.embedding)
             
-            embedding = response.data[0].embedding
-            return embedding
+            return np.stack([embeddings[text] for text in texts])
             
         except Exception as e:
-            print(f"❌ Error creating embedding: {e}")
+            print(f"❌ Error creating embeddings: {e}")
             return None
 
+    def _embedding_cache_key(self, text: str) -> str:
+        """Cache key covering the text and the embedding model settings"""
+        return hashlib.sha256(f"{text}|{EMBEDDING_MODEL}|{EMBEDDING_DIMENSIONS}".encode('utf-8')).hexdigest()
+
+    def get_cached_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Look up a query embedding in the in-process LRU, then the on-disk cache"""
+        key = self._embedding_cache_key(text)
+        embedding = _embedding_memo.get(key)
+        if embedding is not None:
+            _embedding_memo.move_to_end(key)
+            return embedding
+        
+        if self._embedding_disk_cache is not None:
+            data = self._embedding_disk_cache.get(key)
+            if data is not None:
+                embedding = np.frombuffer(data, dtype=np.float32)
+                self._remember_embedding(key, embedding)
+        return embedding
+
+    def cache_embedding(self, text: str, embedding: List[float]) -> np.ndarray:
+        """Store a freshly created query embedding in both caches"""
+        key = self._embedding_cache_key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._remember_embedding(key, embedding)
+        if self._embedding_disk_cache is not None:
+            self._embedding_disk_cache.set(key, embedding.tobytes())
+        return embedding
+
+    def _remember_embedding(self, key: str, embedding: np.ndarray):
+        """Add an embedding to the in-process LRU, evicting the oldest entry when full"""
+        _embedding_memo[key] = embedding
+        if len(_embedding_memo) > EMBEDDING_MEMO_SIZE:
+            _embedding_memo.popitem(last=False)
+
     def calculate_cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
         try:
             if len(vec1) != len(vec2):
                 return 0.0
             
-            # Calculate dot product
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            
-            # Calculate magnitudes
-            magnitude1 = sum(a * a for a in vec1) ** 0.5
-            magnitude2 = sum(b * b for b in vec2) ** 0.5
-            
-            # Avoid division by zero
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0.0
-            
-            # Calculate cosine similarity
-            similarity = dot_product / (magnitude1 * magnitude2)
+            # Contiguous float32 copies feed the compiled kernel (or NumPy without numba)
+            similarity = _cosine_similarity(
+                np.ascontiguousarray(vec1, dtype=np.float32),
+                np.ascontiguousarray(vec2, dtype=np.float32)
+            )
             return max(0.0, min(1.0, similarity))  # Clamp between 0 and 1
             
         except Exception as e:
             print(f"❌ Error calculating cosine similarity: {e}")
             return 0.0
     
+    def get_day_bounds(self, day: date) -> Tuple[str, str]:
+        """Get ISO start/end timestamps covering a single UTC day"""
+        return f"{day}T00:00:00Z", f"{day + timedelta(days=1)}T00:00:00Z"
+
     async def get_latest_ai_report_date(self) -> Optional[datetime]:
         """Get the latest created_at date from ai_reports table"""
+        return await asyncio.to_thread(self.fetch_latest_ai_report_date)
+    
+    def fetch_latest_ai_report_date(self) -> Optional[datetime]:
+        """Blocking query behind get_latest_ai_report_date"""
         try:
             print("🔍 Finding latest AI report date...")
             
@@ -113,53 +516,40 @@ class TokenRetriever:
             print(f"❌ Error getting latest AI report date: {e}")
             return None
     
-    async def semantic_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Perform semantic search to find most relevant content"""
+    async def semantic_search(self, query: str, top_k: int = 5, query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Perform semantic search to find most relevant content, optionally with a precomputed query embedding"""
         try:
             print(f"🔍 Performing semantic search for: '{query}'")
             
-            # Create embedding for the query
-            query_embedding = await self.create_embedding(query)
-            if not query_embedding:
+            # Create embedding for the query unless the caller already has it
+            if query_embedding is None:
+                query_embedding = await self.create_embedding(query)
+            if query_embedding is None:
                 print("❌ Failed to create query embedding")
                 return []
             
-            print(f"✅ Created query embedding with {len(query_embedding)} dimensions")
-            
-            # Use direct SQL with vector similarity search
-            print("🔄 Using vector similarity search...")
+            logger.debug("Created query embedding with %d dimensions", len(query_embedding))
             
-            # Get embeddings from today with vector similarity
-            response = self.supabase.table('embeddings').select('*').gte('created_at', f"{self.today_utc}T00:00:00Z").lt('created_at', f"{self.today_utc + timedelta(days=1)}T00:00:00Z").execute()
+            # Score against today's cached embedding matrix
+            logger.debug("Using vector similarity search")
+            rows, matrix = await self._load_today_embeddings()
             
-            if not response.data:
+            if not rows:
                 print(f"ℹ️ No embeddings found for today ({self.today_utc})")
                 return []
             
-            print(f"📅 Found {len(response.data)} embeddings from today")
+            print(f"📅 Found {len(rows)} embeddings from today")
             
-            # Calculate similarity manually for each embedding
-            results = []
-            for item in response.data:
-                if item.get('embedding_vector'):
-                    # Calculate cosine similarity manually
-                    similarity = self.calculate_cosine_similarity(query_embedding, item['embedding_vector'])
-                    if similarity > 0.3:  # Threshold
-                        item['similarity'] = similarity
-                        results.append(item)
+            top_indices, top_similarities = self.search_top_k(matrix, query_embedding, top_k)
             
-            # Sort by similarity and take top_k
-            results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-            final_results = results[:top_k]
+            final_results = [{**rows[i], 'similarity': float(similarity)} for i, similarity in zip(top_indices, top_similarities)]
             
             print(f"✅ Found {len(final_results)} similar embeddings using semantic search")
             
             # Add debug info for each result
-            for i, result in enumerate(final_results):
-                similarity = result.get('similarity', 0)
-                content_type = result.get('content_type', 'unknown')
-                token = result.get('token_name', 'unknown')
-                print(f"  {i+1}. {content_type} ({token}) - Similarity: {similarity:.3f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, result in enumerate(final_results, 1):
+                    logger.debug("  %d. %s (%s) - Similarity: %.3f", i, result.get('content_type', 'unknown'), result.get('token_name', 'unknown'), result['similarity'])
             
             return final_results
             
@@ -168,11 +558,109 @@ class TokenRetriever:
             print("🔄 Falling back to content-based search...")
             return await self.fallback_search(query, top_k)
 
+    def score_embeddings(self, matrix: np.ndarray, query_embeddings: Any) -> np.ndarray:
+        """Cosine similarity of each query against every matrix row, shape [queries, rows], clamped to [0, 1]"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        
+        if matrix.dtype == np.int8:
+            queries_i8 = np.stack([quantize_embedding(query) for query in queries])
+            if simsimd is not None:
+                distances = np.asarray(simsimd.cdist(queries_i8, matrix, metric='cosine'))
+                return np.clip(1.0 - distances, 0.0, 1.0)
+            return np.clip(_int8_cosine_similarity_matrix(queries_i8, matrix), 0.0, 1.0)
+        
+        # Float rows are pre-normalized, so only the queries need normalizing
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.clip((queries / norms) @ matrix.T, 0.0, 1.0)
+
+    def search_top_k(self, matrix: np.ndarray, query_embedding: np.ndarray, top_k: int, threshold: float = 0.3) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices and similarities of the best top_k matches above threshold for one query, best first"""
+        if self._today_faiss_index is not None and matrix.dtype == np.float32:
+            query = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+            norm = np.linalg.norm(query)
+            if norm:
+                query /= norm
+            scores, ids = self._today_faiss_index.search(query, min(top_k, self._today_faiss_index.ntotal))
+            keep = (ids[0] >= 0) & (scores[0] > threshold)
+            return ids[0][keep], np.minimum(scores[0][keep], 1.0)
+        
+        similarities = self.score_embeddings(matrix, [query_embedding])[0]
+        top_indices = self.top_k_indices(similarities, top_k, threshold)
+        return top_indices, similarities[top_indices]
+
+    def top_k_indices(self, similarities: np.ndarray, top_k: int, threshold: float = 0.3) -> np.ndarray:
+        """Indices of the top_k similarities above threshold, best first"""
+        # Partition out the top_k candidates, then order only those
+        candidates = np.flatnonzero(similarities > threshold)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-similarities[candidates], top_k)[:top_k]]
+        return candidates[np.argsort(-similarities[candidates], kind='stable')]
+
+    async def _load_today_embeddings(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Fetch today's embeddings once and stack their vectors into a matrix.
+        
+        The matrix is raw int8 when every row has a quantized vector and SimSIMD or numba
+        is available, otherwise row-normalized float32.
+        """
+        if self._today_embeddings_cache is not None:
+            return self._today_embeddings_cache
+        
+        # Prefer the compact int8 column; fall back to float vectors for rows ingested before it existed
+        response = self.supabase.table('embeddings').select('id,content_type,token_name,embedding_i8').gte('created_at', self._today_start).lt('created_at', self._today_end).execute()
+        rows = response.data or []
+        
+        if rows and all(item.get('embedding_i8') for item in rows):
+            quantized = np.frombuffer(b''.join(decode_bytea(item.pop('embedding_i8')) for item in rows), dtype=np.int8).reshape(len(rows), -1)
+            if simsimd is not None or _int8_cosine_similarity_matrix is not None:
+                self._today_embeddings_cache = (rows, quantized)
+                return self._today_embeddings_cache
+            vectors = quantized.astype(np.float32)
+        else:
+            response = self.supabase.table('embeddings').select('id,content_type,token_name,embedding_vector').gte('created_at', self._today_start).lt('created_at', self._today_end).execute()
+            
+            rows = []
+            vectors = []
+            for item in response.data or []:
+                vector = item.pop('embedding_vector', None)
+                if not vector:
+                    continue
+                rows.append(item)
+                vectors.append(vector)
+            
+            # pgvector values come back from PostgREST as '[x,y,...]' text; parse them all in
+            # one C-level pass instead of boxing 1536 Python floats per row
+            if vectors and all(isinstance(vector, str) for vector in vectors):
+                vectors = np.fromstring(','.join(vector[1:-1] for vector in vectors), dtype=np.float32, sep=',').reshape(len(rows), -1)
+        
+        if len(vectors):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.empty((0, 1536), dtype=np.float32)
+        
+        # Inner-product index over the normalized rows, so scores are cosine similarity. Vectors are
+        # stored as fp16, halving the bytes scanned per search; fp16 needs no training pass.
+        if faiss is not None and len(rows):
+            self._today_faiss_index = faiss.IndexScalarQuantizer(matrix.shape[1], faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+            self._today_faiss_index.add(matrix)
+        
+        self._today_embeddings_cache = (rows, matrix)
+        return self._today_embeddings_cache
+
+    def count_keyword_matches(self, text: str) -> int:
+        """Count distinct fallback keywords present in text with a single scan"""
+        if self._kw_automaton is not None:
+            return len({keyword for _, keyword in self._kw_automaton.iter(text)})
+        return len(set(FALLBACK_KEYWORD_PATTERN.findall(text)))
+
     async def fallback_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Fallback search method when vector search fails"""
         try:
             # FIX: Only get today's embeddings
-            response = self.supabase.table('embeddings').select('*').gte('created_at', f"{self.today_utc}T00:00:00Z").lt('created_at', f"{self.today_utc + timedelta(days=1)}T00:00:00Z").limit(100).execute()
+            response = self.supabase.table('embeddings').select('id,content_type,token_name,content_text').gte('created_at', self._today_start).lt('created_at', self._today_end).limit(100).execute()
             
             if not response.data:
                 print(f"ℹ️ No embeddings found for today ({self.today_utc})")
@@ -184,13 +672,9 @@ class TokenRetriever:
             
             for embedding in response.data:
                 content_text = embedding.get('content_text', '').lower()
-                relevance_score = 0
                 
                 # Score based on keyword matches
-                keywords = ['investable', 'cryptocurrency', 'fundamentals', 'sentiment', 'growth', 'potential']
-                for keyword in keywords:
-                    if keyword in content_text:
-                        relevance_score += 1
+                relevance_score = self.count_keyword_matches(content_text)
                 
                 if relevance_score > 0:
                     embedding['relevance_score'] = relevance_score
@@ -214,110 +698,120 @@ class TokenRetriever:
     
     async def get_top_investable_token(self) -> Optional[str]:
         """Find the most investable token based on semantic search"""
+        # Same arguments as run_comprehensive_analysis so both share the memoized ranking
+        candidates = await self.get_top_investable_tokens(3)
+        return candidates[0] if candidates else None
+    
+    @async_ttl_cache(ttl=TOP_TOKENS_TTL_SECONDS)
+    async def get_top_investable_tokens(self, limit: int = 3) -> List[str]:
+        """Rank tokens by semantic search and return the best `limit` candidates, best first"""
         try:
             print("🎯 Finding most investable token...")
             
-            # Define investment-focused queries
-            queries = [
-                "most investable cryptocurrency with strong fundamentals",
-                "cryptocurrency investment opportunity positive sentiment",
-                "best crypto to invest in with growth potential",
-                "cryptocurrency with strong community and development"
-            ]
-            
-            all_results = []
-            
-            # Perform semantic search for each query
-            for query in queries:
-                print(f"🔍 Searching: '{query}'")
-                results = await self.semantic_search(query, top_k=10)
-                if results:
-                    all_results.extend(results)
-                    print(f"✅ Found {len(results)} results for query")
-            
-            if not all_results:
+            queries = INVESTMENT_QUERIES
+            
+            # Embed all queries in one call and score them against today's rows in one pass
+            query_embeddings = await self.create_embeddings(queries)
+            if query_embeddings is None:
+                return await self.fallback_token_candidates()
+            
+            rows, matrix = await self._load_today_embeddings()
+            if not rows:
+                print(f"ℹ️ No embeddings found for today ({self.today_utc})")
+                return await self.fallback_token_candidates()
+            
+            similarities = self.score_embeddings(matrix, query_embeddings)
+            
+            # Top 10 rows per query, deduplicated so a row matching several queries counts once
+            matched_rows = set()
+            for query, query_similarities in zip(queries, similarities):
+                top_indices = self.top_k_indices(query_similarities, 10)
+                print(f"🔍 '{query}': {len(top_indices)} results")
+                matched_rows.update(top_indices.tolist())
+            
+            if not matched_rows:
                 print("ℹ️ No search results found")
-                return await self.fallback_token_selection()
+                return await self.fallback_token_candidates()
             
-            # Count token occurrences and calculate average similarity scores
-            token_counts = {}
-            token_scores = {}
+            # Each matched row contributes its best similarity across the queries
+            best_similarities = similarities.max(axis=0)
             
-            for result in all_results:
-                token = result.get('token_name')
+            # Single pass: running [count, similarity_sum] per token
+            token_stats = defaultdict(lambda: [0, 0.0])
+            
+            for i in matched_rows:
+                token = rows[i].get('token_name')
                 if token:
-                    if token not in token_counts:
-                        token_counts[token] = 0
-                        token_scores[token] = []
-                    
-                    token_counts[token] += 1
-                    # Get similarity score from the result
-                    similarity = result.get('similarity', 0)
-                    token_scores[token].append(similarity)
-            
-            if not token_counts:
+                    stats = token_stats[token]
+                    stats[0] += 1
+                    stats[1] += float(best_similarities[i])
+            
+            if not token_stats:
                 print("ℹ️ No tokens found in search results")
-                return await self.fallback_token_selection()
+                return await self.fallback_token_candidates()
             
-            # Find token with highest count and best average similarity
-            best_token = None
-            best_score = 0
+            # count * avg_similarity is just the similarity sum, so rank by that
+            for token, (count, combined_score) in token_stats.items():
+                print(f"🏆 {token}: {count} mentions, avg similarity: {combined_score / count:.3f}, score: {combined_score:.3f}")
             
-            for token, count in token_counts.items():
-                avg_similarity = sum(token_scores[token]) / len(token_scores[token])
-                combined_score = count * avg_similarity  # Weight by both count and similarity
-                
-                print(f"🏆 {token}: {count} mentions, avg similarity: {avg_similarity:.3f}, score: {combined_score:.3f}")
-                
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_token = token
-            
-            print(f"🏆 Top investable token: {best_token} (score: {best_score:.3f})")
-            return best_token
+            ranked = sorted(token_stats, key=lambda token: token_stats[token][1], reverse=True)
+            print(f"🏆 Top investable token: {ranked[0]} (score: {token_stats[ranked[0]][1]:.3f})")
+            return ranked[:limit]
             
         except Exception as e:
             print(f"❌ Error finding top investable token: {e}")
-            return await self.fallback_token_selection()
+            return await self.fallback_token_candidates()
 
+    async def fallback_token_candidates(self) -> List[str]:
+        """Fallback token selection as a candidate list"""
+        token = await self.fallback_token_selection()
+        return [token] if token else []
+    
     async def fallback_token_selection(self) -> Optional[str]:
         """Fallback method to select token when semantic search fails"""
         try:
             print("🔄 Using fallback token selection...")
             
-            # Get all available tokens from embeddings
-            response = self.supabase.table('embeddings').select('token_name').execute()
+            # Let the database group and count embeddings per token (see top_token_by_volume in database_schema.sql)
+            response = self.supabase.rpc('top_token_by_volume').execute()
             
             if not response.data:
-                print("ℹ️ No embeddings found")
-                return None
-            
-            # Count token occurrences
-            token_counts = {}
-            for item in response.data:
-                token = item.get('token_name')
-                if token:
-                    token_counts[token] = token_counts.get(token, 0) + 1
-            
-            if not token_counts:
                 print("ℹ️ No tokens found in embeddings")
                 return None
             
-            # Select token with most data
-            top_token = max(token_counts.items(), key=lambda x: x[1])
-            print(f"🏆 Selected token by data volume: {top_token[0]} ({top_token[1]} embeddings)")
+            top_token = response.data[0]
+            print(f"🏆 Selected token by data volume: {top_token['token_name']} ({top_token['embedding_count']} embeddings)")
             
-            return top_token[0]
+            return top_token['token_name']
             
         except Exception as e:
             print(f"❌ Fallback token selection failed: {e}")
             return None
     
+    def summarize_social_posts(self, posts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Aggregate sentiment, follower and interaction totals for a list of posts"""
+        count = len(posts)
+        sentiment = np.fromiter((post.get('post_sentiment') or 0 for post in posts), dtype=np.float64, count=count)
+        followers = np.fromiter((post.get('creator_followers') or 0 for post in posts), dtype=np.int64, count=count)
+        interactions = np.fromiter((post.get('interactions_total') or 0 for post in posts), dtype=np.int64, count=count)
+        
+        return {
+            'post_count': count,
+            'avg_sentiment': float(sentiment.mean()) if count else 0.0,
+            'total_followers': int(followers.sum()),
+            'total_interactions': int(interactions.sum())
+        }
+    
     async def get_comprehensive_token_data(self, token_name: str) -> Dict[str, Any]:
         """Get comprehensive token data from all tables for the latest date"""
+        # supabase-py queries block, so run them on a worker thread to let callers overlap tokens
+        return await asyncio.to_thread(self.fetch_comprehensive_token_data, token_name)
+    
+    def fetch_comprehensive_token_data(self, token_name: str) -> Dict[str, Any]:
+        """Blocking queries behind get_comprehensive_token_data"""
         try:
-            # 🆕 FIX: URL decode the token name if it's encoded
-            decoded_token_name = urllib.parse.unquote(token_name)
+            # 🆕 FIX: URL decode the token name if it's encoded (plain symbols have no '%' to decode)
+            decoded_token_name = urllib.parse.unquote(token_name) if '%' in token_name else token_name
             if decoded_token_name != token_name:
                 print(f" Decoded token name: {token_name} → {decoded_token_name}")
                 token_name = decoded_token_name
@@ -325,7 +819,7 @@ class TokenRetriever:
             print(f"📊 Fetching comprehensive data for {token_name}...")
             
             # First, get the latest AI report date to filter all data
-            latest_date = await self.get_latest_ai_report_date()
+            latest_date = self.fetch_latest_ai_report_date()
             if not latest_date:
                 print("⚠️ Could not determine latest date, using today's date")
                 latest_date = datetime.now(timezone.utc)
@@ -333,6 +827,12 @@ class TokenRetriever:
             # Convert to date for comparison
             latest_date_only = latest_date.date()
             print(f"📅 Filtering data for latest date: {latest_date_only}")
+
+            # Date range for server-side filtering (UTC day boundaries)
+            if latest_date_only == self.today_utc:
+                day_start, day_end = self._today_start, self._today_end
+            else:
+                day_start, day_end = self.get_day_bounds(latest_date_only)
             
             comprehensive_data = {
                 'token_name': token_name,
@@ -350,109 +850,84 @@ class TokenRetriever:
             
             # 1. Get social posts for the latest date
             print(f"📱 Fetching social posts for {token_name}...")
-            posts_response = self.supabase.table('posts').select('*').eq('token_name', token_name).execute()
+            posts_response = self.supabase.table('posts').select('token_name,post_title,post_sentiment,creator_followers,interactions_total,ingested_at').eq('token_name', token_name).gte('ingested_at', day_start).lt('ingested_at', day_end).execute()
             if posts_response.data:
-                for post in posts_response.data:
-                    if post.get('ingested_at'):
-                        try:
-                            post_date = datetime.fromisoformat(post['ingested_at'].replace('Z', '+00:00')).date()
-                            if post_date == latest_date_only:
-                                comprehensive_data['social_posts'].append(post)
-                        except:
-                            continue
+                comprehensive_data['social_posts'] = posts_response.data
+            comprehensive_data['social_metrics'] = self.summarize_social_posts(comprehensive_data['social_posts'])
             print(f"✅ Found {len(comprehensive_data['social_posts'])} social posts for latest date")
             
             # 2. Get AI reports for the latest date
             print(f"🤖 Fetching AI reports for {token_name}...")
-            reports_response = self.supabase.table('ai_reports').select('*').eq('token_name', token_name).execute()
+            reports_response = self.supabase.table('ai_reports').select('token_id,token_name,investment_analysis,deep_dive,created_at').eq('token_name', token_name).gte('created_at', day_start).lt('created_at', day_end).execute()
             if reports_response.data:
-                for report in reports_response.data:
-                    if report.get('created_at'):
-                        try:
-                            report_date = datetime.fromisoformat(report['created_at'].replace('Z', '+00:00')).date()
-                            if report_date == latest_date_only:
-                                comprehensive_data['ai_reports'].append(report)
-                        except:
-                            continue
+                comprehensive_data['ai_reports'] = reports_response.data
             print(f"✅ Found {len(comprehensive_data['ai_reports'])} AI reports for latest date")
             
             # 3. Get trading signals for the latest date
             print(f"📈 Fetching trading signals for {token_name}...")
-            signals_response = self.supabase.table('trading_signals').select('*').eq('token_name', token_name).execute()
+            signals_response = self.supabase.table('trading_signals').select('token_id,token_name,trading_signal,token_trend,created_at').eq('token_name', token_name).gte('created_at', day_start).lt('created_at', day_end).execute()
             if signals_response.data:
-                for signal in signals_response.data:
-                    if signal.get('created_at'):
-                        try:
-                            signal_date = datetime.fromisoformat(signal['created_at'].replace('Z', '+00:00')).date()
-                            if signal_date == latest_date_only:
-                                comprehensive_data['trading_signals'].append(signal)
-                        except:
-                            continue
+                comprehensive_data['trading_signals'] = signals_response.data
             print(f"✅ Found {len(comprehensive_data['trading_signals'])} trading signals for latest date")
             
             # 4. Get fundamental grade (latest data, not date-filtered)
             print(f"📊 Fetching fundamental grade for {token_name}...")
-            fundamental_response = self.supabase.table('fundamental_grade').select('*').eq('token_name', token_name).execute()
+            fundamental_response = self.supabase.table('fundamental_grade').select('token_id,token_name,fundamental_grade,fundamental_grade_class,community_score,exchange_score').eq('token_name', token_name).execute()
             if fundamental_response.data:
                 comprehensive_data['fundamental_grade'] = fundamental_response.data
             print(f"✅ Found {len(comprehensive_data['fundamental_grade'])} fundamental grade records")
             
             # 5. Get daily OHLCV data for the latest date
             print(f"💰 Fetching daily OHLCV for {token_name}...")
-            daily_ohlcv_response = self.supabase.table('daily_ohlcv').select('*').eq('token_name', token_name).execute()
+            daily_ohlcv_response = self.supabase.table('daily_ohlcv').select('token_name,date_time,open_price,high_price,low_price,close_price').eq('token_name', token_name).gte('date_time', day_start).lt('date_time', day_end).execute()
             if daily_ohlcv_response.data:
-                for ohlcv in daily_ohlcv_response.data:
-                    if ohlcv.get('date_time'):
-                        try:
-                            ohlcv_date = datetime.fromisoformat(ohlcv['date_time'].replace('Z', '+00:00')).date()
-                            if ohlcv_date == latest_date_only:
-                                comprehensive_data['daily_ohlcv'].append(ohlcv)
-                        except:
-                            continue
+                comprehensive_data['daily_ohlcv'] = daily_ohlcv_response.data
             print(f"✅ Found {len(comprehensive_data['daily_ohlcv'])} daily OHLCV records for latest date")
             
             # 6. Get hourly OHLCV data for the latest date
             print(f"⏰ Fetching hourly OHLCV for {token_name}...")
-            hourly_ohlcv_response = self.supabase.table('hourly_ohlcv').select('*').eq('token_name', token_name).execute()
+            hourly_ohlcv_response = self.supabase.table('hourly_ohlcv').select('token_name,date_time,open_price,high_price,low_price,close_price').eq('token_name', token_name).gte('date_time', day_start).lt('date_time', day_end).execute()
             if hourly_ohlcv_response.data:
-                for ohlcv in hourly_ohlcv_response.data:
-                    if ohlcv.get('date_time'):
-                        try:
-                            ohlcv_date = datetime.fromisoformat(ohlcv['date_time'].replace('Z', '+00:00')).date()
-                            if ohlcv_date == latest_date_only:
-                                comprehensive_data['hourly_ohlcv'].append(ohlcv)
-                        except:
-                            continue
+                comprehensive_data['hourly_ohlcv'] = hourly_ohlcv_response.data
             print(f"✅ Found {len(comprehensive_data['hourly_ohlcv'])} hourly OHLCV records for latest date")
             
             # 7. Get hourly trading signals for the latest date
             print(f"📊 Fetching hourly trading signals for {token_name}...")
-            hourly_signals_response = self.supabase.table('hourly_trading_signals').select('*').eq('token_name', token_name).execute()
+            hourly_signals_response = self.supabase.table('hourly_trading_signals').select('token_name,timestamp,signal,position,close_price').eq('token_name', token_name).gte('timestamp', day_start).lt('timestamp', day_end).execute()
             if hourly_signals_response.data:
-                for signal in hourly_signals_response.data:
-                    if signal.get('timestamp'):
-                        try:
-                            signal_date = datetime.fromisoformat(signal['timestamp'].replace('Z', '+00:00')).date()
-                            if signal_date == latest_date_only:
-                                comprehensive_data['hourly_trading_signals'].append(signal)
-                        except:
-                            continue
+                comprehensive_data['hourly_trading_signals'] = hourly_signals_response.data
             print(f"✅ Found {len(comprehensive_data['hourly_trading_signals'])} hourly trading signals for latest date")
             
             # 8. Get resistance support data (latest data, not date-filtered)
             print(f"📊 Fetching resistance support data for {token_name}...")
-            resistance_support_response = self.supabase.table('resistance_support').select('*').eq('token_name', token_name).order('created_at', desc=True).limit(1).execute()
+            resistance_support_response = self.supabase.table('resistance_support').select('token_id,token_name,historical_levels,created_at').eq('token_name', token_name).order('created_at', desc=True).limit(1).execute()
             if resistance_support_response.data:
                 comprehensive_data['resistance_support'] = resistance_support_response.data
             print(f"✅ Found {len(comprehensive_data['resistance_support'])} resistance support records")
             
             # 9. Get token metrics/price data (latest data, not date-filtered)
             print(f"💰 Fetching token metrics for {token_name}...")
-            token_metrics_response = self.supabase.table('tokens').select('*').eq('token_name', token_name).order('created_at', desc=True).limit(1).execute()
+            token_metrics_response = self.supabase.table('tokens').select('token_id,token_name,current_price,market_cap,total_volume,price_change_percentage_24h,created_at').eq('token_name', token_name).order('created_at', desc=True).limit(1).execute()
             if token_metrics_response.data:
                 comprehensive_data['token_metrics'] = token_metrics_response.data
             print(f"✅ Found {len(comprehensive_data['token_metrics'])} token metrics records")
             
+            # Expose the token ID at the top level from the first table that has it,
+            # so callers don't have to probe the individual record lists
+            comprehensive_data['token_id'] = next(
+                (
+                    records[0].get('token_id')
+                    for records in (
+                        comprehensive_data['token_metrics'],
+                        comprehensive_data['ai_reports'],
+                        comprehensive_data['fundamental_grade'],
+                        comprehensive_data['resistance_support']
+                    )
+                    if records and records[0].get('token_id')
+                ),
+                None
+            )
+            
             print(f"✅ Retrieved comprehensive data for {token_name}")
             return comprehensive_data
             
@@ -466,244 +941,282 @@ class TokenRetriever:
             print("❌ No data to display")
             return
         
-        print(f"\n{'='*100}")
-        print(f"🏆 COMPREHENSIVE ANALYSIS FOR {data['token_name'].upper()}")
-        print(f"📅 Date: {data['date']}")
-        print(f"{'='*100}")
+        # Build the whole report in memory and write it to stdout once
+        buf = io.StringIO()
+        
+        print(f"\n{'='*100}", file=buf)
+        print(f"🏆 COMPREHENSIVE ANALYSIS FOR {data['token_name'].upper()}", file=buf)
+        print(f"📅 Date: {data['date']}", file=buf)
+        print(f"{'='*100}", file=buf)
         
         # Social Posts
         if data.get('social_posts'):
-            print(f"\n📱 SOCIAL SENTIMENT ({len(data['social_posts'])} posts)")
+            print(f"\n📱 SOCIAL SENTIMENT ({len(data['social_posts'])} posts)", file=buf)
+            metrics = data.get('social_metrics') or self.summarize_social_posts(data['social_posts'])
+            print(f"   Avg Sentiment: {metrics['avg_sentiment']:.2f} | Total Followers: {metrics['total_followers']:,} | Total Interactions: {metrics['total_interactions']:,}", file=buf)
             for post in data['social_posts'][:3]:  # Show first 3 posts
                 sentiment = post.get('post_sentiment', 'N/A')
                 sentiment_emoji = "🟢" if sentiment and sentiment > 0 else "🔴" if sentiment and sentiment < 0 else ""
-                print(f"   {sentiment_emoji} {post.get('post_title', 'N/A')[:80]}...")
-                print(f"      Sentiment: {sentiment} | Followers: {post.get('creator_followers', 'N/A')}")
+                print(f"   {sentiment_emoji} {post.get('post_title', 'N/A')[:80]}...", file=buf)
+                print(f"      Sentiment: {sentiment} | Followers: {post.get('creator_followers', 'N/A')}", file=buf)
         
         # AI Reports
         if data.get('ai_reports'):
-            print(f"\n🤖 AI ANALYSIS ({len(data['ai_reports'])} reports)")
+            print(f"\n🤖 AI ANALYSIS ({len(data['ai_reports'])} reports)", file=buf)
             for report in data['ai_reports']:
-                print(f"   📊 Investment Analysis: {report.get('investment_analysis', 'N/A')[:100]}...")
-                print(f"    Deep Dive: {report.get('deep_dive', 'N/A')[:100]}...")
+                print(f"   📊 Investment Analysis: {report.get('investment_analysis', 'N/A')[:100]}...", file=buf)
+                print(f"    Deep Dive: {report.get('deep_dive', 'N/A')[:100]}...", file=buf)
         
         # Trading Signals
         if data.get('trading_signals'):
-            print(f"\n TRADING SIGNALS ({len(data['trading_signals'])} signals)")
+            print(f"\n TRADING SIGNALS ({len(data['trading_signals'])} signals)", file=buf)
             for signal in data['trading_signals']:
                 signal_value = signal.get('trading_signal', 'N/A')
                 signal_emoji = "🟢" if signal_value == 1 else "🔴" if signal_value == -1 else ""
-                print(f"   {signal_emoji} Signal: {signal_value} | Trend: {signal.get('token_trend', 'N/A')}")
+                print(f"   {signal_emoji} Signal: {signal_value} | Trend: {signal.get('token_trend', 'N/A')}", file=buf)
         
         # Hourly Trading Signals
         if data.get('hourly_trading_signals'):
-            print(f"\n⏰ HOURLY TRADING SIGNALS ({len(data['hourly_trading_signals'])} signals)")
+            print(f"\n⏰ HOURLY TRADING SIGNALS ({len(data['hourly_trading_signals'])} signals)", file=buf)
             for signal in data['hourly_trading_signals'][:5]:  # Show last 5 hourly signals
                 signal_value = signal.get('signal', 'N/A')
                 signal_emoji = "🟢" if signal_value == 'BUY' else "🔴" if signal_value == 'SELL' else ""
-                print(f"   {signal_emoji} {signal.get('timestamp', 'N/A')}: {signal_value} | Price: ${signal.get('close_price', 'N/A')}")
+                print(f"   {signal_emoji} {signal.get('timestamp', 'N/A')}: {signal_value} | Price: ${signal.get('close_price', 'N/A')}", file=buf)
         
         # Fundamental Grade
         if data.get('fundamental_grade'):
-            print(f"\n📊 FUNDAMENTAL ANALYSIS ({len(data['fundamental_grade'])} records)")
+            print(f"\n📊 FUNDAMENTAL ANALYSIS ({len(data['fundamental_grade'])} records)", file=buf)
             for grade in data['fundamental_grade']:
-                print(f"   🏆 Grade: {grade.get('fundamental_grade', 'N/A')}")
-                print(f"   🏘️ Community Score: {grade.get('community_score', 'N/A')}")
-                print(f"   💱 Exchange Score: {grade.get('exchange_score', 'N/A')}")
+                print(f"   🏆 Grade: {grade.get('fundamental_grade', 'N/A')}", file=buf)
+                print(f"   🏘️ Community Score: {grade.get('community_score', 'N/A')}", file=buf)
+                print(f"   💱 Exchange Score: {grade.get('exchange_score', 'N/A')}", file=buf)
         
         # OHLCV Data
         if data.get('daily_ohlcv'):
-            print(f"\n💰 DAILY OHLCV ({len(data['daily_ohlcv'])} records)")
+            print(f"\n💰 DAILY OHLCV ({len(data['daily_ohlcv'])} records)", file=buf)
             for ohlcv in data['daily_ohlcv'][:3]:  # Show last 3 days
-                print(f"   📅 {ohlcv.get('date_time', 'N/A')}: O:${ohlcv.get('open_price', 'N/A')} H:${ohlcv.get('high_price', 'N/A')} L:${ohlcv.get('low_price', 'N/A')} C:${ohlcv.get('close_price', 'N/A')}")
+                print(f"   📅 {ohlcv.get('date_time', 'N/A')}: O:${ohlcv.get('open_price', 'N/A')} H:${ohlcv.get('high_price', 'N/A')} L:${ohlcv.get('low_price', 'N/A')} C:${ohlcv.get('close_price', 'N/A')}", file=buf)
         
         # Resistance Support Data
         if data.get('resistance_support'):
-            print(f"\n📊 RESISTANCE & SUPPORT ({len(data['resistance_support'])} records)")
+            print(f"\n📊 RESISTANCE & SUPPORT ({len(data['resistance_support'])} records)", file=buf)
             for rs in data['resistance_support']:
                 levels = rs.get('historical_levels', [])
-                print(f"    Historical Levels: {len(levels)} levels")
+                print(f"    Historical Levels: {len(levels)} levels", file=buf)
                 if levels:
                     # Show first few levels
                     for level in levels[:3]:
-                        print(f"       Level: ${level.get('level', 'N/A')} | Type: {level.get('type', 'N/A')}")
+                        print(f"       Level: ${level.get('level', 'N/A')} | Type: {level.get('type', 'N/A')}", file=buf)
         
         # Token Metrics
         if data.get('token_metrics'):
-            print(f"\n💰 TOKEN METRICS ({len(data['token_metrics'])} records)")
+            print(f"\n💰 TOKEN METRICS ({len(data['token_metrics'])} records)", file=buf)
             for metric in data['token_metrics']:
-                print(f"   💵 Current Price: ${metric.get('current_price', 'N/A')}")
-                print(f"   📊 Market Cap: ${metric.get('market_cap', 'N/A'):,.0f}" if metric.get('market_cap') else "    Market Cap: N/A")
-                print(f"   📈 24h Change: {metric.get('price_change_percentage_24h', 'N/A')}%")
+                print(f"   💵 Current Price: ${metric.get('current_price', 'N/A')}", file=buf)
+                print(f"   📊 Market Cap: ${metric.get('market_cap', 'N/A'):,.0f}" if metric.get('market_cap') else "    Market Cap: N/A", file=buf)
+                print(f"   📈 24h Change: {metric.get('price_change_percentage_24h', 'N/A')}%", file=buf)
+        
+        print(f"\n{'='*100}", file=buf)
         
-        print(f"\n{'='*100}")
+        sys.stdout.write(buf.getvalue())
 
+    def format_token_data(self, comprehensive_data: Dict[str, Any]) -> str:
+        """Format the per-token data section of an analysis prompt"""
+        token_name = comprehensive_data.get('token_name', 'UNKNOWN')
+        
+        # Extract key information from the data
+        social_summary = ""
+        if comprehensive_data.get('social_posts'):
+            metrics = comprehensive_data.get('social_metrics') or self.summarize_social_posts(comprehensive_data['social_posts'])
+            social_summary = f"Social sentiment: {metrics['avg_sentiment']:.2f}/5, {metrics['post_count']} posts, {metrics['total_interactions']:,} total interactions"
+        
+        ai_summary = ""
+        if comprehensive_data.get('ai_reports'):
+            ai_summary = f"AI analysis available: {len(comprehensive_data['ai_reports'])} reports"
+        
+        fundamental_summary = ""
+        if comprehensive_data.get('fundamental_grade'):
+            grade = comprehensive_data['fundamental_grade'][0]
+            fundamental_summary = f"Fundamental grade: {grade.get('fundamental_grade', 'N/A')} ({grade.get('fundamental_grade_class', 'N/A')})"
+        
+        price_summary = ""
+        if comprehensive_data.get('daily_ohlcv'):
+            latest_daily = comprehensive_data['daily_ohlcv'][-1]
+            price_summary = f"Current price: ${latest_daily.get('close_price', 'N/A')}"
+        elif comprehensive_data.get('hourly_ohlcv'):
+            latest_hourly = comprehensive_data['hourly_ohlcv'][-1]
+            price_summary = f"Current price: ${latest_hourly.get('close_price', 'N/A')}"
+        
+        # Add hourly trading signals summary
+        hourly_signals_summary = ""
+        if comprehensive_data.get('hourly_trading_signals'):
+            latest_hourly_signal = comprehensive_data['hourly_trading_signals'][-1]
+            hourly_signals_summary = f"Latest hourly signal: {latest_hourly_signal.get('signal', 'N/A')}, Position: {latest_hourly_signal.get('position', 'N/A')}, Price: ${latest_hourly_signal.get('close_price', 'N/A')}"
+        
+        return TOKEN_DATA_TEMPLATE.format(
+            token_name=token_name,
+            social_summary=social_summary,
+            ai_summary=ai_summary,
+            fundamental_summary=fundamental_summary,
+            price_summary=price_summary,
+            hourly_signals_summary=hourly_signals_summary,
+            social_posts=len(comprehensive_data.get('social_posts', [])),
+            ai_reports=len(comprehensive_data.get('ai_reports', [])),
+            trading_signals=len(comprehensive_data.get('trading_signals', [])),
+            hourly_trading_signals=len(comprehensive_data.get('hourly_trading_signals', [])),
+            fundamental_grade=len(comprehensive_data.get('fundamental_grade', [])),
+            daily_ohlcv=len(comprehensive_data.get('daily_ohlcv', [])),
+            hourly_ohlcv=len(comprehensive_data.get('hourly_ohlcv', []))
+        )
+    
+    async def stream_analysis_reply(self, prompt: str, max_tokens: int, system_prompt: str = ANALYSIS_SYSTEM_PROMPT) -> str:
+        """Stream a JSON-mode completion and return its text up to the end of the first JSON object"""
+        # Call OpenAI API; retries are handled by request_analysis_json
+        response = await self.openai_client.with_options(max_retries=0).chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        
+        # Stream the reply and stop collecting text as soon as the JSON object is closed; the
+        # stream is still drained, because the usage-only chunk arrives after the last content
+        scanner = JsonObjectScanner()
+        parts = []
+        closed = False
+        try:
+            async for chunk in response:
+                # Report how much of the prompt prefix was served from OpenAI's prompt cache
+                usage = getattr(chunk, 'usage', None)
+                if usage is not None:
+                    details = getattr(usage, 'prompt_tokens_details', None)
+                    cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+                    print(f"🧠 Prompt tokens: {usage.prompt_tokens} (cached: {cached_tokens})")
+                
+                if closed or not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ""
+                end = scanner.feed(text)
+                if end != -1:
+                    parts.append(text[:end])
+                    closed = True
+                    continue
+                parts.append(text)
+        finally:
+            await response.close()
+        
+        return "".join(parts).strip()
+    
+    async def request_analysis_json(self, prompt: str, max_tokens: int,
+                                    system_prompt: str = ANALYSIS_SYSTEM_PROMPT) -> Optional[Dict[str, Any]]:
+        """Send an analysis prompt to the LLM and return the parsed JSON, or None if it is invalid"""
+        # Reuse a recent analysis when the prompts (and so the summarized data) are unchanged
+        cache_key = hashlib.blake2b(f"{system_prompt}\0{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+        cached = self._llm_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < LLM_CACHE_TTL_SECONDS:
+            print("♻️ Using cached LLM analysis")
+            return cached[1]
+        
+        # Retry transient OpenAI failures here so the fetched data is not thrown away
+        for attempt in range(self.max_retries):
+            try:
+                llm_response = await self.stream_analysis_reply(prompt, max_tokens, system_prompt)
+                break
+            except RETRYABLE_OPENAI_ERRORS as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt) + random.uniform(0, 1))
+                reset_delay = rate_limit_reset_seconds(e)
+                if reset_delay is not None:
+                    delay = min(self.max_delay, max(delay, reset_delay))
+                logger.warning("⚠️ OpenAI request failed (%s), retrying in %.1f seconds... (attempt %d/%d)", type(e).__name__, delay, attempt + 1, self.max_retries)
+                await asyncio.sleep(delay)
+        
+        # JSON mode guarantees a JSON object unless the reply was cut off
+        try:
+            result = json_loads(llm_response)
+        except json.JSONDecodeError as e:
+            logger.error("❌ Failed to parse LLM JSON response: %s", e)
+            logger.debug("Raw response: %s", llm_response)
+            return None
+        
+        self._llm_cache[cache_key] = (time.monotonic(), result)
+        return result
+    
     async def generate_llm_analysis(self, comprehensive_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate LLM analysis with strict output format"""
         try:
             print("🤖 Generating LLM analysis with strict format...")
             
-            # Prepare the data for LLM processing
             token_name = comprehensive_data.get('token_name', 'UNKNOWN')
             
-            # Extract key information from the data
-            social_summary = ""
-            if comprehensive_data.get('social_posts'):
-                total_sentiment = sum(post.get('post_sentiment', 0) for post in comprehensive_data['social_posts'])
-                avg_sentiment = total_sentiment / len(comprehensive_data['social_posts'])
-                total_interactions = sum(post.get('interactions_total', 0) for post in comprehensive_data['social_posts'])
-                social_summary = f"Social sentiment: {avg_sentiment:.2f}/5, {len(comprehensive_data['social_posts'])} posts, {total_interactions:,} total interactions"
-            
-            ai_summary = ""
-            if comprehensive_data.get('ai_reports'):
-                ai_summary = f"AI analysis available: {len(comprehensive_data['ai_reports'])} reports"
-            
-            fundamental_summary = ""
-            if comprehensive_data.get('fundamental_grade'):
-                grade = comprehensive_data['fundamental_grade'][0]
-                fundamental_summary = f"Fundamental grade: {grade.get('fundamental_grade', 'N/A')} ({grade.get('fundamental_grade_class', 'N/A')})"
-            
-            price_summary = ""
-            if comprehensive_data.get('daily_ohlcv'):
-                latest_daily = comprehensive_data['daily_ohlcv'][-1]
-                price_summary = f"Current price: ${latest_daily.get('close_price', 'N/A')}"
-            elif comprehensive_data.get('hourly_ohlcv'):
-                latest_hourly = comprehensive_data['hourly_ohlcv'][-1]
-                price_summary = f"Current price: ${latest_hourly.get('close_price', 'N/A')}"
-            
-            # Add hourly trading signals summary
-            hourly_signals_summary = ""
-            if comprehensive_data.get('hourly_trading_signals'):
-                latest_hourly_signal = comprehensive_data['hourly_trading_signals'][-1]
-                hourly_signals_summary = f"Latest hourly signal: {latest_hourly_signal.get('signal', 'N/A')}, Position: {latest_hourly_signal.get('position', 'N/A')}, Price: ${latest_hourly_signal.get('close_price', 'N/A')}"
-            
-            # Create the prompt for LLM
-            prompt = f"""
-You are a cryptocurrency investment analyst. Based on the following data for {token_name}, generate a trading recommendation in the EXACT JSON format specified below.
-
-DATA SUMMARY:
-- {social_summary}
-- {ai_summary}
-- {fundamental_summary}
-- {price_summary}
-- {hourly_signals_summary}
-
-AVAILABLE DATA:
-1. Social Posts: {len(comprehensive_data.get('social_posts', []))} posts
-2. AI Reports: {len(comprehensive_data.get('ai_reports', []))} reports
-3. Trading Signals: {len(comprehensive_data.get('trading_signals', []))} signals
-4. Hourly Trading Signals: {len(comprehensive_data.get('hourly_trading_signals', []))} signals
-5. Fundamental Grade: {len(comprehensive_data.get('fundamental_grade', []))} records
-6. Daily OHLCV: {len(comprehensive_data.get('daily_ohlcv', []))} records
-7. Hourly OHLCV: {len(comprehensive_data.get('hourly_ohlcv', []))} records
-
-REQUIRED OUTPUT FORMAT (JSON only, no other text):
-{{
-  "new_positions": [
-    {{
-      "symbol": "{token_name}",
-      "entry": [current_price_or_recommended_entry],
-      "size_usd": [position_size_in_usd],
-      "stop_loss": [stop_loss_price],
-      "target_1": [first_target_price],
-      "target_2": [second_target_price],
-      "rationale": "[Detailed rationale based on the data provided, including hourly trading signals]"
-    }}
-  ]
-}}
-
-IMPORTANT:
-- Use ONLY the exact JSON format above
-- Do not include any explanatory text before or after the JSON
-- Base your analysis on the available data, especially hourly trading signals
-- If insufficient data, use conservative estimates
-- The rationale should reference specific data points from the provided information
-- All prices should be realistic based on current market conditions
-- Position size should be reasonable (typically 10-50 USD for testing)
-- Consider hourly trading signals for short-term entry/exit timing
-"""
-
-            # Call OpenAI API
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a cryptocurrency investment analyst. You must respond with ONLY valid JSON in the exact format specified. No additional text or explanations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
+            # Static instructions first so the prompt prefix is cacheable; per-token data last
+            prompt = ANALYSIS_PROMPT_PREFIX + self.format_token_data(comprehensive_data)
             
-            # Extract and parse the response
-            llm_response = response.choices[0].message.content.strip()
-            
-            # Try to extract JSON from the response
-            import json
-            import re
-            
-            # Look for JSON pattern in the response
-            json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    print("✅ LLM analysis generated successfully")
-                    return result
-                except json.JSONDecodeError as e:
-                    print(f"❌ Failed to parse LLM JSON response: {e}")
-                    print(f"Raw response: {llm_response}")
-                    return self.generate_fallback_response(token_name)
-            else:
-                print(f"❌ No JSON found in LLM response: {llm_response}")
+            result = await self.request_analysis_json(prompt, max_tokens=ANALYSIS_MAX_TOKENS)
+            if result is None:
+                return self.generate_fallback_response(token_name)
+            
+            try:
+                positions = [Position.from_dict(position) for position in result['new_positions']]
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error("❌ LLM response does not match the position schema: %s", e)
                 return self.generate_fallback_response(token_name)
+            
+            print("✅ LLM analysis generated successfully")
+            return {"new_positions": positions}
                 
         except Exception as e:
-            print(f"❌ Error generating LLM analysis: {e}")
+            logger.error("❌ Error generating LLM analysis: %s", e)
             return self.generate_fallback_response(comprehensive_data.get('token_name', 'UNKNOWN'))
     
     def generate_fallback_response(self, token_name: str) -> Dict[str, Any]:
         """Generate fallback response when LLM fails"""
-        return {
-            "new_positions": [
-                {
-                    "symbol": token_name,
-                    "entry": 1.00,
-                    "size_usd": 20,
-                    "stop_loss": 0.80,
-                    "target_1": 1.20,
-                    "target_2": 1.50,
-                    "rationale": f"Fallback recommendation for {token_name} due to insufficient data or LLM processing error."
-                }
-            ]
-        }
+        position = dataclasses.replace(
+            FALLBACK_POSITION_TEMPLATE,
+            symbol=token_name,
+            rationale=f"Fallback recommendation for {token_name} due to insufficient data or LLM processing error."
+        )
+        return {"new_positions": [position]}
     
     def print_llm_analysis(self, llm_result: Dict[str, Any]):
         """Print the LLM analysis results"""
-        print(f"\n{'='*100}")
-        print(" LLM TRADING RECOMMENDATION")
-        print("=" * 60)
+        # Build the whole report in memory and write it to stdout once
+        buf = io.StringIO()
+        
+        print(f"\n{'='*100}", file=buf)
+        print(" LLM TRADING RECOMMENDATION", file=buf)
+        print("=" * 60, file=buf)
         
         if llm_result and 'new_positions' in llm_result:
             for i, position in enumerate(llm_result['new_positions'], 1):
-                print(f"📊 Position {i}:")
-                print(f"  • Symbol: {position.get('symbol', 'N/A')}")
-                print(f"  • Entry Price: ${position.get('entry', 'N/A')}")
-                print(f"  • Position Size: ${position.get('size_usd', 'N/A')}")
-                print(f"  • Stop Loss: ${position.get('stop_loss', 'N/A')}")
-                print(f"  • Target 1: ${position.get('target_1', 'N/A')}")
-                print(f"  • Target 2: ${position.get('target_2', 'N/A')}")
-                print(f"  • Rationale: {position.get('rationale', 'N/A')}")
-                print()
+                print(f"📊 Position {i}:", file=buf)
+                print(f"  • Symbol: {position.symbol}", file=buf)
+                print(f"  • Entry Price: ${position.entry}", file=buf)
+                print(f"  • Position Size: ${position.size_usd}", file=buf)
+                print(f"  • Stop Loss: ${position.stop_loss}", file=buf)
+                print(f"  • Target 1: ${position.target_1}", file=buf)
+                print(f"  • Target 2: ${position.target_2}", file=buf)
+                print(f"  • Rationale: {position.rationale}", file=buf)
+                print(file=buf)
         else:
-            print("❌ No valid LLM analysis results")
+            print("❌ No valid LLM analysis results", file=buf)
+        
+        print(f"{'='*100}", file=buf)
         
-        print(f"{'='*100}")
+        sys.stdout.write(buf.getvalue())
 
     async def run_comprehensive_analysis(self) -> bool:
         """Run the complete comprehensive token analysis"""
@@ -711,13 +1224,14 @@ IMPORTANT:
             print("🚀 Starting Comprehensive Token Analysis")
             print(f"{'='*50}")
             
-            # Step 1: Find most investable token
-            top_token = await self.get_top_investable_token()
-            if not top_token:
+            # Step 1: Find the most investable token
+            candidates = await self.get_top_investable_tokens(3)
+            if not candidates:
                 print("❌ Could not determine top investable token")
                 return False
+            top_token = candidates[0]
             
-            # Step 2: Get comprehensive data for that token
+            # Step 2: Get comprehensive data for the top token
             comprehensive_data = await self.get_comprehensive_token_data(top_token)
             if not comprehensive_data:
                 print(f"❌ Could not retrieve data for {top_token}")
@@ -733,30 +1247,29 @@ IMPORTANT:
             self.print_llm_analysis(llm_result)
             
             # Step 6: Print the raw JSON for easy copying
-            import json
-            print(f"\n📋 RAW JSON OUTPUT:")
-            print("=" * 60)
-            print(json.dumps(llm_result, indent=2))
-            print("=" * 60)
+            if self.print_raw_json:
+                sys.stdout.write(f"\n📋 RAW JSON OUTPUT:\n{'=' * 60}\n{json_dumps_indented(llm_result)}\n{'=' * 60}\n")
             
             print(f"\n✅ Comprehensive analysis completed for {top_token}")
             return True
             
         except Exception as e:
-            print(f"❌ Comprehensive analysis failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Comprehensive analysis failed: %s", e)
             return False
 
 async def main():
     """Main function to run the comprehensive token analysis"""
+    retriever = None
     try:
         retriever = TokenRetriever()
+        retriever.print_raw_json = os.getenv('CRYPTOAGENT_VERBOSE') == '1'
         await retriever.run_comprehensive_analysis()
     except Exception as e:
-        print(f"❌ Failed to start token retriever: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to start token retriever: %s", e)
+    finally:
+        if retriever is not None:
+            await retriever.aclose()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     asyncio.run(main())
@@ -11,19 +11,36 @@ into a single workflow that:
 """
 
 import asyncio
+import heapq
 import os
 import sys
 import json
-from typing import List, Dict
+import logging
+import httpx
+import numpy as np
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 import urllib.parse
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timezone
+
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:
+    AsyncLimiter = None
+
+# libuv-based event loop (not available on Windows); falls back to the default asyncio loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # Add the top_token_pipeline directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'top_token_pipeline'))
 
 # Import our modules
-from apis.token_metrics import TokenMetricsAPI
-from apis.social_sentiment import fetch_social_sentiment, filter_posts, store_in_supabase
+from apis.token_metrics import TokenMetricsAPI, create_paid_client
+from apis.social_sentiment import fetch_social_sentiment, filter_posts, store_in_supabase_bulk
 from apis.ohlcv_storage import OHLCVStorage
 from apis.trading_signals import TradingSignalsAPI
 from apis.trading_signals_storage import TradingSignalsStorage
@@ -34,9 +51,11 @@ from apis.fundamental_grade import FundamentalGradeAPI
 from apis.token_data import TokenDataAPI
 from apis.embedding_pipeline import EmbeddingPipeline
 from apis.resistance_support import ResistanceSupportAPI
+from apis.supabase_client import get_supabase_client
+from logging_setup import configure_logging
 
 # Import retriever logic
-from retriever import TokenRetriever
+from retriever import TokenRetriever, INVESTMENT_QUERIES
 
 # Import top token pipeline - fix the import path
 try:
@@ -50,11 +69,9 @@ except ImportError:
 
 # Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
@@ -63,24 +80,132 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
+logger = logging.getLogger(__name__)
+
+# Rank offset for reciprocal rank fusion of the embedding search results
+RRF_K = 60
+
+# Maximum social sentiment requests in flight at once
+SOCIAL_POSTS_CONCURRENCY = 4
+
+# Token Metrics request budget shared by all API helpers (requests per period in seconds)
+TOKEN_METRICS_MAX_RATE = 60
+TOKEN_METRICS_RATE_PERIOD = 60
+
+# Entries kept in the per-day comprehensive token data LRU
+TOKEN_DATA_CACHE_SIZE = 64
+
+# Tokens whose comprehensive data (nine blocking Supabase queries each) is fetched at once on worker threads
+TOKEN_DATA_CONCURRENCY = 4
+
+# LLM position fields and the new_positions price columns they are stored in (entry first)
+POSITION_PRICE_FIELDS = (
+    ('entry', 'entry_price'),
+    ('size_usd', 'size_usd'),
+    ('stop_loss', 'stop_loss'),
+    ('target_1', 'target_1'),
+    ('target_2', 'target_2'),
+)
+
+# Unique key of a new_positions row (see database_schema_new_positions.sql)
+NEW_POSITIONS_CONFLICT_COLUMNS = 'symbol,entry_price,created_date'
+
+# Default page size for stored position lookups
+STORED_POSITIONS_PAGE_SIZE = 100
+
+RECOMMENDATION_SYSTEM_PROMPT = "You are a cryptocurrency investment analyst."
+
+# Output budget for the recommendations reply (several positions with rationales)
+RECOMMENDATION_MAX_TOKENS = 1500
+
+# Static part of the recommendations prompt. It is kept byte-identical across runs and
+# placed before the token data summary so OpenAI's automatic prompt caching can reuse it.
+RECOMMENDATION_PROMPT_PREFIX = """
+You are a cryptocurrency investment analyst. Based on the comprehensive data for multiple tokens summarized at the end of this message, generate trading recommendations for new positions in the EXACT JSON format specified below.
+
+AVAILABLE DATA FOR EACH TOKEN:
+- Social sentiment analysis
+- AI analysis reports
+- Trading signals and hourly signals
+- Fundamental grades
+- Price data (daily and hourly OHLCV)
+- 🆕 Token metrics (current price, market cap, volume, supply, 24h changes)
+
+REQUIRED OUTPUT FORMAT (JSON only, no other text):
+{
+  "new_positions": [
+    {
+      "symbol": "[TOKEN_SYMBOL]",
+      "entry": [entry_price],
+      "size_usd": [position_size_in_usd],
+      "stop_loss": [stop_loss_price],
+      "target_1": [first_target_price],
+      "target_2": [second_target_price],
+      "days": [estimated_days_to_reach_target_based_on_analysis],
+      "rationale": "[Detailed rationale based on the data provided, including social sentiment, AI analysis, trading signals, and token metrics. Also explain your days estimate based on market conditions, volatility, and technical analysis.]"
+    }
+  ]
+}
+
+IMPORTANT RULES:
+- Use ONLY the exact JSON format above
+- Do not include any explanatory text before or after the JSON
+- Base your analysis on the available data for each token
+- If insufficient data, use conservative estimates
+- The rationale should reference specific data points from the provided information
+- All prices should be realistic based on current market conditions
+- Position size should be reasonable (typically 10-50 USD for testing)
+- Consider hourly trading signals for short-term entry/exit timing
+- Generate recommendations for the top 2-4 most promising tokens based on the data
+- Focus on tokens with strong social sentiment, AI analysis, trading signals, and favorable token metrics
+- Use the current price from token metrics for realistic entry/exit calculations
+- The "days" field should be your AI-estimated time to reach the target price based on your expert analysis of the provided data
+
+TOKEN DATA SUMMARY (one JSON record per token; sentiment is on a 0-5 scale, prices in USD):
+"""
+
+def to_float_or_nan(value) -> float:
+    """Coerce an LLM-provided number to float, returning NaN for missing or non-numeric values"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
 class CompleteCryptoWorkflow:
     def __init__(self):
+        # Stage progress is logged, so make sure it reaches stdout when the workflow is
+        # driven from outside main() (e.g. the Streamlit runner)
+        configure_logging()
+        
         if not SUPABASE_URL or not SUPABASE_KEY or not USER_ID:
             raise ValueError("Missing required environment variables: SUPABASE_URL, SUPABASE_KEY, USER_ID")
         
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        self.token_api = TokenMetricsAPI()
+        # Shared with the retriever and the embedding pipeline, so they all reuse one connection pool
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+        
+        # One pooled paid client for every Token Metrics helper, so requests to the
+        # same host reuse connections instead of repeating the TCP/TLS handshake
+        self.http = create_paid_client(limits=httpx.Limits(max_connections=50, max_keepalive_connections=20))
+        # Pooled client for the LunarCrush social sentiment requests
+        self.social_http = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=SOCIAL_POSTS_CONCURRENCY, max_keepalive_connections=SOCIAL_POSTS_CONCURRENCY)
+        )
+        # Token-bucket limiter for the same host, replacing fixed sleeps between stages
+        self.tm_limiter = AsyncLimiter(TOKEN_METRICS_MAX_RATE, TOKEN_METRICS_RATE_PERIOD) if AsyncLimiter is not None else None
+        
+        self.token_api = TokenMetricsAPI(client=self.http, limiter=self.tm_limiter)
         self.ohlcv_storage = OHLCVStorage()
-        self.trading_signals_api = TradingSignalsAPI()
+        self.trading_signals_api = TradingSignalsAPI(client=self.http, limiter=self.tm_limiter)
         self.trading_signals_storage = TradingSignalsStorage()
-        self.hourly_trading_signals_api = HourlyTradingSignalsAPI()
+        self.hourly_trading_signals_api = HourlyTradingSignalsAPI(client=self.http, limiter=self.tm_limiter)
         self.hourly_trading_signals_storage = HourlyTradingSignalsStorage()
-        self.ai_report_api = AIReportAPI()
-        self.fundamental_grade_api = FundamentalGradeAPI()
-        self.token_data_api = TokenDataAPI()
-        self.embedding_pipeline = EmbeddingPipeline()
+        self.ai_report_api = AIReportAPI(client=self.http, limiter=self.tm_limiter)
+        self.fundamental_grade_api = FundamentalGradeAPI(client=self.http, limiter=self.tm_limiter)
+        self.token_data_api = TokenDataAPI(client=self.http, limiter=self.tm_limiter)
+        self.embedding_pipeline = EmbeddingPipeline(supabase=self.supabase)
         # Add resistance support API
-        self.resistance_support_api = ResistanceSupportAPI()
+        self.resistance_support_api = ResistanceSupportAPI(client=self.http, limiter=self.tm_limiter)
         
         # Initialize retriever
         try:
@@ -96,6 +221,20 @@ class CompleteCryptoWorkflow:
             self.top_token_pipeline = TopTokenPipeline()
         else:
             self.top_token_pipeline = None
+        
+        # Comprehensive token data keyed by (token_name, day), most recently used last
+        self._token_data_cache: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        
+        # Metadata (TOKEN_ID, TOKEN_SYMBOL, ...) of this run's tokens keyed by token name,
+        # filled once by the data collection stage and read by the later stages
+        self._token_map: Dict[str, Dict] = {}
+    
+    async def aclose(self):
+        """Close the shared HTTP clients"""
+        await self.http.aclose()
+        await self.social_http.aclose()
+        if self.retriever is not None:
+            await self.retriever.aclose()
     
     async def get_top_10_tokens(self) -> List[Dict]:
         """Get top 10 tokens from the top token pipeline"""
@@ -220,27 +359,41 @@ class CompleteCryptoWorkflow:
             
             # Use the retriever's semantic search to find top tokens
             # We'll search for multiple queries to get diverse results
-            queries = [
-                "most investable cryptocurrency with strong fundamentals",
-                "cryptocurrency investment opportunity positive sentiment",
-                "best crypto to invest in with growth potential",
-                "cryptocurrency with strong community and development"
-            ]
-            
-            all_tokens = set()
-            
-            for query in queries:
-                print(f" Searching: '{query}'")
-                results = await self.retriever.semantic_search(query, top_k=3)
+            queries = INVESTMENT_QUERIES
+            
+            # Embed the fixed queries in one batched call; the retriever's embedding cache
+            # (in memory and on disk) serves them without an API call on later runs
+            query_embeddings = await self.retriever.create_embeddings(queries)
+            if query_embeddings is None:
+                query_embeddings = [None] * len(queries)
+            
+            # Reciprocal rank fusion: each hit adds 1 / (RRF_K + rank) to its token's score
+            token_scores = defaultdict(float)
+            
+            # Run all searches concurrently; a failed query is skipped like an empty one
+            print(f" Searching {len(queries)} queries...")
+            results_list = await asyncio.gather(
+                *(
+                    self.retriever.semantic_search(query, top_k=3, query_embedding=query_embedding)
+                    for query, query_embedding in zip(queries, query_embeddings)
+                ),
+                return_exceptions=True
+            )
+            
+            for query, results in zip(queries, results_list):
+                if isinstance(results, Exception):
+                    print(f"⚠️ Search failed for '{query}': {results}")
+                    continue
                 if results:
-                    for result in results:
+                    for rank, result in enumerate(results):
                         token_name = result.get('token_name')
                         if token_name:
-                            all_tokens.add(token_name)
-                    print(f"✅ Found {len(results)} results for query")
+                            token_scores[token_name] += 1.0 / (RRF_K + rank)
+                    print(f"✅ Found {len(results)} results for '{query}'")
             
-            # Convert to list and take top 4
-            top_tokens = list(all_tokens)[:4]
+            # Highest fused score first; ties broken by name so the order is stable.
+            # Only the top 4 are needed, so select them without sorting every candidate
+            top_tokens = heapq.nsmallest(4, token_scores, key=lambda token: (-token_scores[token], token))
             
             if not top_tokens:
                 print("⚠️ No tokens found from embeddings search. Using fallback...")
@@ -251,7 +404,7 @@ class CompleteCryptoWorkflow:
                     for post in posts_response.data:
                         if post.get('token_name'):
                             post_tokens.add(post['token_name'])
-                    top_tokens = list(post_tokens)[:4]
+                    top_tokens = heapq.nsmallest(4, post_tokens)
             
             print(f"✅ Top 4 tokens from embeddings: {', '.join(top_tokens)}")
             return top_tokens
@@ -265,51 +418,29 @@ class CompleteCryptoWorkflow:
         try:
             print(f"📊 Getting comprehensive token data for today: {', '.join(token_names)}")
             
-            comprehensive_data = {}
+            # Tokens are independent; each fetch runs its Supabase queries on a worker thread,
+            # and the semaphore bounds how many threads (and connections) are busy at once
+            semaphore = asyncio.Semaphore(TOKEN_DATA_CONCURRENCY)
             
-            for token_name in token_names:
-                # 🆕 FIX: URL decode the token name if it's encoded
-                decoded_token_name = urllib.parse.unquote(token_name)
-                if decoded_token_name != token_name:
-                    print(f" Decoded token name: {token_name} → {decoded_token_name}")
-                    token_name = decoded_token_name
-                
-                print(f"\n🔄 Processing {token_name}...")
-                
-                # Use the retriever's method to get comprehensive data
-                token_data = await self.retriever.get_comprehensive_token_data(token_name)
+            async def get_token_data_limited(token_name: str) -> Tuple[str, Optional[Dict]]:
+                async with semaphore:
+                    return await self.get_token_data_for_today(token_name)
+            
+            results = await asyncio.gather(
+                *(get_token_data_limited(token_name) for token_name in token_names),
+                return_exceptions=True
+            )
+            
+            comprehensive_data = {}
+            for token_name, result in zip(token_names, results):
+                if isinstance(result, Exception):
+                    print(f"⚠️ Error getting comprehensive data for {token_name}: {result}")
+                    continue
+                decoded_name, token_data = result
                 if token_data:
-                    # Add resistance support data to the comprehensive data
-                    print(f"🔄 Adding resistance support data for {token_name}...")
-                    
-                    # Get token ID from the data
-                    token_id = None
-                    if token_data.get('ai_reports'):
-                        token_id = token_data['ai_reports'][0].get('token_id')
-                    elif token_data.get('fundamental_grade'):
-                        token_id = token_data['fundamental_grade'][0].get('token_id')
-                    
-                    if token_id:
-                        # ✅ FIXED: Actually fetch resistance support data
-                        try:
-                            resistance_support_data = await self.resistance_support_api.get_resistance_support_by_id(token_id)
-                            if resistance_support_data:
-                                token_data['resistance_support'] = resistance_support_data
-                                print(f"✅ Added resistance support data for {token_name}")
-                            else:
-                                print(f"⚠️ No resistance support data found for {token_name}")
-                                token_data['resistance_support'] = {}
-                        except Exception as e:
-                            print(f"⚠️ Error fetching resistance support data for {token_name}: {e}")
-                            token_data['resistance_support'] = {}
-                    else:
-                        print(f"⚠️ Could not determine token ID for {token_name}")
-                        token_data['resistance_support'] = {}
-                    
-                    comprehensive_data[token_name] = token_data
-                    print(f"✅ Retrieved comprehensive data for {token_name}")
-                else:
-                    print(f"⚠️ No comprehensive data found for {token_name}")
+                    comprehensive_data[decoded_name] = token_data
+            
+            await self.add_resistance_support_data(comprehensive_data)
             
             print(f"✅ Retrieved comprehensive data for {len(comprehensive_data)} tokens")
             return comprehensive_data
@@ -318,136 +449,130 @@ class CompleteCryptoWorkflow:
             print(f"❌ Error getting comprehensive token data: {e}")
             return {}
     
+    async def add_resistance_support_data(self, comprehensive_data: Dict[str, Dict]):
+        """Attach resistance support data to every token using a single batched API request"""
+        # Supabase stores token IDs as strings while the API reports them as integers
+        token_ids = {}
+        for token_name, token_data in comprehensive_data.items():
+            token_data['resistance_support'] = {}
+            # Tokens collected earlier in this run already carry their ID in the token map
+            token_id = token_data.get('token_id') or self._token_map.get(token_name, {}).get('TOKEN_ID')
+            if token_id is None:
+                print(f"⚠️ Could not determine token ID for {token_name}")
+                continue
+            token_ids[token_name] = int(token_id) if str(token_id).isdigit() else token_id
+        
+        if not token_ids:
+            return
+        
+        print(f"🔄 Adding resistance support data for {', '.join(token_ids)}...")
+        try:
+            rs_map = await self.resistance_support_api.get_resistance_support_multiple_by_ids(list(token_ids.values()))
+        except Exception as e:
+            print(f"⚠️ Error fetching resistance support data: {e}")
+            return
+        
+        for token_name, token_id in token_ids.items():
+            resistance_support_data = rs_map.get(token_id)
+            if resistance_support_data:
+                comprehensive_data[token_name]['resistance_support'] = resistance_support_data
+                print(f"✅ Added resistance support data for {token_name}")
+            else:
+                print(f"⚠️ No resistance support data found for {token_name}")
+    
+    async def get_cached_comprehensive_token_data(self, token_name: str) -> Dict:
+        """Get the retriever's comprehensive data for a token, memoized per token and day"""
+        key = (token_name, date.today().isoformat())
+        token_data = self._token_data_cache.get(key)
+        if token_data is not None:
+            self._token_data_cache.move_to_end(key)
+            return token_data
+        
+        token_data = await self.retriever.get_comprehensive_token_data(token_name)
+        if token_data:
+            self._token_data_cache[key] = token_data
+            if len(self._token_data_cache) > TOKEN_DATA_CACHE_SIZE:
+                self._token_data_cache.popitem(last=False)
+        return token_data
+    
+    async def get_token_data_for_today(self, token_name: str) -> Tuple[str, Optional[Dict]]:
+        """Get one token's comprehensive data, returning (decoded_name, data)"""
+        # 🆕 FIX: URL decode the token name if it's encoded (plain symbols have no '%' to decode)
+        decoded_token_name = urllib.parse.unquote(token_name) if '%' in token_name else token_name
+        if decoded_token_name != token_name:
+            print(f" Decoded token name: {token_name} → {decoded_token_name}")
+            token_name = decoded_token_name
+        
+        print(f"\n🔄 Processing {token_name}...")
+        
+        # Use the retriever's method to get comprehensive data
+        token_data = await self.get_cached_comprehensive_token_data(token_name)
+        if not token_data:
+            print(f"⚠️ No comprehensive data found for {token_name}")
+            return token_name, None
+        
+        print(f"✅ Retrieved comprehensive data for {token_name}")
+        return token_name, token_data
+    
     async def generate_llm_recommendations(self, comprehensive_data: Dict[str, Dict]) -> Dict:
         """Generate LLM recommendations for new positions in strict JSON format"""
         try:
             print("🤖 Generating LLM recommendations for new positions...")
             
-            # Prepare data summary for LLM
+            # Prepare a compact structured summary for LLM: one record per token,
+            # serialized without whitespace so the prompt carries fewer input tokens
             data_summary = []
             for token_name, token_data in comprehensive_data.items():
-                summary = f"{token_name}: "
+                rec = {'symbol': token_name}
                 
                 # Add social sentiment info
                 if token_data.get('social_posts'):
-                    avg_sentiment = sum(post.get('post_sentiment', 0) for post in token_data['social_posts']) / len(token_data['social_posts'])
-                    summary += f"Social sentiment: {avg_sentiment:.2f}/5, "
+                    posts = token_data['social_posts']
+                    sentiments = np.fromiter((post.get('post_sentiment') or 0 for post in posts), dtype=np.float32, count=len(posts))
+                    avg_sentiment = float(sentiments.mean())
+                    rec['sentiment'] = round(avg_sentiment, 2)
                 
                 # Add AI reports info
                 if token_data.get('ai_reports'):
-                    summary += f"AI reports: {len(token_data['ai_reports'])}, "
+                    rec['ai_reports'] = len(token_data['ai_reports'])
                 
                 # Add fundamental grade info
                 if token_data.get('fundamental_grade'):
                     grade = token_data['fundamental_grade'][0]
-                    summary += f"Fundamental grade: {grade.get('fundamental_grade', 'N/A')}, "
+                    rec['grade'] = grade.get('fundamental_grade')
                 
                 # 🆕 ADD TOKEN METRICS DATA FROM TOKENS TABLE
                 if token_data.get('token_metrics'):
                     metrics = token_data['token_metrics'][0]  # Get latest metrics
-                    summary += f"Current price: ${metrics.get('current_price', 'N/A')}, "
-                    summary += f"Market cap: ${metrics.get('market_cap', 'N/A'):,.0f}, "
-                    summary += f"24h change: {metrics.get('price_change_percentage_24h', 'N/A')}%, "
-                    summary += f"24h volume: ${metrics.get('total_volume', 'N/A'):,.0f}, "
+                    rec['price'] = metrics.get('current_price')
+                    rec['market_cap'] = metrics.get('market_cap')
+                    rec['change_24h_pct'] = metrics.get('price_change_percentage_24h')
+                    rec['volume_24h'] = metrics.get('total_volume')
                 # Fallback to OHLCV data if no token metrics
                 elif token_data.get('daily_ohlcv'):
-                    latest_price = token_data['daily_ohlcv'][-1].get('close_price', 'N/A')
-                    summary += f"Current price: ${latest_price}, "
+                    rec['price'] = token_data['daily_ohlcv'][-1].get('close_price')
                 elif token_data.get('hourly_ohlcv'):
-                    latest_price = token_data['hourly_ohlcv'][-1].get('close_price', 'N/A')
-                    summary += f"Current price: ${latest_price}, "
+                    rec['price'] = token_data['hourly_ohlcv'][-1].get('close_price')
                 
                 # Add hourly trading signals info
                 if token_data.get('hourly_trading_signals'):
                     latest_signal = token_data['hourly_trading_signals'][-1]
-                    summary += f"Latest signal: {latest_signal.get('signal', 'N/A')}, "
+                    rec['signal'] = latest_signal.get('signal')
                 
-                data_summary.append(summary.rstrip(', '))
-            
-            # Create LLM prompt
-            prompt = f"""
-You are a cryptocurrency investment analyst. Based on the following comprehensive data for multiple tokens, generate trading recommendations for new positions in the EXACT JSON format specified below.
-
-TOKEN DATA SUMMARY:
-{chr(10).join(f"- {summary}" for summary in data_summary)}
-
-AVAILABLE DATA FOR EACH TOKEN:
-- Social sentiment analysis
-- AI analysis reports
-- Trading signals and hourly signals
-- Fundamental grades
-- Price data (daily and hourly OHLCV)
-- 🆕 Token metrics (current price, market cap, volume, supply, 24h changes)
-
-REQUIRED OUTPUT FORMAT (JSON only, no other text):
-{{
-  "new_positions": [
-    {{
-      "symbol": "[TOKEN_SYMBOL]",
-      "entry": [entry_price],
-      "size_usd": [position_size_in_usd],
-      "stop_loss": [stop_loss_price],
-      "target_1": [first_target_price],
-      "target_2": [second_target_price],
-      "days": [estimated_days_to_reach_target_based_on_analysis],
-      "rationale": "[Detailed rationale based on the data provided, including social sentiment, AI analysis, trading signals, and token metrics. Also explain your days estimate based on market conditions, volatility, and technical analysis.]"
-    }}
-  ]
-}}
-
-IMPORTANT RULES:
-- Use ONLY the exact JSON format above
-- Do not include any explanatory text before or after the JSON
-- Base your analysis on the available data for each token
-- If insufficient data, use conservative estimates
-- The rationale should reference specific data points from the provided information
-- All prices should be realistic based on current market conditions
-- Position size should be reasonable (typically 10-50 USD for testing)
-- Consider hourly trading signals for short-term entry/exit timing
-- Generate recommendations for the top 2-4 most promising tokens based on the data
-- Focus on tokens with strong social sentiment, AI analysis, trading signals, and favorable token metrics
-- Use the current price from token metrics for realistic entry/exit calculations
-- The "days" field should be your AI-estimated time to reach the target price based on your expert analysis of the provided data
-"""
-
-            # Call OpenAI API using the retriever's client
-            response = self.retriever.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a cryptocurrency investment analyst. You must respond with ONLY valid JSON in the exact format specified. No additional text or explanations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1500
-            )
+                data_summary.append(rec)
             
-            # Extract and parse the response
-            llm_response = response.choices[0].message.content.strip()
+            # Static instructions first, per-run data last, so the prefix stays cacheable
+            prompt = RECOMMENDATION_PROMPT_PREFIX + json.dumps(data_summary, separators=(',', ':'), default=str) + "\n"
             
-            # Try to extract JSON from the response
-            import re
-            
-            # Look for JSON pattern in the response
-            json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    print("✅ LLM recommendations generated successfully")
-                    return result
-                except json.JSONDecodeError as e:
-                    print(f"❌ Failed to parse LLM JSON response: {e}")
-                    print(f"Raw response: {llm_response}")
-                    return self.generate_fallback_recommendations(list(comprehensive_data.keys()))
-            else:
-                print(f"❌ No JSON found in LLM response: {llm_response}")
+            # Stream, retry and parse through the retriever's JSON-mode helper
+            result = await self.retriever.request_analysis_json(
+                prompt, max_tokens=RECOMMENDATION_MAX_TOKENS, system_prompt=RECOMMENDATION_SYSTEM_PROMPT
+            )
+            if result is None:
                 return self.generate_fallback_recommendations(list(comprehensive_data.keys()))
+            
+            print("✅ LLM recommendations generated successfully")
+            return result
                 
         except Exception as e:
             print(f"❌ Error generating LLM recommendations: {e}")
@@ -496,16 +621,16 @@ IMPORTANT RULES:
         
         print(f"{'='*100}")
     
-    async def process_resistance_support_data(self, token_ids: List[int], token_symbols: List[str]) -> bool:
+    async def process_resistance_support_data(self, token_ids: List[int], token_symbols: Tuple[str, ...]) -> bool:
         """Process resistance support data for multiple tokens using token IDs"""
         try:
-            print(f"📊 Fetching resistance support data for {len(token_ids)} tokens...")
+            logger.info("📊 Fetching resistance support data for %s tokens...", len(token_ids))
             
             # Fetch resistance support data using token IDs
             resistance_support_data = await self.resistance_support_api.get_resistance_support_multiple_by_ids(token_ids)
             
             if not resistance_support_data:
-                print(f"ℹ️ No resistance support data found for tokens")
+                logger.info("ℹ️ No resistance support data found for tokens")
                 return True
             
             # Store resistance support data
@@ -516,25 +641,25 @@ IMPORTANT RULES:
                     data = resistance_support_data[token_id]
                     success = self.resistance_support_api.store_resistance_support_data(symbol, data)
                     if not success:
-                        print(f"❌ Failed to store resistance support data for {symbol}")
+                        logger.error("❌ Failed to store resistance support data for %s", symbol)
                     else:
-                        print(f"✅ Successfully stored resistance support data for {symbol}")
+                        logger.info("✅ Successfully stored resistance support data for %s", symbol)
                 else:
-                    print(f"⚠️ No resistance support data found for token ID {token_id}")
+                    logger.warning("⚠️ No resistance support data found for token ID %s", token_id)
             
             if success:
-                print(f"✅ Successfully processed resistance support data for all tokens")
+                logger.info("✅ Successfully processed resistance support data for all tokens")
                 return True
             else:
-                print(f"⚠️ Some resistance support data failed to store")
+                logger.warning("⚠️ Some resistance support data failed to store")
                 return False
                 
         except Exception as e:
-            print(f"❌ Error processing resistance support data: {e}")
+            logger.error("❌ Error processing resistance support data: %s", e)
             return False
     
-    async def run_data_collection_pipeline(self) -> bool:
-        """Run the complete data collection pipeline"""
+    async def run_data_collection_pipeline(self, embedding_inputs_stored: Optional[asyncio.Event] = None) -> bool:
+        """Run the complete data collection pipeline, setting embedding_inputs_stored once posts and AI reports are stored"""
         try:
             print("🚀 Starting Data Collection Pipeline")
             print("Processing: Top 10 tokens from token pipeline")
@@ -543,13 +668,16 @@ IMPORTANT RULES:
             # Get top 10 tokens from the token pipeline
             tokens = await self.get_top_10_tokens()
             print(f"Loaded {len(tokens)} tokens")
+            self._token_map = {token.get('TOKEN_NAME'): token for token in tokens}
             
-            # Extract symbols, names, and IDs from tokens
-            symbols = [token.get('TOKEN_SYMBOL', '').upper() for token in tokens]
+            # Extract symbols, names, and IDs from tokens; the symbol strings are built once per run
+            symbols = tuple(token.get('TOKEN_SYMBOL', '').upper() for token in tokens)
+            symbols_csv = ",".join(symbols)
+            symbols_label = ', '.join(symbols)
             names = [token.get('TOKEN_NAME', 'N/A') for token in tokens]
             token_ids = [token.get('TOKEN_ID') for token in tokens]
             
-            print(f"Processing symbols: {', '.join(symbols)}")
+            print(f"Processing symbols: {symbols_label}")
             print(f"Processing names: {', '.join(names)}")
             print(f"Processing IDs: {token_ids}")
             
@@ -562,66 +690,49 @@ IMPORTANT RULES:
             else:
                 print("✅ Real token data successfully fetched and stored")
             
-            # 1. Process social posts (individual calls using token names)
-            print("\n📱 Processing social posts...")
-            social_results = []
-            for i, name in enumerate(names):
-                social_success = await self.process_social_posts(name, symbols[i])
-                social_results.append(social_success)
-                await asyncio.sleep(1)  # Small delay between social calls
-            
-            # 2. Process OHLCV data (batched using token IDs)
-            print("\n📈 Processing OHLCV data...")
-            ohlcv_data = await self.token_api.get_ohlcv_data_multiple_by_ids(token_ids)
-            
-            # Store OHLCV data
-            ohlcv_success = True
-            for i, symbol in enumerate(symbols):
-                data = ohlcv_data.get(token_ids[i], {})
-                hourly_success = self.ohlcv_storage.store_hourly_ohlcv(symbol, data.get('hourly', []))
-                daily_success = self.ohlcv_storage.store_daily_ohlcv(symbol, data.get('daily', []))
-                if not hourly_success or not daily_success:
-                    ohlcv_success = False
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 3. Process AI reports (batched using token IDs)
-            print("\n🤖 Processing AI reports...")
-            ai_report_success = await self.ai_report_api.get_and_store_ai_report_multiple_by_ids(token_ids)
-            
-            await asyncio.sleep(3)  # Delay before next API call
-            
-            # 4. Process fundamental grade (batched using token IDs)
-            print("\n📊 Processing fundamental grade...")
-            fundamental_grade_success = await self.fundamental_grade_api.fetch_and_store_fundamental_grade_multiple_by_ids(token_ids)
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 5. Process trading signals (using token IDs)
-            print("\n Processing trading signals...")
-            token_symbols_str = ",".join(symbols)
-            trading_signals_success = await self.process_trading_signals(token_ids, token_symbols_str)
-            
-            await asyncio.sleep(2)  # Delay before next API call
+            # 1. Process social posts (fetched concurrently using token names, stored in one batch)
+            social_success = await self.process_social_posts_multiple(names, symbols)
             
-            # 6. Process hourly trading signals (using token IDs)
-            print("\n📊 Processing hourly trading signals...")
-            hourly_trading_signals_success = await self.process_hourly_trading_signals(token_ids, token_symbols_str)
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 7. Process resistance support data (using token IDs)
-            print("\n📊 Processing resistance support data...")
-            resistance_support_success = await self.process_resistance_support_data(token_ids, symbols)
+            async def process_ai_reports_stage() -> bool:
+                try:
+                    return await self.process_ai_reports_multiple(token_ids)
+                finally:
+                    # Posts and AI reports are all the embeddings need; let them start
+                    # while the remaining stages are still running
+                    if embedding_inputs_stored is not None:
+                        embedding_inputs_stored.set()
+            
+            # 2-7. The remaining stages hit independent endpoints, so run them concurrently;
+            # a stage that raises only fails itself, not the stages still in flight
+            stage_names = ("OHLCV data", "AI reports", "Fundamental grade", "Trading signals", "Hourly trading signals", "Resistance support data")
+            results = await asyncio.gather(
+                self.process_ohlcv_data_multiple(token_ids, symbols),
+                process_ai_reports_stage(),
+                self.process_fundamental_grade_multiple(token_ids),
+                self.process_trading_signals(token_ids, symbols_csv),
+                self.process_hourly_trading_signals(token_ids, symbols_csv),
+                self.process_resistance_support_data(token_ids, symbols),
+                return_exceptions=True
+            )
+            for stage_name, result in zip(stage_names, results):
+                if isinstance(result, Exception):
+                    logger.error("❌ %s stage failed: %s", stage_name, result)
+            (
+                ohlcv_success,
+                ai_report_success,
+                fundamental_grade_success,
+                trading_signals_success,
+                hourly_trading_signals_success,
+                resistance_support_success
+            ) = (result is True for result in results)
             
             # Calculate overall success
-            social_success = all(social_results)
             overall_success = social_success and ohlcv_success and ai_report_success and fundamental_grade_success and trading_signals_success and hourly_trading_signals_success and resistance_support_success
             
             if overall_success:
-                print(f"\n✅ Successfully processed all tokens: {', '.join(symbols)}")
+                print(f"\n✅ Successfully processed all tokens: {symbols_label}")
             else:
-                print(f"\n⚠️ Some components failed for tokens: {', '.join(symbols)}")
+                print(f"\n⚠️ Some components failed for tokens: {symbols_label}")
                 print(f"   Social posts: {'✅' if social_success else '❌'}")
                 print(f"   OHLCV data: {'✅' if ohlcv_success else '❌'}")
                 print(f"   AI reports: {'✅' if ai_report_success else '❌'}")
@@ -633,154 +744,131 @@ IMPORTANT RULES:
             return overall_success
             
         except Exception as e:
-            print(f"❌ Error in data collection pipeline: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error in data collection pipeline: %s", e)
             return False
+        finally:
+            # Never leave a waiting embeddings stage blocked, even if collection failed early
+            if embedding_inputs_stored is not None:
+                embedding_inputs_stored.set()
+    
+    async def process_ohlcv_data_multiple(self, token_ids: List[int], symbols: Tuple[str, ...]) -> bool:
+        """Fetch OHLCV data for all tokens in one batched call and store it"""
+        logger.info("\n📈 Processing OHLCV data...")
+        ohlcv_data = await self.token_api.get_ohlcv_data_multiple_by_ids(token_ids)
+        
+        # Store OHLCV data with one upsert per table
+        per_symbol = [(symbol, ohlcv_data.get(token_id, {})) for symbol, token_id in zip(symbols, token_ids)]
+        hourly_success = self.ohlcv_storage.store_hourly_ohlcv_bulk({symbol: data.get('hourly', []) for symbol, data in per_symbol})
+        daily_success = self.ohlcv_storage.store_daily_ohlcv_bulk({symbol: data.get('daily', []) for symbol, data in per_symbol})
+        
+        return hourly_success and daily_success
     
-    async def process_social_posts(self, token_name: str, token_symbol: str) -> bool:
-        """Process social posts for a token using token name"""
+    async def process_ai_reports_multiple(self, token_ids: List[int]) -> bool:
+        """Fetch AI reports for all tokens concurrently in ID chunks and store them in one upsert"""
+        logger.info("\n🤖 Processing AI reports...")
+        return await self.ai_report_api.batch_get_ai_reports(token_ids)
+    
+    async def process_fundamental_grade_multiple(self, token_ids: List[int]) -> bool:
+        """Fetch fundamental grades for all tokens concurrently in ID chunks and store them in one upsert"""
+        logger.info("\n📊 Processing fundamental grade...")
+        return await self.fundamental_grade_api.batch_get_fundamental_grades(token_ids)
+    
+    async def collect_social_posts(self, token_name: str, token_symbol: str) -> Optional[List[Dict]]:
+        """Fetch and filter social posts for a token using token name (None if the fetch failed)"""
         try:
-            print(f"📱 Fetching social posts for {token_name} (symbol: {token_symbol})...")
+            logger.info("📱 Fetching social posts for %s (symbol: %s)...", token_name, token_symbol)
             
             # Fetch social sentiment data using token name instead of symbol
-            posts = await fetch_social_sentiment(token_name)
+            posts = await fetch_social_sentiment(token_name, client=self.social_http)
             if not posts:
-                print(f"ℹ️ No social posts found for {token_name}")
-                return True
+                logger.info("ℹ️ No social posts found for %s", token_name)
+                return []
             
             # Filter posts
             filtered_posts = filter_posts(posts)
             if not filtered_posts:
-                print(f"ℹ️ No filtered posts for {token_name}")
-                return True
-            
-            # Store in Supabase
-            success = store_in_supabase(filtered_posts, token_symbol)
-            
-            if success:
-                print(f"✅ Successfully processed {len(filtered_posts)} social posts for {token_name}")
-            else:
-                print(f"❌ Failed to store social posts for {token_name}")
-            
-            return success
+                logger.info("ℹ️ No filtered posts for %s", token_name)
+            return filtered_posts
             
         except Exception as e:
-            print(f"❌ Error processing social posts for {token_name}: {e}")
-            return False
+            logger.error("❌ Error processing social posts for %s: %s", token_name, e)
+            return None
     
-    async def process_ohlcv_data(self, token_id: int, token_symbol: str) -> bool:
-        """Process OHLCV data for a token using token ID"""
-        try:
-            print(f"📈 Fetching OHLCV data for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch hourly and daily OHLCV data using token ID
-            hourly_data = await self.token_api.get_hourly_ohlcv_by_id(token_id)
-            daily_data = await self.token_api.get_daily_ohlcv_by_id(token_id)
-            
-            # Store data
-            hourly_success = self.ohlcv_storage.store_hourly_ohlcv(token_symbol, hourly_data or [])
-            daily_success = self.ohlcv_storage.store_daily_ohlcv(token_symbol, daily_data or [])
-            
-            if hourly_success and daily_success:
-                print(f"✅ Successfully processed OHLCV data for {token_symbol}")
-                return True
-            else:
-                print(f"❌ Failed to process OHLCV data for {token_symbol}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing OHLCV data for {token_symbol}: {e}")
-            return False
-    
-    async def process_ai_report(self, token_id: int, token_symbol: str) -> bool:
-        """Process AI report for a token using token ID"""
-        try:
-            print(f" Fetching AI report for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch and store AI report data using token ID
-            success = await self.ai_report_api.get_and_store_ai_report_by_id(token_id)
-            
-            if success:
-                print(f"✅ Successfully processed AI report for {token_symbol}")
-                return True
-            else:
-                print(f"❌ Failed to process AI report for {token_symbol}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing AI report for {token_symbol}: {e}")
-            return False
-    
-    async def process_fundamental_grade(self, token_id: int, token_symbol: str) -> bool:
-        """Process fundamental grade for a token using token ID"""
-        try:
-            print(f"📊 Fetching fundamental grade for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch and store fundamental grade data using token ID
-            success = await self.fundamental_grade_api.fetch_and_store_fundamental_grade_by_id(token_id)
-            
-            if success:
-                print(f"✅ Successfully processed fundamental grade for {token_symbol}")
-                return True
+    async def process_social_posts_multiple(self, names: List[str], symbols: Tuple[str, ...]) -> bool:
+        """Fetch social posts for all tokens concurrently, then store them together in bulk"""
+        logger.info("\n📱 Processing social posts...")
+        social_semaphore = asyncio.Semaphore(SOCIAL_POSTS_CONCURRENCY)
+        
+        async def collect_social_posts_limited(name: str, symbol: str) -> Optional[List[Dict]]:
+            async with social_semaphore:
+                return await self.collect_social_posts(name, symbol)
+        
+        results = await asyncio.gather(
+            *(collect_social_posts_limited(name, symbol) for name, symbol in zip(names, symbols))
+        )
+        success = all(posts is not None for posts in results)
+        
+        all_posts = [post for posts in results if posts for post in posts]
+        if all_posts:
+            stored = store_in_supabase_bulk(all_posts)
+            if stored:
+                logger.info("✅ Successfully processed %s social posts for %s tokens", len(all_posts), len(names))
             else:
-                print(f"❌ Failed to process fundamental grade for {token_symbol}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing fundamental grade for {token_symbol}: {e}")
-            return False
+                logger.error("❌ Failed to store social posts")
+            success = success and stored
+        
+        return success
     
     async def process_trading_signals(self, token_ids: List[int], token_symbols: str) -> bool:
         """Process trading signals for multiple tokens using token IDs"""
         try:
-            print(f"📊 Fetching trading signals for {token_symbols} (IDs: {token_ids})...")
+            logger.info("📊 Fetching trading signals for %s (IDs: %s)...", token_symbols, token_ids)
             
             # Fetch trading signals using token IDs
             signals = await self.trading_signals_api.get_trading_signals_by_ids(token_ids)
             
             if not signals:
-                print(f"ℹ️ No trading signals found for {token_symbols}")
+                logger.info("ℹ️ No trading signals found for %s", token_symbols)
                 return True
             
             # Store trading signals
             success = self.trading_signals_storage.store_trading_signals(signals)
             
             if success:
-                print(f"✅ Successfully processed trading signals for {token_symbols}")
+                logger.info("✅ Successfully processed trading signals for %s", token_symbols)
                 return True
             else:
-                print(f"❌ Failed to store trading signals for {token_symbols}")
+                logger.error("❌ Failed to store trading signals for %s", token_symbols)
                 return False
                 
         except Exception as e:
-            print(f"❌ Error processing trading signals for {token_symbols}: {e}")
+            logger.error("❌ Error processing trading signals for %s: %s", token_symbols, e)
             return False
     
     async def process_hourly_trading_signals(self, token_ids: List[int], token_symbols: str) -> bool:
         """Process hourly trading signals for multiple tokens using token IDs"""
         try:
-            print(f"📊 Fetching hourly trading signals for {token_symbols} (IDs: {token_ids})...")
+            logger.info("📊 Fetching hourly trading signals for %s (IDs: %s)...", token_symbols, token_ids)
             
             # Fetch hourly trading signals using token IDs
             signals = await self.hourly_trading_signals_api.get_hourly_trading_signals(token_ids=token_ids)
             
             if not signals:
-                print(f"ℹ️ No hourly trading signals found for {token_symbols}")
+                logger.info("ℹ️ No hourly trading signals found for %s", token_symbols)
                 return True
             
             # Store hourly trading signals
             success = self.hourly_trading_signals_storage.store_hourly_trading_signals(signals)
             
             if success:
-                print(f"✅ Successfully processed hourly trading signals for {token_symbols}")
+                logger.info("✅ Successfully processed hourly trading signals for %s", token_symbols)
                 return True
             else:
-                print(f"❌ Failed to store hourly trading signals for {token_symbols}")
+                logger.error("❌ Failed to store hourly trading signals for %s", token_symbols)
                 return False
                 
         except Exception as e:
-            print(f"❌ Error processing hourly trading signals for {token_symbols}: {e}")
+            logger.error("❌ Error processing hourly trading signals for %s: %s", token_symbols, e)
             return False
     
     async def run_embeddings_pipeline(self) -> bool:
@@ -790,44 +878,18 @@ IMPORTANT RULES:
             print("🔍 Starting Embeddings Pipeline")
             print(f"{'='*50}")
             
-            # Get tokens from posts table
-            posts_response = self.supabase.table('posts').select('token_name').execute()
-            post_tokens = set()
-            if posts_response.data:
-                for post in posts_response.data:
-                    if post.get('token_name'):
-                        # 🆕 FIX: URL decode token names from database
-                        raw_token_name = post['token_name']
-                        decoded_token_name = urllib.parse.unquote(raw_token_name)
-                        if decoded_token_name != raw_token_name:
-                            print(f"🔄 Decoded post token name: {raw_token_name} → {decoded_token_name}")
-                        post_tokens.add(decoded_token_name)
-            
-            # Get tokens from ai_reports table
-            reports_response = self.supabase.table('ai_reports').select('token_name').execute()
-            report_tokens = set()
-            if reports_response.data:
-                for report in reports_response.data:
-                    if report.get('token_name'):
-                        # 🆕 FIX: URL decode token names from database
-                        raw_token_name = report['token_name']
-                        decoded_token_name = urllib.parse.unquote(raw_token_name)
-                        if decoded_token_name != raw_token_name:
-                            print(f"🔄 Decoded report token name: {raw_token_name} → {decoded_token_name}")
-                        report_tokens.add(decoded_token_name)
-            
-            # Combine all tokens
-            all_tokens = list(post_tokens.union(report_tokens))
-            
-            if not all_tokens:
-                print("❌ No tokens found in your data!")
-                print("Please run your data collection scripts first to populate posts and ai_reports tables.")
-                return False
+            # Only tokens with posts or ai_reports added since their last embedding run, already URL-decoded
+            token_names = self.embedding_pipeline.get_tokens_with_new_data()
             
-            print(f"✅ Found tokens: {', '.join(all_tokens)}")
+            if not token_names:
+                if not self.embedding_pipeline.get_embedding_token_names():
+                    print("❌ No tokens found in your data!")
+                    print("Please run your data collection scripts first to populate posts and ai_reports tables.")
+                    return False
+                print("ℹ️ No new posts or AI reports since the last embedding run, skipping embeddings")
+                return True
             
-            # Use all available tokens (now decoded)
-            token_names = all_tokens
+            print(f"✅ Found tokens with new data: {', '.join(token_names)}")
             
             print(f" Processing TODAY'S embeddings for tokens: {', '.join(token_names)}")
             
@@ -845,11 +907,14 @@ IMPORTANT RULES:
             return success
             
         except Exception as e:
-            print(f"❌ Error in embeddings pipeline: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error in embeddings pipeline: %s", e)
             return False
     
+    async def run_embeddings_pipeline_when_ready(self, embedding_inputs_stored: asyncio.Event) -> bool:
+        """Run the embeddings pipeline as soon as data collection has stored posts and AI reports"""
+        await embedding_inputs_stored.wait()
+        return await self.run_embeddings_pipeline()
+    
     def store_new_positions(self, llm_recommendations: Dict) -> bool:
         """
         Store new positions from LLM recommendations in Supabase
@@ -872,109 +937,143 @@ IMPORTANT RULES:
             
             print(f"💾 Storing {len(positions)} new positions in Supabase...")
             
-            # Prepare data for storage
-            positions_to_store = []
-            for position in positions:
-                position_data = {
-                    'symbol': position.get('symbol', '').upper(),
-                    'entry_price': float(position.get('entry', 0)),
-                    'size_usd': float(position.get('size_usd', 0)),
-                    'stop_loss': float(position.get('stop_loss', 0)),
-                    'target_1': float(position.get('target_1', 0)),
-                    'target_2': float(position.get('target_2', 0)),
-                    'days': int(position.get('days', 30)),
-                    'rationale': position.get('rationale', ''),
-                    'status': 'active'
-                }
-                
-                # Validate required fields
-                if not position_data['symbol']:
-                    print(f"⚠️ Missing symbol for position: {position}")
-                    continue
-                
-                if position_data['entry_price'] <= 0:
-                    print(f"⚠️ Invalid entry price for {position_data['symbol']}: {position_data['entry_price']}")
-                    continue
-                
-                if position_data['days'] <= 0:
-                    print(f"⚠️ Invalid days estimate for {position_data['symbol']}: {position_data['days']}")
-                    position_data['days'] = 30  # Set default to 30 days
-                
-                positions_to_store.append(position_data)
+            # Prepare data for storage as parallel columns (prices as one n x 5 matrix), then
+            # validate every row at once with boolean masks
+            symbols = np.array([str(position.get('symbol') or '').upper() for position in positions], dtype=object)
+            # Missing or non-numeric prices become NaN so only that row is masked out below
+            price_matrix = np.array(
+                [[to_float_or_nan(position.get(key)) for key, _ in POSITION_PRICE_FIELDS] for position in positions],
+                dtype=np.float64
+            ).reshape(len(positions), len(POSITION_PRICE_FIELDS))
+            days = np.array([to_float_or_nan(position.get('days', 30)) for position in positions], dtype=np.float64)
+            
+            has_symbol = symbols != ''
+            valid_entry = price_matrix[:, 0] > 0
+            # NaN/inf survive float() but are not valid JSON and would fail the whole batch
+            finite_prices = np.isfinite(price_matrix).all(axis=1)
+            for i in np.flatnonzero(~has_symbol):
+                print(f"⚠️ Missing symbol for position: {positions[i]}")
+            for i in np.flatnonzero(has_symbol & ~(valid_entry & finite_prices)):
+                print(f"⚠️ Invalid prices for {symbols[i]}: {price_matrix[i].tolist()}")
+            
+            keep = np.flatnonzero(has_symbol & valid_entry & finite_prices)
+            # NaN (None, float strings that don't parse) and non-positive estimates fall back to 30 days
+            valid_days = np.isfinite(days) & (days > 0)
+            for i in keep[~valid_days[keep]]:
+                print(f"⚠️ Invalid days estimate for {symbols[i]}: {positions[i].get('days')}")
+            days = np.rint(np.where(valid_days, days, 30)).astype(np.int64)  # Default to 30 days
+            
+            columns = {
+                'symbol': symbols[keep].tolist(),
+                **{column: values.tolist() for (_, column), values in zip(POSITION_PRICE_FIELDS, price_matrix[keep].T)},
+                'days': days[keep].tolist(),
+                'rationale': [positions[i].get('rationale', '') for i in keep],
+            }
+            created_date = datetime.now(timezone.utc).date().isoformat()
+            
+            # Key rows by the new_positions conflict target; an upsert can't touch the same row twice
+            positions_to_store = list({
+                (record['symbol'], record['entry_price']): record
+                for record in (
+                    {**dict(zip(columns, row)), 'status': 'active', 'created_date': created_date}
+                    for row in zip(*columns.values())
+                )
+            }.values())
             
             if not positions_to_store:
                 print("❌ No valid positions to store")
                 return False
             
-            # Store positions in Supabase
-            success_count = 0
-            for position_data in positions_to_store:
-                try:
-                    # Insert new position
-                    response = self.supabase.table('new_positions').insert(position_data).execute()
-                    
-                    if response.data:
-                        print(f"✅ Stored position for {position_data['symbol']}")
-                        print(f"   - Entry: ${position_data['entry_price']:.8f}")
-                        print(f"   - Size: ${position_data['size_usd']:.2f}")
-                        print(f"   - Stop Loss: ${position_data['stop_loss']:.8f}")
-                        print(f"   - Target 1: ${position_data['target_1']:.8f}")
-                        print(f"   - Target 2: ${position_data['target_2']:.8f}")
-                        print(f"   - Estimated Days: {position_data['days']} days")
-                        success_count += 1
-                    else:
-                        print(f"❌ Failed to store position for {position_data['symbol']}")
-                        
-                except Exception as e:
-                    print(f"❌ Error storing position for {position_data['symbol']}: {e}")
-            
-            print(f"✅ Successfully stored {success_count} out of {len(positions_to_store)} positions")
+            # Store all positions in Supabase with one insert that skips rows already on the
+            # conflict key, so re-running the same day's recommendations neither duplicates
+            # them nor overwrites the status/size that manage_portfolio.py has since updated;
+            # if the batch is rejected, retry row by row so one bad position doesn't drop the others
+            already_stored = 0
+            try:
+                response = self.supabase.table('new_positions').upsert(
+                    positions_to_store, on_conflict=NEW_POSITIONS_CONFLICT_COLUMNS, ignore_duplicates=True
+                ).execute()
+                stored_positions = response.data or []
+                already_stored = len(positions_to_store) - len(stored_positions)
+            except Exception as e:
+                print(f"⚠️ Bulk insert of positions failed ({e}), retrying one by one...")
+                stored_positions = []
+                for position_data in positions_to_store:
+                    try:
+                        response = self.supabase.table('new_positions').upsert(
+                            position_data, on_conflict=NEW_POSITIONS_CONFLICT_COLUMNS, ignore_duplicates=True
+                        ).execute()
+                        if response.data:
+                            stored_positions.extend(response.data)
+                        else:
+                            already_stored += 1
+                    except Exception as e:
+                        print(f"❌ Error storing position for {position_data['symbol']}: {e}")
+            
+            for position_data in stored_positions:
+                print(f"✅ Stored position for {position_data['symbol']}")
+                print(f"   - Entry: ${float(position_data['entry_price']):.8f}")
+                print(f"   - Size: ${float(position_data['size_usd']):.2f}")
+                print(f"   - Stop Loss: ${float(position_data['stop_loss']):.8f}")
+                print(f"   - Target 1: ${float(position_data['target_1']):.8f}")
+                print(f"   - Target 2: ${float(position_data['target_2']):.8f}")
+                print(f"   - Estimated Days: {position_data['days']} days")
+            if already_stored:
+                print(f"ℹ️ {already_stored} positions were already stored today and were left unchanged")
+            success_count = len(stored_positions) + already_stored
+            
+            print(f"✅ Successfully stored {len(stored_positions)} out of {len(positions_to_store)} positions")
             return success_count > 0
             
         except Exception as e:
-            print(f"❌ Error storing new positions: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error storing new positions: %s", e)
             return False
     
-    async def get_stored_positions(self, symbol: str = None, status: str = 'active') -> List[Dict]:
+    async def get_stored_positions(self, symbol: str = None, status: str = 'active',
+                                   limit: int = STORED_POSITIONS_PAGE_SIZE, offset: int = 0,
+                                   columns: str = '*') -> List[Dict]:
         """
-        Retrieve stored positions from Supabase
+        Retrieve one page of stored positions from Supabase, newest first
         
         Args:
             symbol (str, optional): Filter by specific symbol
             status (str): Filter by status (active, closed, cancelled)
+            limit (int): Maximum number of positions to return
+            offset (int): Number of positions to skip (for paging)
+            columns (str): Comma-separated columns to select
             
         Returns:
             List[Dict]: List of stored positions
         """
         try:
-            print(f"🔍 Retrieving stored positions (status: {status})...")
-            
-            query = self.supabase.table('new_positions').select('*').eq('status', status)
+            query = self.supabase.table('new_positions').select(columns).eq('status', status)
             
             if symbol:
                 query = query.eq('symbol', symbol.upper())
-                print(f"   Filtering by symbol: {symbol}")
             
-            response = query.order('created_at', desc=True).execute()
+            response = query.order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+            positions = response.data or []
             
-            if response.data:
-                positions = response.data
-                print(f"✅ Found {len(positions)} stored positions")
-                
-                for position in positions:
-                    print(f"   - {position['symbol']}: Entry ${position['entry_price']:.8f}, Size ${position['size_usd']:.2f}")
-                
-                return positions
-            else:
-                print(f"ℹ️ No stored positions found with status: {status}")
-                return []
+            logger.info(
+                "🔍 Found %d stored positions (status: %s%s, offset: %d, limit: %d)",
+                len(positions), status, f", symbol: {symbol.upper()}" if symbol else "", offset, limit
+            )
+            return positions
                 
         except Exception as e:
             print(f"❌ Error retrieving stored positions: {e}")
             return []
     
+    async def count_stored_positions(self, status: str = 'active') -> int:
+        """Count stored positions with the given status without fetching them"""
+        try:
+            # count='exact' returns the total matching rows; only a single id is transferred
+            response = self.supabase.table('new_positions').select('id', count='exact').eq('status', status).limit(1).execute()
+            return response.count or 0
+        except Exception as e:
+            print(f"❌ Error counting stored positions: {e}")
+            return 0
+    
     def update_position_status(self, position_id: int, new_status: str) -> bool:
         """
         Update the status of a stored position
@@ -1057,9 +1156,9 @@ IMPORTANT RULES:
             # Step 7: Show stored positions
             print(f"\n💾 STORED POSITIONS IN SUPABASE:")
             print("=" * 60)
-            stored_positions = await self.get_stored_positions()
-            if stored_positions:
-                print(f"✅ Found {len(stored_positions)} active positions")
+            active_count = await self.count_stored_positions()
+            if active_count:
+                print(f"✅ Found {active_count} active positions")
             else:
                 print("ℹ️ No active positions found")
             
@@ -1067,9 +1166,7 @@ IMPORTANT RULES:
             return True
             
         except Exception as e:
-            print(f"❌ Error in retriever analysis: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error in retriever analysis: %s", e)
             return False
     
     async def run_complete_workflow(self):
@@ -1087,20 +1184,20 @@ IMPORTANT RULES:
             print("7. 💾 Store everything in Supabase")
             print("=" * 60)
             
-            # Step 1: Data Collection Pipeline
-            print("\n🔄 STEP 1: Data Collection Pipeline")
+            # Steps 1-2: Data Collection and Embeddings Pipelines. Embeddings only read posts and
+            # AI reports, so they start as soon as those are stored instead of after every stage
+            print("\n🔄 STEP 1-2: Data Collection and Embeddings Pipelines")
             print("-" * 40)
-            data_collection_success = await self.run_data_collection_pipeline()
+            embedding_inputs_stored = asyncio.Event()
+            data_collection_success, embeddings_success = await asyncio.gather(
+                self.run_data_collection_pipeline(embedding_inputs_stored),
+                self.run_embeddings_pipeline_when_ready(embedding_inputs_stored)
+            )
             
             if not data_collection_success:
                 print("❌ Data collection pipeline failed. Stopping workflow.")
                 return False
             
-            # Step 2: Embeddings Pipeline
-            print("\n STEP 2: Embeddings Pipeline")
-            print("-" * 40)
-            embeddings_success = await self.run_embeddings_pipeline()
-            
             if not embeddings_success:
                 print("⚠️ Embeddings pipeline failed. Continuing with retriever analysis...")
             
@@ -1130,20 +1227,27 @@ IMPORTANT RULES:
             return data_collection_success and embeddings_success and retriever_success
             
         except Exception as e:
-            print(f"❌ Workflow failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Workflow failed: %s", e)
             return False
 
 async def main():
     """Main function"""
+    workflow = None
     try:
         workflow = CompleteCryptoWorkflow()
         await workflow.run_complete_workflow()
     except Exception as e:
-        print(f"❌ Failed to start workflow: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to start workflow: %s", e)
+    finally:
+        if workflow is not None:
+            await workflow.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    log_listener = configure_logging()
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    finally:
+        log_listener.stop()
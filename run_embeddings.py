@@ -5,6 +5,7 @@ This script runs the embedding pipeline to create embeddings for TODAY'S social
 """
 
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +14,8 @@ from apis.embedding_pipeline import EmbeddingPipeline
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 async def main():
     """Main function to run the embedding pipeline"""
     try:
@@ -28,24 +31,8 @@ async def main():
         # Get actual tokens from your data instead of hardcoded ones
         print(" Checking available tokens in your data...")
         
-        # Get tokens from posts table
-        posts_response = pipeline.supabase.table('posts').select('token_name').execute()
-        post_tokens = set()
-        if posts_response.data:
-            for post in posts_response.data:
-                if post.get('token_name'):
-                    post_tokens.add(post['token_name'])
-        
-        # Get tokens from ai_reports table
-        reports_response = pipeline.supabase.table('ai_reports').select('token_name').execute()
-        report_tokens = set()
-        if reports_response.data:
-            for report in reports_response.data:
-                if report.get('token_name'):
-                    report_tokens.add(report['token_name'])
-        
-        # Combine all tokens
-        all_tokens = list(post_tokens.union(report_tokens))
+        # Distinct token names across posts and ai_reports, already URL-decoded
+        all_tokens = pipeline.get_embedding_token_names()
         
         if not all_tokens:
             print("❌ No tokens found in your data!")
@@ -71,9 +58,8 @@ async def main():
             print("Check the logs above for details.")
             
     except Exception as e:
-        print(f"❌ Failed to run embedding pipeline: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to run embedding pipeline: %s", e)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     asyncio.run(main())
@@ -1,13 +1,29 @@
 
 
 import asyncio
+import dataclasses
+import functools
+import logging
 import os
-from typing import List, Dict
+import httpx
+from types import MappingProxyType
+from typing import Any, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:
+    AsyncLimiter = None
+
+# libuv-based event loop (not available on Windows); falls back to the default asyncio loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Import our modules
-from apis.token_metrics import TokenMetricsAPI
-from apis.social_sentiment import fetch_social_sentiment, filter_posts, store_in_supabase
+from apis.token_metrics import TokenMetricsAPI, create_paid_client
+from apis.social_sentiment import fetch_social_sentiment, filter_posts, store_in_supabase_bulk
 from apis.ohlcv_storage import OHLCVStorage
 from apis.trading_signals import TradingSignalsAPI
 from apis.trading_signals_storage import TradingSignalsStorage
@@ -16,14 +32,14 @@ from apis.fundamental_grade import FundamentalGradeAPI
 from apis.hourly_trading_signals import HourlyTradingSignalsAPI
 from apis.hourly_trading_signals_storage import HourlyTradingSignalsStorage
 from apis.token_data import TokenDataAPI
+from apis.supabase_client import get_supabase_client
+from logging_setup import configure_logging
 
 # Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
 except ImportError:
-    print("Supabase client not found. Installing...")
-    os.system("pip install supabase")
-    from supabase import create_client, Client
+    raise ImportError("Supabase client not found. Install it with: pip install supabase") from None
 
 load_dotenv()
 
@@ -32,430 +48,384 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 USER_ID = os.getenv('USER_ID')
 
+logger = logging.getLogger(__name__)
+
+# Maximum outbound API calls in flight at once
+HTTP_CONCURRENCY = 8
+
+# Maximum social sentiment requests in flight at once
+SOCIAL_POSTS_CONCURRENCY = 10
+
+# Token Metrics request budget shared by all API helpers (requests per period in seconds)
+TOKEN_METRICS_MAX_RATE = 60
+TOKEN_METRICS_RATE_PERIOD = 60
+
+# Dummy BTC/ETH/ADA token data, built once at import time; entries are read-only views
+DUMMY_TOKENS = (
+    MappingProxyType({
+        'TOKEN_ID': 3375,
+        'TOKEN_NAME': 'Bitcoin',
+        'TOKEN_SYMBOL': 'BTC',
+        'CURRENT_PRICE': 45000.00,
+        'MARKET_CAP': 850000000000,
+        'TOTAL_VOLUME': 25000000000,
+        'CIRCULATING_SUPPLY': 19500000,
+        'TOTAL_SUPPLY': 21000000,
+        'MAX_SUPPLY': 21000000,
+        'FULLY_DILUTED_VALUATION': 945000000000,
+        'HIGH_24H': 46000.00,
+        'LOW_24H': 44000.00,
+        'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 2.5
+    }),
+    MappingProxyType({
+        'TOKEN_ID': 3306,
+        'TOKEN_NAME': 'Ethereum',
+        'TOKEN_SYMBOL': 'ETH',
+        'CURRENT_PRICE': 3200.00,
+        'MARKET_CAP': 380000000000,
+        'TOTAL_VOLUME': 15000000000,
+        'CIRCULATING_SUPPLY': 120000000,
+        'TOTAL_SUPPLY': 120000000,
+        'MAX_SUPPLY': None,
+        'FULLY_DILUTED_VALUATION': 384000000000,
+        'HIGH_24H': 3300.00,
+        'LOW_24H': 3100.00,
+        'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 1.8
+    }),
+    MappingProxyType({
+        'TOKEN_ID': 3315,
+        'TOKEN_NAME': 'Cardano',
+        'TOKEN_SYMBOL': 'ADA',
+        'CURRENT_PRICE': 0.85,
+        'MARKET_CAP': 30000000000,
+        'TOTAL_VOLUME': 800000000,
+        'CIRCULATING_SUPPLY': 35000000000,
+        'TOTAL_SUPPLY': 45000000000,
+        'MAX_SUPPLY': 45000000000,
+        'FULLY_DILUTED_VALUATION': 38250000000,
+        'HIGH_24H': 0.88,
+        'LOW_24H': 0.82,
+        'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 3.2
+    })
+)
+DUMMY_SYMBOLS = tuple(token['TOKEN_SYMBOL'] for token in DUMMY_TOKENS)
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class TokenRef:
+    """The identifying fields of a token record, read from its dict once"""
+    token_id: Optional[int]
+    name: str
+    symbol: str
+    
+    @classmethod
+    def from_dict(cls, token: Dict[str, Any]) -> 'TokenRef':
+        """Extract the ID, name and uppercased symbol from a TOKEN_* keyed token dict"""
+        return cls(
+            token_id=token.get('TOKEN_ID'),
+            name=token.get('TOKEN_NAME', 'N/A'),
+            symbol=token.get('TOKEN_SYMBOL', '').upper()
+        )
+
+def async_safe(label: str):
+    """Log an exception raised by a pipeline stage and report the stage as failed (False)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                logger.exception("❌ Error processing %s: %s", label, e)
+                return False
+        return wrapper
+    return decorator
+
 class CryptoPipeline:
     def __init__(self):
         if not SUPABASE_URL or not SUPABASE_KEY or not USER_ID:
             raise ValueError("Missing required environment variables: SUPABASE_URL, SUPABASE_KEY, USER_ID")
         
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        self.token_api = TokenMetricsAPI()
+        self.supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+        
+        # One pooled paid client for every Token Metrics helper, so requests to the
+        # same host reuse connections instead of repeating the TCP/TLS handshake
+        self.http = create_paid_client(limits=httpx.Limits(max_connections=50, max_keepalive_connections=50))
+        # Token-bucket limiter for the same host; the helpers only back off when it answers 429/5xx
+        self.tm_limiter = AsyncLimiter(TOKEN_METRICS_MAX_RATE, TOKEN_METRICS_RATE_PERIOD) if AsyncLimiter is not None else None
+        
+        self.token_api = TokenMetricsAPI(client=self.http, limiter=self.tm_limiter)
         self.ohlcv_storage = OHLCVStorage()
-        self.trading_signals_api = TradingSignalsAPI()
+        self.trading_signals_api = TradingSignalsAPI(client=self.http, limiter=self.tm_limiter)
         self.trading_signals_storage = TradingSignalsStorage()
-        self.hourly_trading_signals_api = HourlyTradingSignalsAPI()
+        self.hourly_trading_signals_api = HourlyTradingSignalsAPI(client=self.http, limiter=self.tm_limiter)
         self.hourly_trading_signals_storage = HourlyTradingSignalsStorage()
-        self.ai_report_api = AIReportAPI()
-        self.fundamental_grade_api = FundamentalGradeAPI()
-        self.token_data_api = TokenDataAPI()
+        self.ai_report_api = AIReportAPI(client=self.http, limiter=self.tm_limiter)
+        self.fundamental_grade_api = FundamentalGradeAPI(client=self.http, limiter=self.tm_limiter)
+        self.token_data_api = TokenDataAPI(client=self.http, limiter=self.tm_limiter)
+        self.http_semaphore = asyncio.Semaphore(HTTP_CONCURRENCY)
+        # One pooled client for the LunarCrush requests, shared by every token
+        self.social_http = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=SOCIAL_POSTS_CONCURRENCY, max_keepalive_connections=SOCIAL_POSTS_CONCURRENCY)
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP clients"""
+        await self.http.aclose()
+        await self.social_http.aclose()
+    
+    async def __aenter__(self) -> "CryptoPipeline":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def _bounded(self, coro):
+        """Await a coroutine while holding one of the outbound HTTP slots"""
+        async with self.http_semaphore:
+            return await coro
     
     def get_dummy_tokens(self) -> List[Dict]:
         """Get dummy data for BTC, ETH, ADA"""
-        return [
-            {
-                'TOKEN_ID': 3375,
-                'TOKEN_NAME': 'Bitcoin',
-                'TOKEN_SYMBOL': 'BTC',
-                'CURRENT_PRICE': 45000.00,
-                'MARKET_CAP': 850000000000,
-                'TOTAL_VOLUME': 25000000000,
-                'CIRCULATING_SUPPLY': 19500000,
-                'TOTAL_SUPPLY': 21000000,
-                'MAX_SUPPLY': 21000000,
-                'FULLY_DILUTED_VALUATION': 945000000000,
-                'HIGH_24H': 46000.00,
-                'LOW_24H': 44000.00,
-                'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 2.5
-            },
-            {
-                'TOKEN_ID': 3306,
-                'TOKEN_NAME': 'Ethereum',
-                'TOKEN_SYMBOL': 'ETH',
-                'CURRENT_PRICE': 3200.00,
-                'MARKET_CAP': 380000000000,
-                'TOTAL_VOLUME': 15000000000,
-                'CIRCULATING_SUPPLY': 120000000,
-                'TOTAL_SUPPLY': 120000000,
-                'MAX_SUPPLY': None,
-                'FULLY_DILUTED_VALUATION': 384000000000,
-                'HIGH_24H': 3300.00,
-                'LOW_24H': 3100.00,
-                'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 1.8
-            },
-            {
-                'TOKEN_ID': 3315,
-                'TOKEN_NAME': 'Cardano',
-                'TOKEN_SYMBOL': 'ADA',
-                'CURRENT_PRICE': 0.85,
-                'MARKET_CAP': 30000000000,
-                'TOTAL_VOLUME': 800000000,
-                'CIRCULATING_SUPPLY': 35000000000,
-                'TOTAL_SUPPLY': 45000000000,
-                'MAX_SUPPLY': 45000000000,
-                'FULLY_DILUTED_VALUATION': 38250000000,
-                'HIGH_24H': 0.88,
-                'LOW_24H': 0.82,
-                'PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY': 3.2
-            }
-        ]
+        return [dict(token) for token in DUMMY_TOKENS]
     
-    def store_token_data(self, token: Dict) -> bool:
-        """Store token metadata in Supabase"""
+    def store_token_data(self, tokens: List[Dict]) -> bool:
+        """Store token metadata for all tokens in Supabase with one upsert"""
         try:
-            # Convert the dummy token data to the format expected by TokenDataAPI
-            token_data = [token]
+            # Store using the TokenDataAPI, which upserts the whole list in a single request
+            success = self.token_data_api.store_token_data(tokens)
             
-            # Store using the TokenDataAPI
-            success = self.token_data_api.store_token_data(token_data)
-            
-            if success:
-                print(f"📊 Token: {token.get('TOKEN_SYMBOL')} - {token.get('TOKEN_NAME')}")
-                print(f"   Price: ${token.get('CURRENT_PRICE'):,.2f}")
-                print(f"   Market Cap: ${token.get('MARKET_CAP'):,.0f}")
-                print(f"   24h Change: {token.get('PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY')}%")
-                print(f"   ✅ Successfully stored in Supabase")
-            else:
-                print(f"❌ Failed to store token data for {token.get('TOKEN_SYMBOL')}")
+            for token in tokens:
+                if success:
+                    logger.info("📊 Token: %s - %s", token.get('TOKEN_SYMBOL'), token.get('TOKEN_NAME'))
+                    logger.info("   Price: $%s", format(token.get('CURRENT_PRICE'), ',.2f'))
+                    logger.info("   Market Cap: $%s", format(token.get('MARKET_CAP'), ',.0f'))
+                    logger.info("   24h Change: %s%%", token.get('PRICE_CHANGE_PERCENTAGE_24H_IN_CURRENCY'))
+                    logger.info("   ✅ Successfully stored in Supabase")
+                else:
+                    logger.error("❌ Failed to store token data for %s", token.get('TOKEN_SYMBOL'))
             
             return success
         except Exception as e:
-            print(f"❌ Error storing token data: {e}")
+            logger.exception("❌ Error storing token data: %s", e)
             return False
     
-    async def process_social_posts(self, token_name: str, token_symbol: str) -> bool:
-        """Process social posts for a token using token name"""
+    async def collect_social_posts(self, token_name: str, token_symbol: str) -> Optional[List[Dict]]:
+        """Fetch and filter social posts for a token using token name (None if the fetch failed)"""
         try:
-            print(f"📱 Fetching social posts for {token_name} (symbol: {token_symbol})...")
+            logger.info("📱 Fetching social posts for %s (symbol: %s)...", token_name, token_symbol)
             
             # Fetch social sentiment data using token name instead of symbol
-            posts = await fetch_social_sentiment(token_name)
+            posts = await fetch_social_sentiment(token_name, client=self.social_http)
             if not posts:
-                print(f"ℹ️ No social posts found for {token_name}")
-                return True
+                logger.info("ℹ️ No social posts found for %s", token_name)
+                return []
             
             # Filter posts
             filtered_posts = filter_posts(posts)
             if not filtered_posts:
-                print(f"ℹ️ No filtered posts for {token_name}")
-                return True
-            
-            # Store in Supabase
-            success = store_in_supabase(filtered_posts, token_symbol)
-            
-            if success:
-                print(f"✅ Successfully processed {len(filtered_posts)} social posts for {token_name}")
-            else:
-                print(f"❌ Failed to store social posts for {token_name}")
-            
-            return success
-            
-        except Exception as e:
-            print(f"❌ Error processing social posts for {token_name}: {e}")
-            return False
-    
-    async def process_ohlcv_data(self, token_id: int, token_symbol: str) -> bool:
-        """Process OHLCV data for a token using token ID"""
-        try:
-            print(f"📈 Fetching OHLCV data for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch hourly and daily OHLCV data using token ID
-            hourly_data = await self.token_api.get_hourly_ohlcv_by_id(token_id)
-            daily_data = await self.token_api.get_daily_ohlcv_by_id(token_id)
+                logger.info("ℹ️ No filtered posts for %s", token_name)
+            return filtered_posts
             
-            # Store data - FIXED: Added token_symbol parameter
-            hourly_success = self.ohlcv_storage.store_hourly_ohlcv(token_symbol, hourly_data or [])
-            daily_success = self.ohlcv_storage.store_daily_ohlcv(token_symbol, daily_data or [])
-            
-            if hourly_success and daily_success:
-                print(f"✅ Successfully processed OHLCV data for {token_symbol}")
-                return True
-            else:
-                print(f"❌ Failed to process OHLCV data for {token_symbol}")
-                return False
-                
         except Exception as e:
-            print(f"❌ Error processing OHLCV data for {token_symbol}: {e}")
-            return False
+            logger.error("❌ Error processing social posts for %s: %s", token_name, e)
+            return None
     
-    async def process_ai_report(self, token_id: int, token_symbol: str) -> bool:
-        """Process AI report for a token using token ID"""
-        try:
-            print(f"📊 Fetching AI report for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch and store AI report data using token ID
-            success = await self.ai_report_api.get_and_store_ai_report_by_id(token_id)
-            
-            if success:
-                print(f"✅ Successfully processed AI report for {token_symbol}")
-                return True
+    async def process_social_posts_multiple(self, names: List[str], symbols: Tuple[str, ...]) -> bool:
+        """Fetch social posts for all tokens concurrently, then store them together in bulk"""
+        logger.info("\n📱 Processing social posts...")
+        social_semaphore = asyncio.Semaphore(SOCIAL_POSTS_CONCURRENCY)
+        
+        async def collect_social_posts_limited(name: str, symbol: str) -> Optional[List[Dict]]:
+            async with social_semaphore:
+                return await self.collect_social_posts(name, symbol)
+        
+        results = await asyncio.gather(
+            *(collect_social_posts_limited(name, symbol) for name, symbol in zip(names, symbols))
+        )
+        success = all(posts is not None for posts in results)
+        
+        all_posts = [post for posts in results if posts for post in posts]
+        if all_posts:
+            stored = store_in_supabase_bulk(all_posts)
+            if stored:
+                logger.info("✅ Successfully processed %s social posts for %s tokens", len(all_posts), len(names))
             else:
-                print(f"❌ Failed to process AI report for {token_symbol}")
-                print(f"   This could be due to:")
-                print(f"   - API authentication issues")
-                print(f"   - Network connectivity problems")
-                print(f"   - API rate limiting")
-                print(f"   - Invalid token ID")
-                print(f"   - Missing environment variables")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing AI report for {token_symbol}: {e}")
-            import traceback
-            print("Full error details:")
-            traceback.print_exc()
-            return False
+                logger.error("❌ Failed to store social posts")
+            success = success and stored
+        
+        return success
     
-    async def process_fundamental_grade(self, token_id: int, token_symbol: str) -> bool:
-        """Process fundamental grade for a token using token ID"""
-        try:
-            print(f"📊 Fetching fundamental grade for {token_symbol} (ID: {token_id})...")
-            
-            # Fetch and store fundamental grade data using token ID
-            success = await self.fundamental_grade_api.fetch_and_store_fundamental_grade_by_id(token_id)
-            
-            if success:
-                print(f"✅ Successfully processed fundamental grade for {token_symbol}")
-                return True
-            else:
-                print(f"❌ Failed to process fundamental grade for {token_symbol}")
-                print(f"   This could be due to:")
-                print(f"   - API authentication issues")
-                print(f"   - Network connectivity problems")
-                print(f"   - API rate limiting")
-                print(f"   - Invalid token ID")
-                print(f"   - Missing environment variables")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing fundamental grade for {token_symbol}: {e}")
-            import traceback
-            print("Full error details:")
-            traceback.print_exc()
+    async def _fetch_and_store_signals(self, label: str, token_ids: List[int], token_symbols: str, fetch, store) -> bool:
+        """Fetch signals for several tokens in one call and store them, logging the outcome"""
+        logger.info("📊 Fetching %s for %s (IDs: %s)...", label, token_symbols, token_ids)
+        
+        # Fetch signals using token IDs
+        signals = await fetch(token_ids)
+        
+        if not signals:
+            logger.info("ℹ️ No %s found for %s", label, token_symbols)
+            return True
+        
+        # Store signals
+        success = store(signals)
+        
+        if success:
+            logger.info("✅ Successfully processed %s for %s", label, token_symbols)
+            return True
+        else:
+            logger.error("❌ Failed to store %s for %s", label, token_symbols)
             return False
     
+    @async_safe("trading signals")
     async def process_trading_signals(self, token_ids: List[int], token_symbols: str) -> bool:
         """Process trading signals for multiple tokens using token IDs"""
-        try:
-            print(f"📊 Fetching trading signals for {token_symbols} (IDs: {token_ids})...")
-            
-            # Fetch trading signals using token IDs
-            signals = await self.trading_signals_api.get_trading_signals_by_ids(token_ids)
-            
-            if not signals:
-                print(f"ℹ️ No trading signals found for {token_symbols}")
-                return True
-            
-            # Store trading signals
-            success = self.trading_signals_storage.store_trading_signals(signals)
-            
-            if success:
-                print(f"✅ Successfully processed trading signals for {token_symbols}")
-                return True
-            else:
-                print(f"❌ Failed to store trading signals for {token_symbols}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing trading signals for {token_symbols}: {e}")
-            return False
+        return await self._fetch_and_store_signals(
+            "trading signals", token_ids, token_symbols,
+            self.trading_signals_api.get_trading_signals_by_ids,
+            self.trading_signals_storage.store_trading_signals
+        )
     
+    @async_safe("hourly trading signals")
     async def process_hourly_trading_signals(self, token_ids: List[int], token_symbols: str) -> bool:
         """Process hourly trading signals for multiple tokens using token IDs"""
-        try:
-            print(f"📊 Fetching hourly trading signals for {token_symbols} (IDs: {token_ids})...")
-            
-            # Fetch hourly trading signals using token IDs
-            signals = await self.hourly_trading_signals_api.get_hourly_trading_signals(token_ids=token_ids)
-            
-            if not signals:
-                print(f"ℹ️ No hourly trading signals found for {token_symbols}")
-                return True
-            
-            # Store hourly trading signals
-            success = self.hourly_trading_signals_storage.store_hourly_trading_signals(signals)
-            
-            if success:
-                print(f"✅ Successfully processed hourly trading signals for {token_symbols}")
-                return True
-            else:
-                print(f"❌ Failed to store hourly trading signals for {token_symbols}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error processing hourly trading signals for {token_symbols}: {e}")
-            return False
+        return await self._fetch_and_store_signals(
+            "hourly trading signals", token_ids, token_symbols,
+            self.hourly_trading_signals_api.get_hourly_trading_signals,
+            self.hourly_trading_signals_storage.store_hourly_trading_signals
+        )
     
-    async def process_token(self, token: Dict) -> bool:
-        """Process a single token with delays between API calls"""
-        symbol = token.get('TOKEN_SYMBOL', '').upper()
-        name = token.get('TOKEN_NAME', 'N/A')
-        token_id = token.get('TOKEN_ID')
+    async def process_ohlcv_data_multiple(self, token_ids: List[int], symbols: Tuple[str, ...]) -> bool:
+        """Fetch OHLCV data for all tokens in one batched call and store it"""
+        logger.info("\n📈 Processing OHLCV data...")
+        ohlcv_data = await self.token_api.get_ohlcv_data_multiple_by_ids(token_ids)
         
-        print(f"\n{'='*50}")
-        print(f"Processing: {symbol} ({name}) - ID: {token_id}")
-        print(f"{'='*50}")
+        # Store OHLCV data with one upsert per table
+        per_symbol = [(symbol, ohlcv_data.get(token_id, {})) for symbol, token_id in zip(symbols, token_ids)]
+        hourly_success = self.ohlcv_storage.store_hourly_ohlcv_bulk({symbol: data.get('hourly', []) for symbol, data in per_symbol})
+        daily_success = self.ohlcv_storage.store_daily_ohlcv_bulk({symbol: data.get('daily', []) for symbol, data in per_symbol})
         
-        # Store token metadata
-        token_success = self.store_token_data(token)
-        if not token_success:
-            print(f"❌ Failed to store token data for {symbol}")
-            return False
-        
-        # Process APIs sequentially with delays instead of in parallel
-        print(f" Processing {symbol} APIs sequentially to avoid rate limits...")
-        
-        # Social posts (using token name)
-        social_success = await self.process_social_posts(name, symbol)
-        await asyncio.sleep(2)  # 2 second delay
-        
-        # OHLCV data (using token ID)
-        ohlcv_success = await self.process_ohlcv_data(token_id, symbol)
-        await asyncio.sleep(2)  # 2 second delay
-        
-        # AI report (paid API) (using token ID)
-        ai_report_success = await self.process_ai_report(token_id, symbol)
-        await asyncio.sleep(3)  # 3 second delay for paid APIs
-        
-        # Fundamental grade (paid API) (using token ID)
-        fundamental_grade_success = await self.process_fundamental_grade(token_id, symbol)
-        await asyncio.sleep(3)  # 3 second delay for paid APIs
-        
-        overall_success = social_success and ohlcv_success and ai_report_success and fundamental_grade_success
-        
-        if overall_success:
-            print(f"✅ Successfully processed {symbol}")
-        else:
-            print(f"❌ Failed to process {symbol}")
-        
-        return overall_success
+        return hourly_success and daily_success
+    
+    async def process_ai_reports_multiple(self, token_ids: List[int]) -> bool:
+        """Fetch AI reports for all tokens concurrently in ID chunks and store them in one upsert"""
+        logger.info("\n🤖 Processing AI reports...")
+        return await self.ai_report_api.batch_get_ai_reports(token_ids)
+    
+    async def process_fundamental_grade_multiple(self, token_ids: List[int]) -> bool:
+        """Fetch fundamental grades for all tokens concurrently in ID chunks and store them in one upsert"""
+        logger.info("\n📊 Processing fundamental grade...")
+        return await self.fundamental_grade_api.batch_get_fundamental_grades(token_ids)
     
     async def process_all_tokens_batched(self, tokens: List[Dict]) -> bool:
         """Process all tokens using batched API calls"""
         try:
-            print(f"\n{'='*50}")
-            print("Processing all tokens with batched API calls")
-            print(f"{'='*50}")
-            
-            # Extract symbols, names, and IDs from tokens
-            symbols = [token.get('TOKEN_SYMBOL', '').upper() for token in tokens]
-            names = [token.get('TOKEN_NAME', 'N/A') for token in tokens]
-            token_ids = [token.get('TOKEN_ID') for token in tokens]
-            
-            print(f"Processing symbols: {', '.join(symbols)}")
-            print(f"Processing names: {', '.join(names)}")
-            print(f"Processing IDs: {token_ids}")
+            logger.info("\n" + "=" * 50)
+            logger.info("Processing all tokens with batched API calls")
+            logger.info("=" * 50)
+            
+            # Extract symbols, names, and IDs from tokens in one pass; the symbol strings are built once per run
+            refs = [TokenRef.from_dict(token) for token in tokens]
+            symbols = tuple(ref.symbol for ref in refs)
+            symbols_csv = ",".join(symbols)
+            symbols_label = ', '.join(symbols)
+            names = [ref.name for ref in refs]
+            token_ids = [ref.token_id for ref in refs]
+            
+            logger.info("Processing symbols: %s", symbols_label)
+            logger.info("Processing names: %s", ', '.join(names))
+            logger.info("Processing IDs: %s", token_ids)
             
             # Store token metadata for all tokens
-            print("\n📊 Storing token metadata...")
-            for token in tokens:
-                self.store_token_data(token)
-            
-            # 1. Process social posts (individual calls using token names)
-            print("\n📱 Processing social posts...")
-            social_results = []
-            for i, name in enumerate(names):
-                social_success = await self.process_social_posts(name, symbols[i])
-                social_results.append(social_success)
-                await asyncio.sleep(1)  # Small delay between social calls
-            
-            # 2. Process OHLCV data (batched using token IDs)
-            print("\n📈 Processing OHLCV data...")
-            ohlcv_data = await self.token_api.get_ohlcv_data_multiple_by_ids(token_ids)
-            
-            # Store OHLCV data
-            ohlcv_success = True
-            for i, symbol in enumerate(symbols):
-                data = ohlcv_data.get(token_ids[i], {})
-                hourly_success = self.ohlcv_storage.store_hourly_ohlcv(symbol, data.get('hourly', []))
-                daily_success = self.ohlcv_storage.store_daily_ohlcv(symbol, data.get('daily', []))
-                if not hourly_success or not daily_success:
-                    ohlcv_success = False
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 3. Process AI reports (batched using token IDs)
-            print("\n🤖 Processing AI reports...")
-            ai_report_success = await self.ai_report_api.get_and_store_ai_report_multiple_by_ids(token_ids)
-            
-            await asyncio.sleep(3)  # Delay before next API call
-            
-            # 4. Process fundamental grade (batched using token IDs)
-            print("\n📊 Processing fundamental grade...")
-            fundamental_grade_success = await self.fundamental_grade_api.fetch_and_store_fundamental_grade_multiple_by_ids(token_ids)
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 5. Process trading signals (using token IDs)
-            print("\n Processing trading signals...")
-            token_symbols_str = ",".join(symbols)
-            trading_signals_success = await self.process_trading_signals(token_ids, token_symbols_str)
-            
-            await asyncio.sleep(2)  # Delay before next API call
-            
-            # 6. Process hourly trading signals (using token IDs)
-            print("\n📊 Processing hourly trading signals...")
-            hourly_trading_signals_success = await self.process_hourly_trading_signals(token_ids, token_symbols_str)
+            logger.info("\n📊 Storing token metadata...")
+            self.store_token_data(tokens)
+            
+            # 1. Process social posts (fetched concurrently using token names, stored in one batch)
+            social_success = await self.process_social_posts_multiple(names, symbols)
+            
+            # 2-6. The remaining stages hit independent endpoints, so run them concurrently;
+            # a stage that raises only fails itself, not the stages still in flight
+            stage_names = ("OHLCV data", "AI reports", "Fundamental grade", "Trading signals", "Hourly trading signals")
+            results = await asyncio.gather(
+                self._bounded(self.process_ohlcv_data_multiple(token_ids, symbols)),
+                self._bounded(self.process_ai_reports_multiple(token_ids)),
+                self._bounded(self.process_fundamental_grade_multiple(token_ids)),
+                self._bounded(self.process_trading_signals(token_ids, symbols_csv)),
+                self._bounded(self.process_hourly_trading_signals(token_ids, symbols_csv)),
+                return_exceptions=True
+            )
+            for stage_name, result in zip(stage_names, results):
+                if isinstance(result, Exception):
+                    logger.error("❌ %s stage failed: %s", stage_name, result)
+            (
+                ohlcv_success,
+                ai_report_success,
+                fundamental_grade_success,
+                trading_signals_success,
+                hourly_trading_signals_success
+            ) = (result is True for result in results)
             
             # Calculate overall success
-            social_success = all(social_results)
             overall_success = social_success and ohlcv_success and ai_report_success and fundamental_grade_success and trading_signals_success and hourly_trading_signals_success
             
             if overall_success:
-                print(f"\n✅ Successfully processed all tokens: {', '.join(symbols)}")
+                logger.info("\n✅ Successfully processed all tokens: %s", symbols_label)
             else:
-                print(f"\n❌ Some components failed for tokens: {', '.join(symbols)}")
-                print(f"   Social posts: {'✅' if social_success else '❌'}")
-                print(f"   OHLCV data: {'✅' if ohlcv_success else '❌'}")
-                print(f"   AI reports: {'✅' if ai_report_success else '❌'}")
-                print(f"   Fundamental grade: {'✅' if fundamental_grade_success else '❌'}")
-                print(f"   Trading signals: {'✅' if trading_signals_success else '❌'}")
-                print(f"   Hourly trading signals: {'✅' if hourly_trading_signals_success else '❌'}")
+                logger.error("\n❌ Some components failed for tokens: %s", symbols_label)
+                logger.info("   Social posts: %s", '✅' if social_success else '❌')
+                logger.info("   OHLCV data: %s", '✅' if ohlcv_success else '❌')
+                logger.info("   AI reports: %s", '✅' if ai_report_success else '❌')
+                logger.info("   Fundamental grade: %s", '✅' if fundamental_grade_success else '❌')
+                logger.info("   Trading signals: %s", '✅' if trading_signals_success else '❌')
+                logger.info("   Hourly trading signals: %s", '✅' if hourly_trading_signals_success else '❌')
             
             return overall_success
             
         except Exception as e:
-            print(f"❌ Error in batch processing: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error in batch processing: %s", e)
             return False
 
     async def run_pipeline(self):
         """Run the complete pipeline with batched API calls"""
         try:
-            print("🚀 Starting Crypto Data Pipeline")
-            print("Processing: BTC, ETH, ADA")
-            print(f"{'='*50}")
+            logger.info("🚀 Starting Crypto Data Pipeline")
+            logger.info("Processing: %s", ', '.join(DUMMY_SYMBOLS))
+            logger.info("=" * 50)
             
             # Get dummy tokens
             tokens = self.get_dummy_tokens()
-            print(f"Loaded {len(tokens)} tokens")
+            logger.info("Loaded %d tokens", len(tokens))
             
             # Process all tokens with batched API calls
             success = await self.process_all_tokens_batched(tokens)
             
             # Summary
-            print(f"\n{'='*50}")
-            print("PIPELINE COMPLETED")
-            print(f"{'='*50}")
+            logger.info("\n" + "=" * 50)
+            logger.info("PIPELINE COMPLETED")
+            logger.info("=" * 50)
             
             if success:
-                print("🎉 All tokens processed successfully with batched API calls!")
+                logger.info("🎉 All tokens processed successfully with batched API calls!")
             else:
-                print("⚠️ Some components failed during batch processing")
+                logger.warning("⚠️ Some components failed during batch processing")
             
         except Exception as e:
-            print(f"❌ Pipeline failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Pipeline failed: %s", e)
 
 async def main():
     """Main function"""
     try:
-        pipeline = CryptoPipeline()
-        await pipeline.run_pipeline()
+        # The pooled clients live for the whole run and are closed on exit
+        async with CryptoPipeline() as pipeline:
+            await pipeline.run_pipeline()
     except Exception as e:
-        print(f"❌ Failed to start pipeline: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to start pipeline: %s", e)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    log_listener = configure_logging()
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -6,8 +6,11 @@ and displays comprehensive analysis.
 """
 
 import asyncio
+import logging
 from retriever import TokenRetriever
 
+logger = logging.getLogger(__name__)
+
 async def main():
     """Main function to run the comprehensive token analysis"""
     try:
@@ -24,9 +27,8 @@ async def main():
             print("\n⚠️ Analysis completed with some issues")
             
     except Exception as e:
-        print(f"❌ Failed to run token analysis: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to run token analysis: %s", e)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     asyncio.run(main())
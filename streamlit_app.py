@@ -19,17 +19,19 @@ import sys
 from io import StringIO
 import io
 from contextlib import redirect_stdout, redirect_stderr
+import concurrent.futures
+import traceback
 
 # Add the current directory to Python path to import our modules
 sys.path.append(os.path.dirname(__file__))
 
-# Import our workflow
-from run_complete_workflow import CompleteCryptoWorkflow
-from manage_portfolio import PortfolioManager
+# The workflow and portfolio manager (and the API/LLM stacks behind them) are imported
+# inside the functions that run them, so viewing saved positions does not pay for them
 
 # Supabase client
 try:
-    from supabase import create_client, Client
+    from supabase import Client
+    from apis.supabase_client import get_supabase_client
 except ImportError:
     st.error("Supabase client not found. Please install it with: pip install supabase")
     st.stop()
@@ -46,7 +48,8 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     st.error("Missing Supabase credentials. Please check your .env file.")
     st.stop()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Streamlit re-executes this script on every interaction; the cached client survives those reruns
+supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 def get_stored_positions() -> List[Dict[str, Any]]:
     """Fetch all stored positions from Supabase"""
@@ -101,6 +104,8 @@ def update_position_status(position_id: int, new_status: str) -> bool:
 def run_workflow_sync() -> tuple[bool, str]:
     """Run the complete workflow synchronously"""
     try:
+        from run_complete_workflow import CompleteCryptoWorkflow
+        
         # Create string buffer to capture output
         output_buffer = io.StringIO()
         
@@ -111,7 +116,6 @@ def run_workflow_sync() -> tuple[bool, str]:
                 try:
                     loop = asyncio.get_running_loop()
                     # If we're in an async context, we need to run in a thread
-                    import concurrent.futures
                     with concurrent.futures.ThreadPoolExecutor() as executor:
                         future = executor.submit(run_workflow_in_new_loop)
                         success = future.result()
@@ -127,9 +131,13 @@ def run_workflow_sync() -> tuple[bool, str]:
                         
             except Exception as e:
                 print(f"Workflow execution error: {e}")
-                import traceback
                 traceback.print_exc()
                 success = False
+            finally:
+                # The workflow logs its stages through a queue listener thread; write out
+                # whatever is still queued before the redirect ends
+                from logging_setup import flush_logging
+                flush_logging()
         
         # Get captured output
         logs = output_buffer.getvalue()
@@ -139,12 +147,13 @@ def run_workflow_sync() -> tuple[bool, str]:
         
     except Exception as e:
         error_msg = f"Error running workflow: {e}"
-        import traceback
         error_msg += f"\n\nTraceback:\n{traceback.format_exc()}"
         return False, error_msg
 
 def run_workflow_in_new_loop():
     """Run workflow in a new event loop (for thread execution)"""
+    from run_complete_workflow import CompleteCryptoWorkflow
+    
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
@@ -156,6 +165,8 @@ def run_workflow_in_new_loop():
 def run_portfolio_manager_sync() -> tuple[bool, str]:
     """Run the portfolio manager synchronously"""
     try:
+        from manage_portfolio import PortfolioManager
+        
         # Create string buffer to capture output
         output_buffer = io.StringIO()
         
@@ -166,7 +177,6 @@ def run_portfolio_manager_sync() -> tuple[bool, str]:
                 try:
                     loop = asyncio.get_running_loop()
                     # If we're in an async context, we need to run in a thread
-                    import concurrent.futures
                     with concurrent.futures.ThreadPoolExecutor() as executor:
                         future = executor.submit(run_portfolio_manager_in_new_loop)
                         success = future.result()
@@ -182,7 +192,6 @@ def run_portfolio_manager_sync() -> tuple[bool, str]:
                         
             except Exception as e:
                 print(f"Portfolio manager execution error: {e}")
-                import traceback
                 traceback.print_exc()
                 success = False
         
@@ -194,12 +203,13 @@ def run_portfolio_manager_sync() -> tuple[bool, str]:
         
     except Exception as e:
         error_msg = f"Error running portfolio manager: {e}"
-        import traceback
         error_msg += f"\n\nTraceback:\n{traceback.format_exc()}"
         return False, error_msg
 
 def run_portfolio_manager_in_new_loop():
     """Run portfolio manager in a new event loop (for thread execution)"""
+    from manage_portfolio import PortfolioManager
+    
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try: